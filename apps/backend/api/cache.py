@@ -0,0 +1,161 @@
+"""Response cache for the dashboard's polled endpoints.
+
+Cached GET responses are keyed by path and query parameters. An entry is
+served until its route's TTL runs out or one of the route's change counters
+moves. The counters are bumped by triggers when the underlying rows change
+(see CHANGE_COUNTERS in shared/database.py) and are read at most once per
+COUNTER_REFRESH seconds, so a cache hit does no database work. Concurrent
+misses for the same key wait for a single computation. Responses carry an
+ETag of their body, so a poll whose data has not changed gets a 304.
+"""
+import asyncio
+import hashlib
+import os
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode
+
+import anyio
+
+sys.path.append(str(Path(__file__).parent.parent))
+from shared.database import get_read_connection
+
+CACHE_ENABLED = os.getenv('EDGEGUARD_RESPONSE_CACHE', '1') != '0'
+
+# Path -> (TTL in seconds, change counters the response depends on)
+CACHED_ROUTES = {
+    '/stats/': (5, ('devices', 'threats')),
+    '/discover/devices': (10, ('devices', 'device_domains')),
+    '/discover/categories': (30, ('devices',)),
+    '/websites/all': (15, ('websites',)),
+}
+
+# Seconds a change counter snapshot is reused
+COUNTER_REFRESH = 1.0
+
+MAX_ENTRIES = 256
+
+class CacheEntry:
+    __slots__ = ('status', 'headers', 'body', 'etag', 'versions', 'created')
+
+    def __init__(self, status, headers, body, versions):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        self.versions = versions
+        self.created = time.monotonic()
+
+def _read_counters():
+    conn = get_read_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, version FROM change_counters")
+        return dict(cursor.fetchall())
+    finally:
+        conn.close()
+
+class ResponseCacheMiddleware:
+    """ASGI middleware caching the responses of CACHED_ROUTES."""
+
+    def __init__(self, app, routes=None):
+        self.app = app
+        self.routes = CACHED_ROUTES if routes is None else routes
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.counters = {}
+        self.counters_read = 0
+        self.counters_lock = asyncio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        route = self.routes.get(scope.get('path')) if scope['type'] == 'http' else None
+        if not CACHE_ENABLED or route is None or scope['method'] != 'GET':
+            await self.app(scope, receive, send)
+            return
+
+        ttl, counter_names = route
+        counters = await self._counters()
+        versions = tuple(counters.get(name) for name in counter_names)
+        query = urlencode(sorted(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)))
+        key = (scope['path'], query)
+
+        entry = self.entries.get(key)
+        if entry and entry.versions == versions and time.monotonic() - entry.created < ttl:
+            self.entries.move_to_end(key)
+            status = 'HIT'
+        elif key in self.pending:
+            entry = await asyncio.shield(self.pending[key])
+            status = 'HIT'
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.pending[key] = future
+            try:
+                entry = await self._compute(scope, receive, versions)
+                future.set_result(entry)
+            except BaseException as e:
+                future.set_exception(e)
+                # Nobody else may be waiting; don't warn about an unretrieved exception
+                future.exception()
+                raise
+            finally:
+                del self.pending[key]
+            if entry.status == 200:
+                self.entries[key] = entry
+                self.entries.move_to_end(key)
+                while len(self.entries) > MAX_ENTRIES:
+                    self.entries.popitem(last=False)
+            status = 'MISS'
+
+        await self._respond(scope, send, entry, status)
+
+    async def _counters(self):
+        if time.monotonic() - self.counters_read < COUNTER_REFRESH:
+            return self.counters
+        async with self.counters_lock:
+            if time.monotonic() - self.counters_read >= COUNTER_REFRESH:
+                self.counters = await anyio.to_thread.run_sync(_read_counters)
+                self.counters_read = time.monotonic()
+        return self.counters
+
+    async def _compute(self, scope, receive, versions):
+        """Run the endpoint and collect its response."""
+        start = {}
+        chunks = []
+
+        async def collect(message):
+            if message['type'] == 'http.response.start':
+                start.update(message)
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        await self.app(scope, receive, collect)
+        headers = [(name, value) for name, value in start.get('headers', [])
+                   if name.lower() not in (b'etag', b'cache-control')]
+        return CacheEntry(start.get('status', 500), headers, b''.join(chunks), versions)
+
+    async def _respond(self, scope, send, entry, status):
+        cache_headers = [
+            (b'etag', entry.etag.encode()),
+            (b'cache-control', b'no-cache'),
+            (b'x-cache', status.encode()),
+        ]
+        if entry.status != 200:
+            cache_headers = cache_headers[2:]
+
+        if entry.status == 200 and self._not_modified(scope, entry.etag):
+            await send({'type': 'http.response.start', 'status': 304, 'headers': cache_headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        await send({'type': 'http.response.start', 'status': entry.status, 'headers': entry.headers + cache_headers})
+        await send({'type': 'http.response.body', 'body': entry.body})
+
+    @staticmethod
+    def _not_modified(scope, etag):
+        for name, value in scope.get('headers', []):
+            if name == b'if-none-match':
+                tags = [tag.strip() for tag in value.decode('latin-1').split(',')]
+                return '*' in tags or etag in tags or f"W/{etag}" in tags
+        return False
@@ -0,0 +1,113 @@
+"""Fan-out of live monitor events to WebSocket and SSE clients.
+
+EventHub keeps one connection to the monitor's event socket (see
+shared/events.py) while any client is subscribed, and reconnects after
+RECONNECT_DELAY if the monitor restarts. Each event is parsed once and its
+line queued, unchanged, for every client whose filter matches. A client
+whose CLIENT_BUFFER fills is disconnected instead of holding up the others.
+Live views therefore cost no database queries.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from shared.events import EVENT_SOCKET
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per client before it is considered too slow and dropped
+CLIENT_BUFFER = int(os.getenv('EDGEGUARD_EVENT_CLIENT_BUFFER', '256'))
+
+RECONNECT_DELAY = 2.0
+
+class EventFilter:
+    """Event kinds, device IP and device MAC a client wants; None matches all."""
+
+    def __init__(self, kinds=None, ip=None, mac=None):
+        self.kinds = kinds
+        self.ip = ip
+        self.mac = mac.lower() if mac else None
+
+    def matches(self, event):
+        return ((self.kinds is None or event.get('kind') in self.kinds)
+                and (self.ip is None or event.get('ip') == self.ip)
+                and (self.mac is None or (event.get('mac') or '').lower() == self.mac))
+
+class EventClient:
+    """Bounded queue of event lines for one client."""
+
+    def __init__(self, event_filter, maxsize):
+        self.filter = event_filter
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = False
+
+    async def get(self):
+        """Next event line, or None once the client has been dropped."""
+        if self.dropped:
+            return None
+        return await self.queue.get()
+
+class EventHub:
+    """Single reader of the monitor's event socket, shared by all clients."""
+
+    def __init__(self, path=EVENT_SOCKET, buffer=CLIENT_BUFFER):
+        self.path = path
+        self.buffer = buffer
+        self.clients = set()
+        self.task = None
+        self.connected = False
+
+    def subscribe(self, event_filter):
+        client = EventClient(event_filter, self.buffer)
+        self.clients.add(client)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        return client
+
+    def unsubscribe(self, client):
+        self.clients.discard(client)
+
+    async def _run(self):
+        while self.clients:
+            try:
+                reader, writer = await asyncio.open_unix_connection(str(self.path))
+            except OSError as e:
+                logger.debug(f"Event socket {self.path} unavailable: {e}")
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+
+            self.connected = True
+            try:
+                while self.clients:
+                    line = await reader.readline()
+                    if not line:
+                        logger.warning("Event socket closed by the monitor")
+                        await asyncio.sleep(RECONNECT_DELAY)
+                        break
+                    self._dispatch(line)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Event socket read failed: {e}")
+            finally:
+                self.connected = False
+                writer.close()
+
+    def _dispatch(self, line):
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return
+        text = line.decode().rstrip('\n')
+        for client in list(self.clients):
+            if not client.filter.matches(event):
+                continue
+            try:
+                client.queue.put_nowait(text)
+            except asyncio.QueueFull:
+                client.dropped = True
+                self.clients.discard(client)
+
+hub = EventHub()
@@ -6,7 +6,9 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent))
 from shared.database import init_db
-from api.routes import devices, threats, stats, dns, connections, http, sites, websites, discover
+from api.cache import ResponseCacheMiddleware
+from api.pagination import NEXT_CURSOR_HEADER
+from api.routes import devices, threats, stats, dns, connections, http, sites, websites, discover, search, analytics, traffic, admin, export, events
 
 # Initialize database
 init_db()
@@ -17,6 +19,9 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Cached dashboard responses; added first so CORS headers wrap cached responses too
+app.add_middleware(ResponseCacheMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +29,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Include routers
@@ -36,6 +42,12 @@ app.include_router(http.router)
 app.include_router(sites.router)
 app.include_router(websites.router, prefix="/websites", tags=["websites"])
 app.include_router(discover.router)
+app.include_router(search.router)
+app.include_router(analytics.router)
+app.include_router(traffic.router)
+app.include_router(admin.router)
+app.include_router(export.router)
+app.include_router(events.router)
 
 @app.get("/")
 def root():
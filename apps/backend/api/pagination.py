@@ -0,0 +1,79 @@
+"""Keyset pagination for list endpoints.
+
+Lists are ordered newest first by (time column, id). When more rows follow,
+the response carries the last row's cursor, `<timestamp>,<id>`, in the
+X-Next-Cursor header. Passing it back as `?after=` continues strictly after
+that row through the same index range scan, so a deep page costs the same
+as the first one. Filters go into the same WHERE clause.
+"""
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+def parse_cursor(after):
+    """(timestamp, id) from a `<timestamp>,<id>` cursor."""
+    timestamp, _, row_id = after.rpartition(',')
+    try:
+        return parse_timestamp(timestamp), int(row_id)
+    except (ValueError, HTTPException):
+        raise HTTPException(status_code=400, detail="Invalid cursor, expected <timestamp>,<id>")
+
+def parse_timestamp(value):
+    """Stored timestamp form, 'YYYY-MM-DD HH:MM:SS' in UTC, of an ISO 8601 parameter.
+
+    Times with a UTC offset (or Z) are converted to UTC; times without one
+    are taken as UTC already.
+    """
+    try:
+        parsed = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith(('Z', 'z')) else value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp {value!r}, expected ISO 8601")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+class Page:
+    """WHERE, ORDER BY and LIMIT clauses for one page of a list query.
+
+    The query must select the time column and the id as its last two
+    columns; `finish` uses them for the next cursor.
+    """
+
+    def __init__(self, time_column, id_column, after=None, limit=DEFAULT_LIMIT, since=None, until=None):
+        self.time_column = time_column
+        self.id_column = id_column
+        self.limit = min(max(limit, 1), MAX_LIMIT)
+        self.conditions = []
+        self.params = []
+        if since:
+            self.where(f"{time_column} >= ?", parse_timestamp(since))
+        if until:
+            self.where(f"{time_column} < ?", parse_timestamp(until))
+        if after:
+            self.where(f"({time_column}, {id_column}) < (?, ?)", *parse_cursor(after))
+
+    def where(self, condition, *params):
+        """Add a filter condition."""
+        self.conditions.append(condition)
+        self.params.extend(params)
+
+    def clauses(self):
+        """SQL to append after the FROM/JOIN clauses."""
+        where = f"WHERE {' AND '.join(self.conditions)}" if self.conditions else ""
+        return f"{where} ORDER BY {self.time_column} DESC, {self.id_column} DESC LIMIT ?"
+
+    def query_params(self):
+        # One extra row tells whether there is a next page
+        return [*self.params, self.limit + 1]
+
+    def finish(self, rows, response):
+        """Rows of this page; sets X-Next-Cursor if more rows follow."""
+        if len(rows) > self.limit:
+            rows = rows[:self.limit]
+            response.headers[NEXT_CURSOR_HEADER] = f"{rows[-1][-2]},{rows[-1][-1]}"
+        return rows
@@ -0,0 +1,14 @@
+"""Administrative actions."""
+from fastapi import APIRouter
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from service.identification import reclassify_all
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+@router.post("/reclassify")
+def reclassify_devices():
+    """Re-identify every device against the current signatures, and report timing."""
+    return reclassify_all()
@@ -0,0 +1,43 @@
+"""Heavy aggregation endpoints, served by the configured analytics backend."""
+from fastapi import APIRouter, HTTPException
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from shared.storage import get_storage, ACTIVITY_TABLES
+from api.pagination import parse_timestamp
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+def _since(since):
+    # Both backends compare against the stored form; raw ISO text sorts wrongly on SQLite
+    return parse_timestamp(since) if since else None
+
+@router.get("/backend")
+def get_backend():
+    """Get the analytics backend in use."""
+    return {"backend": get_storage().name}
+
+@router.get("/top-domains")
+def get_top_domains(limit: int = 10, since: str = None):
+    """Get most queried domains since a timestamp."""
+    return get_storage().top_domains(limit=limit, since=_since(since))
+
+@router.get("/top-destinations")
+def get_top_destinations(limit: int = 10, since: str = None):
+    """Get destinations with the most flows since a timestamp."""
+    return get_storage().top_destinations(limit=limit, since=_since(since))
+
+@router.get("/activity/{kind}")
+def get_activity(kind: str, bucket: int = 3600, since: str = None, device_id: int = None):
+    """Get event counts per time bucket (seconds) for dns, http, tls or connections."""
+    if kind not in ACTIVITY_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown kind, expected one of {', '.join(ACTIVITY_TABLES)}")
+    if bucket <= 0:
+        raise HTTPException(status_code=400, detail="Bucket must be positive")
+    return get_storage().activity(kind, bucket_seconds=bucket, since=_since(since), device_id=device_id)
+
+@router.get("/devices/{device_id}/domains")
+def get_device_domains(device_id: int, limit: int = 50, since: str = None):
+    """Get DNS, SNI and HTTP counts per domain for a device."""
+    return get_storage().device_domains(device_id, limit=limit, since=_since(since))
@@ -1,45 +1,41 @@
 """Connection tracking endpoints."""
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from typing import List
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from shared.database import get_connection
+from shared.database import get_read_connection
+from shared.storage import get_storage
+from api.pagination import Page, DEFAULT_LIMIT
 
 router = APIRouter(prefix="/connections", tags=["connections"])
 
 @router.get("/")
-def get_connections(device_id: int = None, active_only: bool = True):
-    """Get network connections."""
-    conn = get_connection()
-    cursor = conn.cursor()
+def get_connections(response: Response, device_id: int = None, active_only: bool = True, since: str = None,
+                    until: str = None, after: str = None, limit: int = DEFAULT_LIMIT):
+    """Get network connections, most recently active first.
     
-    query = """
-        SELECT c.protocol, c.src_ip, c.src_port, c.dst_ip, c.dst_port, 
-               c.bytes_sent, c.bytes_received, c.first_seen, c.last_seen,
-               d.hostname, d.vendor
-        FROM connections c
-        JOIN devices d ON c.device_id = d.id
+    Pass X-Next-Cursor back as `after` for the next page. Paging is by last
+    activity, so a flow that sees traffic while paging moves to the front.
     """
-    
-    conditions = []
-    params = []
-    
+    page = Page('c.last_seen', 'c.id', after=after, limit=limit, since=since, until=until)
     if device_id:
-        conditions.append("c.device_id = ?")
-        params.append(device_id)
-    
+        page.where("c.device_id = ?", device_id)
     if active_only:
-        conditions.append("datetime(c.last_seen) > datetime('now', '-5 minutes')")
-    
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
-    
-    query += " ORDER BY c.last_seen DESC LIMIT 100"
+        page.where("c.last_seen > datetime('now', '-5 minutes')")
     
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT c.protocol, c.src_ip, c.src_port, c.dst_ip, c.dst_port, 
+               c.bytes_sent, c.bytes_received, c.first_seen,
+               d.hostname, d.vendor, c.last_seen, c.id
+        FROM connections c
+        JOIN devices d ON c.device_id = d.id
+        {page.clauses()}
+    """, page.query_params())
+    rows = page.finish(cursor.fetchall(), response)
     conn.close()
     
     return [
@@ -52,37 +48,14 @@ def get_connections(device_id: int = None, active_only: bool = True):
             "bytes_sent": row[5],
             "bytes_received": row[6],
             "first_seen": row[7],
-            "last_seen": row[8],
-            "device_hostname": row[9],
-            "device_vendor": row[10]
+            "last_seen": row[10],
+            "device_hostname": row[8],
+            "device_vendor": row[9]
         }
         for row in rows
     ]
 
 @router.get("/top-destinations")
-def get_top_destinations(limit: int = 10):
-    """Get most contacted destinations."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT dst_ip, dst_port, protocol, COUNT(*) as count, SUM(bytes_sent) as total_bytes
-        FROM connections
-        GROUP BY dst_ip, dst_port, protocol
-        ORDER BY count DESC
-        LIMIT ?
-    """, (limit,))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    return [
-        {
-            "dst_ip": row[0],
-            "dst_port": row[1],
-            "protocol": row[2],
-            "connection_count": row[3],
-            "total_bytes": row[4]
-        }
-        for row in rows
-    ]
+def get_top_destinations(limit: int = 10, days: int = None):
+    """Get most contacted destinations, optionally over the last `days` days from rollups and recent raw rows."""
+    return get_storage().destination_totals(limit=limit, days=days)
@@ -1,65 +1,57 @@
 """Device management endpoints."""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from typing import List
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from shared.database import get_connection
+from shared.database import get_read_connection
 from api.models.schemas import Device
+from api.pagination import Page, DEFAULT_LIMIT
 
 router = APIRouter(prefix="/devices", tags=["devices"])
 
+DEVICE_COLUMNS = "mac_address, ip_address, hostname, vendor, device_type, first_seen, is_active, last_seen, id"
+
+def _device(row):
+    return Device(
+        id=row[8],
+        mac_address=row[0],
+        ip_address=row[1],
+        hostname=row[2],
+        vendor=row[3],
+        device_type=row[4],
+        first_seen=row[5],
+        last_seen=row[7],
+        is_active=bool(row[6])
+    )
+
 @router.get("/", response_model=List[Device])
-def get_devices(active_only: bool = False):
-    """Get all devices."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    query = "SELECT * FROM devices"
+def get_devices(response: Response, active_only: bool = False, since: str = None, until: str = None,
+                after: str = None, limit: int = DEFAULT_LIMIT):
+    """Get devices, most recently seen first; pass X-Next-Cursor back as `after` for the next page."""
+    page = Page('last_seen', 'id', after=after, limit=limit, since=since, until=until)
     if active_only:
-        query += " WHERE is_active = 1"
+        page.where("is_active = 1")
     
-    cursor.execute(query)
-    rows = cursor.fetchall()
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {DEVICE_COLUMNS} FROM devices {page.clauses()}", page.query_params())
+    rows = page.finish(cursor.fetchall(), response)
     conn.close()
     
-    devices = []
-    for row in rows:
-        devices.append(Device(
-            id=row[0],
-            mac_address=row[1],
-            ip_address=row[2],
-            hostname=row[3],
-            vendor=row[4],
-            device_type=row[5],
-            first_seen=row[6],
-            last_seen=row[7],
-            is_active=bool(row[8])
-        ))
-    
-    return devices
+    return [_device(row) for row in rows]
 
 @router.get("/{device_id}", response_model=Device)
 def get_device(device_id: int):
     """Get device by ID."""
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM devices WHERE id = ?", (device_id,))
+    cursor.execute(f"SELECT {DEVICE_COLUMNS} FROM devices WHERE id = ?", (device_id,))
     row = cursor.fetchone()
     conn.close()
     
     if not row:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    return Device(
-        id=row[0],
-        mac_address=row[1],
-        ip_address=row[2],
-        hostname=row[3],
-        vendor=row[4],
-        device_type=row[5],
-        first_seen=row[6],
-        last_seen=row[7],
-        is_active=bool(row[8])
-    )
+    return _device(row)
@@ -1,19 +1,50 @@
 """Fing-like device discovery API endpoints."""
 from fastapi import APIRouter
-from shared.database import get_connection
+from shared.database import get_read_connection
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from service.device_signatures import identify_device, DEVICE_CATEGORIES
+from service.device_signatures import device_categories, UNKNOWN_DEVICE
+from service.identification import parse_ports, DOMAIN_FILTER
 
 router = APIRouter(prefix="/discover", tags=["discovery"])
 
+def _identification(signature, device_type, category, icon, confidence):
+    """Stored identification; unknown until the background job has run."""
+    if signature is None:
+        return dict(UNKNOWN_DEVICE)
+    return {
+        'device_id': signature,
+        'device_type': device_type,
+        'category': category,
+        'icon': icon,
+        'confidence': confidence
+    }
+
 @router.get("/devices")
 def discover_all_devices():
     """Get all discovered devices with Fing-like identification."""
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
+    # Up to 10 most recently queried domains per device, from the per-device
+    # rollup rather than dns_queries
+    cursor.execute(f"""
+        SELECT device_id, name
+        FROM (
+            SELECT dd.device_id, dm.name,
+                   ROW_NUMBER() OVER (PARTITION BY dd.device_id ORDER BY dd.last_seen DESC, dd.domain_id) AS rank
+            FROM device_domains dd
+            JOIN domains dm ON dd.domain_id = dm.id
+            WHERE {DOMAIN_FILTER}
+        )
+        WHERE rank <= 10
+        ORDER BY device_id, rank
+    """)
+    domains_by_device = {}
+    for device_id, name in cursor.fetchall():
+        domains_by_device.setdefault(device_id, []).append(name)
+    
     # Get all devices with their data
     cursor.execute("""
         SELECT 
@@ -22,54 +53,29 @@ def discover_all_devices():
             d.mac_address,
             d.hostname,
             d.vendor,
-            d.device_name,
-            d.device_type,
             d.os_name,
             d.open_ports,
             d.first_seen,
             d.last_seen,
-            d.packets_sent,
-            d.packets_received,
-            d.bytes_sent,
-            d.bytes_received
+            d.last_seen >= datetime('now', '-5 minutes'),
+            d.total_packets_sent,
+            d.total_packets_received,
+            d.total_bytes_sent,
+            d.total_bytes_received,
+            d.ident_signature,
+            d.ident_type,
+            d.ident_category,
+            d.ident_icon,
+            d.ident_confidence
         FROM devices d
         ORDER BY d.last_seen DESC
     """)
     
     devices = []
     for row in cursor.fetchall():
-        device_id, ip, mac, hostname, vendor, device_name, device_type, os_name, \
-        open_ports, first_seen, last_seen, pkts_sent, pkts_recv, bytes_sent, bytes_recv = row
-        
-        # Get DNS domains for this device
-        cursor.execute("""
-            SELECT DISTINCT domain 
-            FROM dns_queries 
-            WHERE device_id = ? 
-              AND domain NOT LIKE '%.in-addr.arpa'
-              AND domain NOT LIKE '%.local'
-            LIMIT 10
-        """, (device_id,))
-        dns_domains = [r[0] for r in cursor.fetchall()]
-        
-        # Parse open ports
-        ports = []
-        if open_ports:
-            try:
-                ports = [int(p.strip()) for p in open_ports.split(',') if p.strip()]
-            except:
-                pass
-        
-        # Identify device
-        identification = identify_device(vendor, dns_domains, ports, hostname)
-        
-        # Calculate online status (seen in last 5 minutes)
-        from datetime import datetime, timedelta
-        try:
-            last_seen_dt = datetime.fromisoformat(last_seen)
-            is_online = (datetime.now() - last_seen_dt) < timedelta(minutes=5)
-        except:
-            is_online = False
+        device_id, ip, mac, hostname, vendor, os_name, open_ports, first_seen, last_seen, \
+        is_online, pkts_sent, pkts_recv, bytes_sent, bytes_recv = row[:14]
+        identification = _identification(*row[14:])
         
         devices.append({
             'ip_address': ip,
@@ -81,9 +87,9 @@ def discover_all_devices():
             'icon': identification['icon'],
             'confidence': identification['confidence'],
             'os': os_name,
-            'open_ports': ports,
-            'dns_domains': dns_domains,
-            'is_online': is_online,
+            'open_ports': parse_ports(open_ports),
+            'dns_domains': domains_by_device.get(device_id, []),
+            'is_online': bool(is_online),
             'first_seen': first_seen,
             'last_seen': last_seen,
             'traffic': {
@@ -109,13 +115,13 @@ def discover_all_devices():
         'online_devices': sum(1 for d in devices if d['is_online']),
         'devices': devices,
         'by_category': by_category,
-        'categories': DEVICE_CATEGORIES
+        'categories': device_categories()
     }
 
 @router.get("/device/{ip}")
 def get_device_details(ip: str):
     """Get detailed information about a specific device."""
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     # Get device
@@ -123,8 +129,9 @@ def get_device_details(ip: str):
         SELECT 
             d.id, d.ip_address, d.mac_address, d.hostname, d.vendor,
             d.device_name, d.device_type, d.os_name, d.open_ports,
-            d.first_seen, d.last_seen, d.packets_sent, d.packets_received,
-            d.bytes_sent, d.bytes_received, d.ja3_hash
+            d.first_seen, d.last_seen, d.total_packets_sent, d.total_packets_received,
+            d.total_bytes_sent, d.total_bytes_received, d.ja3_hash,
+            d.ident_signature, d.ident_type, d.ident_category, d.ident_icon, d.ident_confidence
         FROM devices d
         WHERE d.ip_address = ?
     """, (ip,))
@@ -137,14 +144,12 @@ def get_device_details(ip: str):
     device_id = row[0]
     
     # Get DNS queries
-    cursor.execute("""
-        SELECT domain, COUNT(*) as count, MAX(timestamp) as last_seen
-        FROM dns_queries
-        WHERE device_id = ?
-          AND domain NOT LIKE '%.in-addr.arpa'
-          AND domain NOT LIKE '%.local'
-        GROUP BY domain
-        ORDER BY count DESC
+    cursor.execute(f"""
+        SELECT dm.name, dd.query_count, dd.last_seen
+        FROM device_domains dd
+        JOIN domains dm ON dd.domain_id = dm.id
+        WHERE dd.device_id = ? AND {DOMAIN_FILTER}
+        ORDER BY dd.query_count DESC
         LIMIT 20
     """, (device_id,))
     dns_queries = [{'domain': r[0], 'count': r[1], 'last_seen': r[2]} for r in cursor.fetchall()]
@@ -172,17 +177,8 @@ def get_device_details(ip: str):
     
     conn.close()
     
-    # Parse ports
-    ports = []
-    if row[8]:
-        try:
-            ports = [int(p.strip()) for p in row[8].split(',') if p.strip()]
-        except:
-            pass
-    
-    # Identify device
-    dns_domains = [q['domain'] for q in dns_queries]
-    identification = identify_device(row[4], dns_domains, ports, row[3])
+    ports = parse_ports(row[8])
+    identification = _identification(*row[16:])
     
     return {
         'ip_address': row[1],
@@ -212,21 +208,19 @@ def get_device_details(ip: str):
 @router.get("/categories")
 def get_categories():
     """Get all device categories with counts."""
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT id, vendor FROM devices")
-    devices = cursor.fetchall()
+    cursor.execute("""
+        SELECT COALESCE(ident_category, ?), COUNT(*)
+        FROM devices
+        GROUP BY 1
+    """, (UNKNOWN_DEVICE['category'],))
+    category_counts = dict(cursor.fetchall())
     conn.close()
     
-    category_counts = {}
-    for device_id, vendor in devices:
-        identification = identify_device(vendor, [], [], None)
-        cat = identification['category']
-        category_counts[cat] = category_counts.get(cat, 0) + 1
-    
     categories = []
-    for cat_id, cat_info in DEVICE_CATEGORIES.items():
+    for cat_id, cat_info in device_categories().items():
         categories.append({
             'id': cat_id,
             'name': cat_info['name'],
@@ -1,67 +1,50 @@
 """DNS query endpoints."""
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from typing import List
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from shared.database import get_connection
+from shared.database import get_read_connection
+from shared.storage import get_storage
+from api.pagination import Page, DEFAULT_LIMIT
 
 router = APIRouter(prefix="/dns", tags=["dns"])
 
 @router.get("/queries")
-def get_dns_queries(device_id: int = None, limit: int = 100):
-    """Get DNS queries."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
+def get_dns_queries(response: Response, device_id: int = None, domain: str = None, since: str = None,
+                    until: str = None, after: str = None, limit: int = DEFAULT_LIMIT):
+    """Get DNS queries, newest first; pass X-Next-Cursor back as `after` for the next page."""
+    page = Page('d.timestamp', 'd.id', after=after, limit=limit, since=since, until=until)
     if device_id:
-        cursor.execute("""
-            SELECT d.domain, d.query_type, d.timestamp, dev.ip_address, dev.hostname
-            FROM dns_queries d
-            JOIN devices dev ON d.device_id = dev.id
-            WHERE d.device_id = ?
-            ORDER BY d.timestamp DESC
-            LIMIT ?
-        """, (device_id, limit))
-    else:
-        cursor.execute("""
-            SELECT d.domain, d.query_type, d.timestamp, dev.ip_address, dev.hostname
-            FROM dns_queries d
-            JOIN devices dev ON d.device_id = dev.id
-            ORDER BY d.timestamp DESC
-            LIMIT ?
-        """, (limit,))
+        page.where("d.device_id = ?", device_id)
+    if domain:
+        page.where("d.domain_id = (SELECT id FROM domains WHERE name = ?)", domain)
     
-    rows = cursor.fetchall()
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT dm.name, d.query_type, dev.ip_address, dev.hostname, d.timestamp, d.id
+        FROM dns_queries d
+        JOIN domains dm ON d.domain_id = dm.id
+        JOIN devices dev ON d.device_id = dev.id
+        {page.clauses()}
+    """, page.query_params())
+    rows = page.finish(cursor.fetchall(), response)
     conn.close()
     
     return [
         {
             "domain": row[0],
             "query_type": row[1],
-            "timestamp": row[2],
-            "device_ip": row[3],
-            "device_hostname": row[4]
+            "timestamp": row[4],
+            "device_ip": row[2],
+            "device_hostname": row[3]
         }
         for row in rows
     ]
 
 @router.get("/top-domains")
-def get_top_domains(limit: int = 10):
-    """Get most queried domains."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT domain, COUNT(*) as count
-        FROM dns_queries
-        GROUP BY domain
-        ORDER BY count DESC
-        LIMIT ?
-    """, (limit,))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    return [{"domain": row[0], "count": row[1]} for row in rows]
+def get_top_domains(limit: int = 10, days: int = None):
+    """Get most queried domains, optionally over the last `days` days from rollups and recent raw rows."""
+    return get_storage().domain_totals(limit=limit, days=days)
@@ -0,0 +1,73 @@
+"""Live event stream endpoints (WebSocket and server-sent events)."""
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketException, status
+from fastapi.responses import StreamingResponse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from shared.events import EVENT_KINDS
+from api.events import hub, EventFilter
+
+router = APIRouter(tags=["events"])
+
+# Seconds between SSE comment lines that keep idle proxies from closing the stream
+SSE_KEEPALIVE = 15.0
+
+def _event_filter(kinds, ip, mac):
+    """EventFilter from query parameters; None on unknown kinds."""
+    kind_set = set(kinds.split(',')) if kinds else None
+    if kind_set and not kind_set <= set(EVENT_KINDS):
+        return None
+    return EventFilter(kind_set, ip, mac)
+
+@router.websocket("/ws/events")
+async def events_websocket(websocket: WebSocket, kinds: str = None, ip: str = None, mac: str = None):
+    """Live events as JSON text messages, optionally filtered by kinds, ip and mac."""
+    event_filter = _event_filter(kinds, ip, mac)
+    if event_filter is None:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION,
+                                 reason=f"Unknown kind, expected some of {', '.join(EVENT_KINDS)}")
+    await websocket.accept()
+    client = hub.subscribe(event_filter)
+
+    async def forward():
+        while (line := await client.get()) is not None:
+            await websocket.send_text(line)
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Too slow, events dropped")
+
+    sender = asyncio.create_task(forward())
+    try:
+        # Messages from the client are ignored; this returns when it disconnects
+        while (await websocket.receive())['type'] != 'websocket.disconnect':
+            pass
+    finally:
+        sender.cancel()
+        hub.unsubscribe(client)
+
+@router.get("/events/stream")
+async def events_stream(kinds: str = None, ip: str = None, mac: str = None):
+    """Live events as server-sent events, optionally filtered by kinds, ip and mac."""
+    event_filter = _event_filter(kinds, ip, mac)
+    if event_filter is None:
+        raise HTTPException(status_code=400, detail=f"Unknown kind, expected some of {', '.join(EVENT_KINDS)}")
+
+    async def stream():
+        client = hub.subscribe(event_filter)
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    line = await asyncio.wait_for(client.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if line is None:
+                    yield "event: dropped\ndata: {}\n\n"
+                    break
+                yield f"data: {line}\n\n"
+        finally:
+            hub.unsubscribe(client)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,153 @@
+"""Bulk export of event history as NDJSON or CSV.
+
+Rows are streamed from the database cursor in batches of EXPORT_BATCH_ROWS
+and encoded as they are read, so memory use does not grow with the size of
+the export. With compress=true the stream is gzipped on the fly. Rows come
+in time order; since and until select the range.
+
+The export reads from one snapshot, so a long export holds a read
+transaction open and WAL checkpoints cannot complete past it until it ends.
+"""
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+import csv
+import io
+import json
+import zlib
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from shared.database import get_read_connection
+from api.pagination import parse_timestamp
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+# Rows fetched from the cursor, and encoded, per chunk of the response
+EXPORT_BATCH_ROWS = 1000
+
+# kind -> (query with {where} placeholder, time column, device column, field names)
+EXPORT_KINDS = {
+    "dns": ("""
+        SELECT q.timestamp, q.device_id, d.mac_address, d.ip_address, d.hostname,
+               dm.name, q.query_type
+        FROM dns_queries q
+        JOIN domains dm ON q.domain_id = dm.id
+        LEFT JOIN devices d ON q.device_id = d.id
+        {where}
+        ORDER BY q.timestamp, q.id
+    """, "q.timestamp", "q.device_id",
+        ["timestamp", "device_id", "device_mac", "device_ip", "device_hostname", "domain", "query_type"]),
+    "http": ("""
+        SELECT h.timestamp, h.device_id, d.mac_address, d.ip_address, d.hostname,
+               h.method, hs.name, h.path, u.name, ua.name, h.referer, h.status_code
+        FROM http_metadata h
+        LEFT JOIN hosts hs ON h.host_id = hs.id
+        LEFT JOIN urls u ON h.url_id = u.id
+        LEFT JOIN user_agents ua ON h.user_agent_id = ua.id
+        LEFT JOIN devices d ON h.device_id = d.id
+        {where}
+        ORDER BY h.timestamp, h.id
+    """, "h.timestamp", "h.device_id",
+        ["timestamp", "device_id", "device_mac", "device_ip", "device_hostname",
+         "method", "host", "path", "url", "user_agent", "referer", "status_code"]),
+    "connections": ("""
+        SELECT c.last_seen, c.device_id, d.mac_address, d.ip_address, d.hostname,
+               c.protocol, c.src_ip, c.src_port, c.dst_ip, c.dst_port, c.dst_country, c.bucket, c.first_seen,
+               c.bytes_sent, c.bytes_received, c.packets_sent, c.packets_received, c.session_duration
+        FROM connections c
+        LEFT JOIN devices d ON c.device_id = d.id
+        {where}
+        ORDER BY c.last_seen, c.id
+    """, "c.last_seen", "c.device_id",
+        ["last_seen", "device_id", "device_mac", "device_ip", "device_hostname",
+         "protocol", "src_ip", "src_port", "dst_ip", "dst_port", "dst_country", "bucket", "first_seen",
+         "bytes_sent", "bytes_received", "packets_sent", "packets_received", "session_duration"]),
+    "threats": ("""
+        SELECT t.detected_at, t.device_id, d.mac_address, d.ip_address, d.hostname,
+               t.id, t.threat_type, t.severity, t.description, t.resolved
+        FROM threats t
+        LEFT JOIN devices d ON t.device_id = d.id
+        {where}
+        ORDER BY t.detected_at, t.id
+    """, "t.detected_at", "t.device_id",
+        ["detected_at", "device_id", "device_mac", "device_ip", "device_hostname",
+         "id", "threat_type", "severity", "description", "resolved"]),
+}
+
+def _ndjson(fields, rows):
+    return ''.join(json.dumps(dict(zip(fields, row)), separators=(',', ':')) + '\n' for row in rows)
+
+def _csv(fields, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue()
+
+# format -> (media type, encoder of a batch of rows)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", _ndjson),
+    "csv": ("text/csv", _csv),
+}
+
+def _stream(sql, params, fields, encode, header, compress):
+    """Encoded chunks of the query's rows; the connection is released when done or abandoned."""
+    conn = get_read_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        if header:
+            chunk = header.encode()
+            yield gzip.compress(chunk) if gzip else chunk
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_ROWS)
+            if not rows:
+                break
+            chunk = encode(fields, rows).encode()
+            if gzip:
+                chunk = gzip.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+        if gzip:
+            yield gzip.flush()
+    finally:
+        conn.close()
+
+@router.get("/{kind}")
+def export(kind: str, format: str = "ndjson", device_id: int = None, since: str = None, until: str = None,
+           compress: bool = False):
+    """Stream dns, http, connections or threats rows in time order."""
+    if kind not in EXPORT_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown kind, expected one of {', '.join(EXPORT_KINDS)}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format, expected one of {', '.join(EXPORT_FORMATS)}")
+
+    sql, time_column, device_column, fields = EXPORT_KINDS[kind]
+    media_type, encode = EXPORT_FORMATS[format]
+
+    conditions = []
+    params = []
+    if device_id:
+        conditions.append(f"{device_column} = ?")
+        params.append(device_id)
+    if since:
+        conditions.append(f"{time_column} >= ?")
+        params.append(parse_timestamp(since))
+    if until:
+        conditions.append(f"{time_column} < ?")
+        params.append(parse_timestamp(until))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    header = ','.join(fields) + '\n' if format == "csv" else None
+    filename = f"edgeguard-{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{format}"
+    if compress:
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        _stream(sql.format(where=where), params, fields, encode, header, compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -1,42 +1,38 @@
 """HTTP/URL tracking endpoints."""
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from typing import List
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from shared.database import get_connection
+from shared.database import get_read_connection
+from api.pagination import Page, DEFAULT_LIMIT, MAX_LIMIT
 
 router = APIRouter(prefix="/http", tags=["http"])
 
 @router.get("/urls")
-def get_urls(device_id: int = None, limit: int = 100):
-    """Get visited URLs."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
+def get_urls(response: Response, device_id: int = None, host: str = None, since: str = None,
+             until: str = None, after: str = None, limit: int = DEFAULT_LIMIT):
+    """Get visited URLs, newest first; pass X-Next-Cursor back as `after` for the next page."""
+    page = Page('h.timestamp', 'h.id', after=after, limit=limit, since=since, until=until)
     if device_id:
-        cursor.execute("""
-            SELECT h.full_url, h.method, h.host, h.path, h.user_agent, h.referer, h.timestamp,
-                   d.ip_address, d.hostname, d.vendor
-            FROM http_metadata h
-            JOIN devices d ON h.device_id = d.id
-            WHERE h.device_id = ? AND h.full_url IS NOT NULL
-            ORDER BY h.timestamp DESC
-            LIMIT ?
-        """, (device_id, limit))
-    else:
-        cursor.execute("""
-            SELECT h.full_url, h.method, h.host, h.path, h.user_agent, h.referer, h.timestamp,
-                   d.ip_address, d.hostname, d.vendor
-            FROM http_metadata h
-            JOIN devices d ON h.device_id = d.id
-            WHERE h.full_url IS NOT NULL
-            ORDER BY h.timestamp DESC
-            LIMIT ?
-        """, (limit,))
+        page.where("h.device_id = ?", device_id)
+    if host:
+        page.where("h.host_id = (SELECT id FROM hosts WHERE name = ?)", host)
     
-    rows = cursor.fetchall()
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT u.name, h.method, hs.name, h.path, ua.name, h.referer,
+               d.ip_address, d.hostname, d.vendor, h.timestamp, h.id
+        FROM http_metadata h
+        JOIN urls u ON h.url_id = u.id
+        LEFT JOIN hosts hs ON h.host_id = hs.id
+        LEFT JOIN user_agents ua ON h.user_agent_id = ua.id
+        JOIN devices d ON h.device_id = d.id
+        {page.clauses()}
+    """, page.query_params())
+    rows = page.finish(cursor.fetchall(), response)
     conn.close()
     
     return [
@@ -47,10 +43,10 @@ def get_urls(device_id: int = None, limit: int = 100):
             "path": row[3],
             "user_agent": row[4],
             "referer": row[5],
-            "timestamp": row[6],
-            "device_ip": row[7],
-            "device_hostname": row[8],
-            "device_vendor": row[9]
+            "timestamp": row[9],
+            "device_ip": row[6],
+            "device_hostname": row[7],
+            "device_vendor": row[8]
         }
         for row in rows
     ]
@@ -58,15 +54,14 @@ def get_urls(device_id: int = None, limit: int = 100):
 @router.get("/top-sites")
 def get_top_sites(limit: int = 20):
     """Get most visited websites."""
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
-        SELECT host, COUNT(*) as visit_count
-        FROM http_metadata
-        WHERE host IS NOT NULL
-        GROUP BY host
-        ORDER BY visit_count DESC
+        SELECT hs.name, c.count
+        FROM http_host_counts c
+        JOIN hosts hs ON c.host_id = hs.id
+        ORDER BY c.count DESC
         LIMIT ?
     """, (limit,))
     
@@ -76,18 +71,23 @@ def get_top_sites(limit: int = 20):
     return [{"host": row[0], "visits": row[1]} for row in rows]
 
 @router.get("/user-agents")
-def get_user_agents():
-    """Get unique user agents (device fingerprinting)."""
-    conn = get_connection()
+def get_user_agents(limit: int = DEFAULT_LIMIT):
+    """Get the most common user agents (device fingerprinting)."""
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
-        SELECT DISTINCT user_agent, COUNT(*) as count
-        FROM http_metadata
-        WHERE user_agent IS NOT NULL
-        GROUP BY user_agent
-        ORDER BY count DESC
-    """)
+        SELECT ua.name, r.count
+        FROM (
+            SELECT user_agent_id, COUNT(*) as count
+            FROM http_metadata
+            WHERE user_agent_id IS NOT NULL
+            GROUP BY user_agent_id
+        ) r
+        JOIN user_agents ua ON r.user_agent_id = ua.id
+        ORDER BY r.count DESC
+        LIMIT ?
+    """, (min(max(limit, 1), MAX_LIMIT),))
     
     rows = cursor.fetchall()
     conn.close()
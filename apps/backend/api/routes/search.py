@@ -0,0 +1,124 @@
+"""Substring search over domains, hosts, URLs and user agents."""
+from fastapi import APIRouter, HTTPException
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from shared.database import get_read_connection
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+# Dictionary strings matched per query; events are then fetched by id
+MAX_MATCHES = 500
+
+# Trigram index needs at least 3 characters; shorter queries use LIKE
+MIN_FTS_LENGTH = 3
+
+# kind -> (dictionary table, event query with {ids} placeholder, extra fields)
+SEARCH_KINDS = {
+    "domain": ("domains", """
+        SELECT dm.name, q.timestamp, d.id, d.mac_address, d.ip_address, d.hostname, d.vendor,
+               q.query_type
+        FROM dns_queries q
+        JOIN domains dm ON q.domain_id = dm.id
+        LEFT JOIN devices d ON q.device_id = d.id
+        WHERE q.domain_id IN ({ids})
+        ORDER BY q.timestamp DESC
+        LIMIT ?
+    """, ["query_type"]),
+    "host": ("hosts", """
+        SELECT hs.name, h.timestamp, d.id, d.mac_address, d.ip_address, d.hostname, d.vendor,
+               h.method, u.name
+        FROM http_metadata h
+        JOIN hosts hs ON h.host_id = hs.id
+        LEFT JOIN urls u ON h.url_id = u.id
+        LEFT JOIN devices d ON h.device_id = d.id
+        WHERE h.host_id IN ({ids})
+        ORDER BY h.timestamp DESC
+        LIMIT ?
+    """, ["method", "url"]),
+    "url": ("urls", """
+        SELECT u.name, h.timestamp, d.id, d.mac_address, d.ip_address, d.hostname, d.vendor,
+               h.method, u.name
+        FROM http_metadata h
+        JOIN urls u ON h.url_id = u.id
+        LEFT JOIN devices d ON h.device_id = d.id
+        WHERE h.url_id IN ({ids})
+        ORDER BY h.timestamp DESC
+        LIMIT ?
+    """, ["method", "url"]),
+    "user_agent": ("user_agents", """
+        SELECT ua.name, h.timestamp, d.id, d.mac_address, d.ip_address, d.hostname, d.vendor,
+               h.method, u.name
+        FROM http_metadata h
+        JOIN user_agents ua ON h.user_agent_id = ua.id
+        LEFT JOIN urls u ON h.url_id = u.id
+        LEFT JOIN devices d ON h.device_id = d.id
+        WHERE h.user_agent_id IN ({ids})
+        ORDER BY h.timestamp DESC
+        LIMIT ?
+    """, ["method", "url"]),
+}
+
+def _match_ids(cursor, table, q):
+    """Ids of dictionary strings containing q."""
+    if len(q) >= MIN_FTS_LENGTH:
+        try:
+            cursor.execute(f"SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ? LIMIT ?",
+                           ('"' + q.replace('"', '""') + '"', MAX_MATCHES))
+            return [row[0] for row in cursor.fetchall()]
+        except sqlite3.OperationalError:
+            pass  # No FTS5 in this build
+
+    pattern = '%' + q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    cursor.execute(f"SELECT id FROM {table} WHERE name LIKE ? ESCAPE '\\' LIMIT ?", (pattern, MAX_MATCHES))
+    return [row[0] for row in cursor.fetchall()]
+
+@router.get("/")
+def search(q: str, kind: str = None, limit: int = 100):
+    """Find events whose domain, host, URL or user agent contains q."""
+    if not q:
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    if kind and kind not in SEARCH_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown kind, expected one of {', '.join(SEARCH_KINDS)}")
+
+    conn = get_read_connection()
+    cursor = conn.cursor()
+
+    results = []
+    matches = {}
+    for name, (table, sql, fields) in SEARCH_KINDS.items():
+        if kind and name != kind:
+            continue
+
+        ids = _match_ids(cursor, table, q)
+        matches[name] = len(ids)
+        if not ids:
+            continue
+
+        cursor.execute(sql.format(ids=','.join('?' * len(ids))), ids + [limit])
+        for row in cursor.fetchall():
+            result = {
+                "kind": name,
+                "match": row[0],
+                "timestamp": row[1],
+                "device_id": row[2],
+                "device_mac": row[3],
+                "device_ip": row[4],
+                "device_hostname": row[5],
+                "device_vendor": row[6]
+            }
+            result.update(zip(fields, row[7:]))
+            results.append(result)
+
+    conn.close()
+
+    results.sort(key=lambda r: r["timestamp"] or "", reverse=True)
+
+    return {
+        "query": q,
+        "matches": matches,
+        "truncated": any(count >= MAX_MATCHES for count in matches.values()),
+        "results": results[:limit]
+    }
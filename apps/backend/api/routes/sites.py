@@ -1,41 +1,40 @@
 """Visited websites tracking endpoints."""
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from typing import List
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from shared.database import get_connection
+from shared.database import get_read_connection
+from api.pagination import Page, DEFAULT_LIMIT
 
 router = APIRouter(prefix="/sites", tags=["sites"])
 
 @router.get("/visited")
-def get_visited_sites(device_id: int = None, limit: int = 100):
-    """Get visited websites from SNI extraction."""
-    conn = get_connection()
-    cursor = conn.cursor()
+def get_visited_sites(response: Response, device_id: int = None, domain: str = None, since: str = None,
+                      until: str = None, after: str = None, limit: int = DEFAULT_LIMIT):
+    """Get visited websites from SNI extraction, most recent first.
     
+    Pass X-Next-Cursor back as `after` for the next page. Paging is by last
+    visit, so a site visited again while paging moves to the front.
+    """
+    page = Page('v.last_seen', 'v.id', after=after, limit=limit, since=since, until=until)
     if device_id:
-        cursor.execute("""
-            SELECT v.domain, v.visit_count, v.first_seen, v.last_seen,
-                   d.ip_address, d.hostname, d.vendor
-            FROM visited_sites v
-            JOIN devices d ON v.device_id = d.id
-            WHERE v.device_id = ?
-            ORDER BY v.last_seen DESC
-            LIMIT ?
-        """, (device_id, limit))
-    else:
-        cursor.execute("""
-            SELECT v.domain, v.visit_count, v.first_seen, v.last_seen,
-                   d.ip_address, d.hostname, d.vendor
-            FROM visited_sites v
-            JOIN devices d ON v.device_id = d.id
-            ORDER BY v.last_seen DESC
-            LIMIT ?
-        """, (limit,))
+        page.where("v.device_id = ?", device_id)
+    if domain:
+        page.where("v.domain_id = (SELECT id FROM domains WHERE name = ?)", domain)
     
-    rows = cursor.fetchall()
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT dm.name, v.visit_count, v.first_seen,
+               d.ip_address, d.hostname, d.vendor, v.last_seen, v.id
+        FROM visited_sites v
+        JOIN domains dm ON v.domain_id = dm.id
+        JOIN devices d ON v.device_id = d.id
+        {page.clauses()}
+    """, page.query_params())
+    rows = page.finish(cursor.fetchall(), response)
     conn.close()
     
     return [
@@ -43,10 +42,10 @@ def get_visited_sites(device_id: int = None, limit: int = 100):
             "domain": row[0],
             "visit_count": row[1],
             "first_seen": row[2],
-            "last_seen": row[3],
-            "device_ip": row[4],
-            "device_hostname": row[5],
-            "device_vendor": row[6]
+            "last_seen": row[6],
+            "device_ip": row[3],
+            "device_hostname": row[4],
+            "device_vendor": row[5]
         }
         for row in rows
     ]
@@ -54,14 +53,14 @@ def get_visited_sites(device_id: int = None, limit: int = 100):
 @router.get("/top-sites")
 def get_top_sites(limit: int = 20):
     """Get most visited websites."""
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
-        SELECT domain, SUM(visit_count) as total_visits
-        FROM visited_sites
-        GROUP BY domain
-        ORDER BY total_visits DESC
+        SELECT dm.name, c.visits
+        FROM site_counts c
+        JOIN domains dm ON c.domain_id = dm.id
+        ORDER BY c.visits DESC
         LIMIT ?
     """, (limit,))
     
@@ -71,19 +70,20 @@ def get_top_sites(limit: int = 20):
     return [{"domain": row[0], "visits": row[1]} for row in rows]
 
 @router.get("/by-device/{device_id}")
-def get_sites_by_device(device_id: int):
-    """Get all sites visited by specific device."""
-    conn = get_connection()
-    cursor = conn.cursor()
+def get_sites_by_device(device_id: int, response: Response, after: str = None, limit: int = DEFAULT_LIMIT):
+    """Get sites visited by specific device, most recent first."""
+    page = Page('v.last_seen', 'v.id', after=after, limit=limit)
+    page.where("v.device_id = ?", device_id)
     
-    cursor.execute("""
-        SELECT domain, visit_count, first_seen, last_seen
-        FROM visited_sites
-        WHERE device_id = ?
-        ORDER BY last_seen DESC
-    """, (device_id,))
-    
-    rows = cursor.fetchall()
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT dm.name, v.visit_count, v.first_seen, v.last_seen, v.id
+        FROM visited_sites v
+        JOIN domains dm ON v.domain_id = dm.id
+        {page.clauses()}
+    """, page.query_params())
+    rows = page.finish(cursor.fetchall(), response)
     conn.close()
     
     return [
@@ -1,10 +1,11 @@
 """Statistics endpoints."""
 from fastapi import APIRouter
+import json
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from shared.database import get_connection
+from shared.database import get_read_connection
 from api.models.schemas import Stats
 
 router = APIRouter(prefix="/stats", tags=["stats"])
@@ -12,7 +13,7 @@ router = APIRouter(prefix="/stats", tags=["stats"])
 @router.get("/", response_model=Stats)
 def get_stats():
     """Get system statistics."""
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     cursor.execute("SELECT COUNT(*) FROM devices")
@@ -35,3 +36,47 @@ def get_stats():
         total_threats=total_threats,
         unresolved_threats=unresolved_threats
     )
+
+@router.get("/maintenance")
+def get_maintenance_stats(limit: int = 50):
+    """Get recent maintenance runs and time spent per task."""
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT task, COUNT(*), SUM(duration_ms), AVG(duration_ms), MAX(duration_ms), MAX(started_at)
+        FROM maintenance_runs
+        WHERE started_at >= datetime('now', '-1 day')
+        GROUP BY task
+    """)
+    
+    tasks = {}
+    for row in cursor.fetchall():
+        tasks[row[0]] = {
+            "runs_24h": row[1],
+            "total_ms_24h": row[2],
+            "avg_ms": round(row[3], 1),
+            "max_ms": row[4],
+            "last_run": row[5]
+        }
+    
+    cursor.execute("""
+        SELECT task, started_at, duration_ms, status, details
+        FROM maintenance_runs
+        ORDER BY id DESC
+        LIMIT ?
+    """, (limit,))
+    
+    runs = []
+    for row in cursor.fetchall():
+        runs.append({
+            "task": row[0],
+            "started_at": row[1],
+            "duration_ms": row[2],
+            "status": row[3],
+            "details": json.loads(row[4]) if row[4] else None
+        })
+    
+    conn.close()
+    
+    return {"tasks": tasks, "runs": runs}
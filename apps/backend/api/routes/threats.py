@@ -1,40 +1,46 @@
 """Threat management endpoints."""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from typing import List
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from shared.database import get_connection
+from shared.database import get_connection, get_read_connection
 from api.models.schemas import Threat
+from api.pagination import Page, DEFAULT_LIMIT
 
 router = APIRouter(prefix="/threats", tags=["threats"])
 
 @router.get("/", response_model=List[Threat])
-def get_threats(unresolved_only: bool = False):
-    """Get all threats."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    query = "SELECT * FROM threats"
+def get_threats(response: Response, unresolved_only: bool = False, device_id: int = None, since: str = None,
+                until: str = None, after: str = None, limit: int = DEFAULT_LIMIT):
+    """Get threats, newest first; pass X-Next-Cursor back as `after` for the next page."""
+    page = Page('detected_at', 'id', after=after, limit=limit, since=since, until=until)
     if unresolved_only:
-        query += " WHERE resolved = 0"
-    query += " ORDER BY detected_at DESC"
+        page.where("resolved = 0")
+    if device_id:
+        page.where("device_id = ?", device_id)
     
-    cursor.execute(query)
-    rows = cursor.fetchall()
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT device_id, threat_type, severity, description, resolved, detected_at, id
+        FROM threats
+        {page.clauses()}
+    """, page.query_params())
+    rows = page.finish(cursor.fetchall(), response)
     conn.close()
     
     threats = []
     for row in rows:
         threats.append(Threat(
-            id=row[0],
-            device_id=row[1],
-            threat_type=row[2],
-            severity=row[3],
-            description=row[4],
+            id=row[6],
+            device_id=row[0],
+            threat_type=row[1],
+            severity=row[2],
+            description=row[3],
             detected_at=row[5],
-            resolved=bool(row[6])
+            resolved=bool(row[4])
         ))
     
     return threats
@@ -0,0 +1,58 @@
+"""Per-device traffic time series."""
+from fastapi import APIRouter, HTTPException, Query
+from datetime import datetime, timedelta
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from shared.database import get_read_connection, TRAFFIC_RESOLUTIONS
+from shared.storage import get_storage
+from api.pagination import parse_timestamp
+
+router = APIRouter(prefix="/traffic", tags=["traffic"])
+
+# Approximate points returned when no step is given
+DEFAULT_POINTS = 200
+
+def _parse_time(value):
+    """Naive UTC datetime of an ISO 8601 parameter; 400 if invalid."""
+    return datetime.strptime(parse_timestamp(value), '%Y-%m-%d %H:%M:%S')
+
+@router.get("/{device_id}")
+def get_traffic(device_id: int, from_: str = Query(None, alias="from"), to: str = None, step: int = None):
+    """Get traffic for a device between from and to (UTC), one point per step seconds.
+
+    Reads the coarsest stored resolution that is no wider than step.
+    """
+    end = _parse_time(to) if to else datetime.utcnow()
+    start = _parse_time(from_) if from_ else end - timedelta(days=1)
+    span = (end - start).total_seconds()
+    if span <= 0:
+        raise HTTPException(status_code=400, detail="from must be before to")
+
+    if step is not None and step <= 0:
+        raise HTTPException(status_code=400, detail="step must be positive")
+    target = step or span / DEFAULT_POINTS
+    resolution = max((seconds for seconds in TRAFFIC_RESOLUTIONS if seconds <= target), default=min(TRAFFIC_RESOLUTIONS))
+
+    # Default step: whole multiples of the stored resolution, about DEFAULT_POINTS points
+    step = step or resolution * max(1, -(-int(target) // resolution))
+
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM devices WHERE id = ?", (device_id,))
+    exists = cursor.fetchone()
+    conn.close()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Device not found")
+
+    start = start.strftime('%Y-%m-%d %H:%M:%S')
+    end = end.strftime('%Y-%m-%d %H:%M:%S')
+    return {
+        "device_id": device_id,
+        "from": start,
+        "to": end,
+        "step": step,
+        "resolution": resolution,
+        "points": get_storage().traffic_series(device_id, resolution, step, start, end)
+    }
@@ -1,33 +1,35 @@
 """Comprehensive website tracking - all sources combined."""
 from fastapi import APIRouter
-from shared.database import get_connection
+from shared.database import get_read_connection
 
 router = APIRouter()
 
 @router.get("/all")
 def get_all_websites():
     """Get all websites from all sources (DNS, SNI, HTTP)."""
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     # Combine DNS queries, SNI, and HTTP
     query = """
-    SELECT DISTINCT domain as website, 'dns' as source, COUNT(*) as count, MAX(timestamp) as last_seen
-    FROM dns_queries 
-    WHERE domain NOT LIKE '%.in-addr.arpa' 
-      AND domain NOT LIKE '%.local'
-      AND domain NOT LIKE '_%.%'
-    GROUP BY domain
+    SELECT dm.name as website, 'dns' as source, c.count, c.last_seen
+    FROM domain_counts c
+    JOIN domains dm ON c.domain_id = dm.id
+    WHERE dm.name NOT LIKE '%.in-addr.arpa' 
+      AND dm.name NOT LIKE '%.local'
+      AND dm.name NOT LIKE '_%.%'
     
     UNION ALL
     
-    SELECT DISTINCT domain as website, 'https' as source, visit_count as count, last_seen
-    FROM visited_sites
+    SELECT dm.name as website, 'https' as source, v.visit_count as count, v.last_seen
+    FROM visited_sites v
+    JOIN domains dm ON v.domain_id = dm.id
     
     UNION ALL
     
-    SELECT DISTINCT full_url as website, 'http' as source, 1 as count, timestamp as last_seen
-    FROM http_metadata
+    SELECT u.name as website, 'http' as source, c.count, c.last_seen
+    FROM url_counts c
+    JOIN urls u ON c.url_id = u.id
     
     ORDER BY last_seen DESC
     """
@@ -65,7 +67,7 @@ def get_all_websites():
 @router.get("/by-device/{ip}")
 def get_websites_by_device(ip: str):
     """Get all websites accessed by a specific device."""
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     # Get device ID
@@ -79,13 +81,17 @@ def get_websites_by_device(ip: str):
     
     # Get DNS queries
     cursor.execute("""
-        SELECT DISTINCT domain, COUNT(*) as count, MAX(timestamp) as last_seen
-        FROM dns_queries 
-        WHERE device_id = ? 
-          AND domain NOT LIKE '%.in-addr.arpa'
-          AND domain NOT LIKE '%.local'
-        GROUP BY domain
-        ORDER BY last_seen DESC
+        SELECT dm.name, r.count, r.last_seen
+        FROM (
+            SELECT domain_id, COUNT(*) as count, MAX(timestamp) as last_seen
+            FROM dns_queries 
+            WHERE device_id = ? 
+            GROUP BY domain_id
+        ) r
+        JOIN domains dm ON r.domain_id = dm.id
+        WHERE dm.name NOT LIKE '%.in-addr.arpa'
+          AND dm.name NOT LIKE '%.local'
+        ORDER BY r.last_seen DESC
     """, (device_id,))
     
     websites = [{'domain': row[0], 'requests': row[1], 'last_seen': row[2]} for row in cursor.fetchall()]
@@ -101,29 +107,30 @@ def get_websites_by_device(ip: str):
 @router.get("/stats")
 def get_website_stats():
     """Get website access statistics."""
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     # Total unique domains
     cursor.execute("""
-        SELECT COUNT(DISTINCT domain) FROM dns_queries 
-        WHERE domain NOT LIKE '%.in-addr.arpa' AND domain NOT LIKE '%.local'
+        SELECT COUNT(*) FROM domain_counts c
+        JOIN domains dm ON c.domain_id = dm.id
+        WHERE dm.name NOT LIKE '%.in-addr.arpa' AND dm.name NOT LIKE '%.local'
     """)
     total_dns = cursor.fetchone()[0]
     
-    cursor.execute("SELECT COUNT(DISTINCT domain) FROM visited_sites")
+    cursor.execute("SELECT COUNT(*) FROM site_counts")
     total_https = cursor.fetchone()[0]
     
-    cursor.execute("SELECT COUNT(DISTINCT full_url) FROM http_metadata")
+    cursor.execute("SELECT COUNT(*) FROM url_counts")
     total_http = cursor.fetchone()[0]
     
-    # Top domains
+    # Top domains (walks the count index until 20 rows pass the filter)
     cursor.execute("""
-        SELECT domain, COUNT(*) as count 
-        FROM dns_queries 
-        WHERE domain NOT LIKE '%.in-addr.arpa' AND domain NOT LIKE '%.local'
-        GROUP BY domain 
-        ORDER BY count DESC 
+        SELECT dm.name, c.count 
+        FROM domain_counts c
+        JOIN domains dm ON c.domain_id = dm.id
+        WHERE dm.name NOT LIKE '%.in-addr.arpa' AND dm.name NOT LIKE '%.local'
+        ORDER BY c.count DESC 
         LIMIT 20
     """)
     top_domains = [{'domain': row[0], 'requests': row[1]} for row in cursor.fetchall()]
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Benchmark API endpoint latency while the monitor writes at full rate.
+
+Compares the shared writer connection against the read-only reader pool.
+
+    python3 bench-api.py --devices 200 --events 200000 --seconds 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--db', help='database path (default: temporary file)')
+parser.add_argument('--devices', type=int, default=200)
+parser.add_argument('--events', type=int, default=200000, help='DNS/connection rows to seed')
+parser.add_argument('--seconds', type=float, default=10.0, help='duration per mode')
+parser.add_argument('--readers', type=int, default=4, help='concurrent API reader threads')
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp(prefix='edgeguard-bench-')
+os.environ.setdefault('EDGEGUARD_DB_PATH', args.db or os.path.join(workdir, 'edgeguard.db'))
+os.environ.setdefault('EDGEGUARD_JOURNAL_DIR', os.path.join(workdir, 'journal'))
+
+sys.path.append(str(Path(__file__).parent))
+from shared import database
+from shared.database import init_db, get_connection, get_read_connection
+from service.collectors.device_tracker import DeviceTracker
+from api.routes import dns, connections, http, sites, websites, stats
+
+ENDPOINTS = {
+    '/dns/queries': lambda: dns.get_dns_queries(limit=100),
+    '/dns/top-domains': lambda: dns.get_top_domains(limit=10),
+    '/connections/top-destinations': lambda: connections.get_top_destinations(limit=10),
+    '/http/urls': lambda: http.get_urls(limit=100),
+    '/sites/top-sites': lambda: sites.get_top_sites(limit=20),
+    '/websites/stats': websites.get_website_stats,
+    '/stats/': stats.get_stats,
+}
+
+def seed():
+    """Create devices and historical events."""
+    init_db()
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM devices")
+    if cursor.fetchone()[0] >= args.devices:
+        conn.close()
+        return
+
+    print(f"Seeding {args.devices} devices and {args.events} events into {database.DB_PATH} ...")
+    cursor.executemany(
+        "INSERT OR IGNORE INTO devices (mac_address, ip_address) VALUES (?, ?)",
+        [(f"02:00:00:00:{i // 256:02x}:{i % 256:02x}", f"10.0.{i // 256}.{i % 256}") for i in range(args.devices)]
+    )
+    cursor.executemany("INSERT OR IGNORE INTO domains (name) VALUES (?)",
+                       [(f"host{i}.example{i % 97}.com",) for i in range(5000)])
+    cursor.executemany(
+        "INSERT INTO dns_queries (device_id, domain_id, query_type, timestamp) VALUES (?, ?, '1', datetime('now', ?))",
+        [(i % args.devices + 1, i % 5000 + 1, f"-{i % 43200} minutes") for i in range(args.events)]
+    )
+    cursor.executemany(
+        "INSERT OR IGNORE INTO connections (device_id, protocol, dst_ip, dst_port, bytes_sent, bucket, last_seen) "
+        "VALUES (?, 'TCP', ?, 443, 1500, strftime('%Y-%m-%d %H:00:00', 'now', ?3), datetime('now', ?3))",
+        [(i % args.devices + 1, f"93.184.{i % 250}.{i % 200}", f"-{i % 43200} minutes") for i in range(args.events)]
+    )
+    conn.commit()
+    conn.close()
+
+    # Rebuild counters from the seeded rows
+    conn = get_connection()
+    for table in database.COUNTER_TABLES:
+        conn.execute(f"DROP TABLE {table}")
+    conn.commit()
+    conn.close()
+    init_db()
+
+def writer(stop, counter):
+    """Write events through DeviceTracker as fast as possible."""
+    tracker = DeviceTracker()
+    i = 0
+    while not stop.is_set():
+        ip = f"10.0.{(i % args.devices) // 256}.{(i % args.devices) % 256}"
+        tracker.log_dns_query(ip, f"live{i % 1000}.example.com", 1)
+        tracker.log_connection(ip, 40000 + i % 1000, f"1.1.{i % 250}.1", 443, 'TCP', 1200)
+        tracker.log_http_metadata(ip, 'GET', 'example.com', f"/p{i % 100}",
+                                  f"http://example.com/p{i % 100}", 'bench-agent/1.0', None)
+        i += 1
+    counter.append(i * 3)
+
+def reader(stop, samples):
+    """Call every endpoint in turn, recording latencies."""
+    while not stop.is_set():
+        for name, call in ENDPOINTS.items():
+            started = time.perf_counter()
+            call()
+            samples.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+
+def run(mode):
+    factory = get_read_connection if mode == 'pool' else get_connection
+    for module in (dns, connections, http, sites, websites, stats):
+        module.get_read_connection = factory
+
+    stop = threading.Event()
+    written = []
+    samples = {}
+    threads = [threading.Thread(target=writer, args=(stop, written))]
+    threads += [threading.Thread(target=reader, args=(stop, samples)) for _ in range(args.readers)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    print(f"\n[{mode}] writer: {sum(written) / args.seconds:,.0f} events/s")
+    print(f"{'endpoint':34} {'calls':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, values in samples.items():
+        values.sort()
+        p95 = values[int(len(values) * 0.95) - 1] if len(values) > 1 else values[0]
+        p99 = values[int(len(values) * 0.99) - 1] if len(values) > 1 else values[0]
+        print(f"{name:34} {len(values):6} {statistics.median(values):8.2f} {p95:8.2f} {p99:8.2f}")
+
+seed()
+run('shared')
+run('pool')
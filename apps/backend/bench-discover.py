@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Time /discover/devices against the per-device query pattern it replaced.
+
+Seeds devices and DNS queries, then times the endpoint (two set-based
+queries over devices and device_domains) against the former loop of one
+DISTINCT query over dns_queries per device.
+
+    python3 bench-discover.py --devices 1000 --dns 10000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--db', help='database path (default: temporary file)')
+parser.add_argument('--devices', type=int, default=1000)
+parser.add_argument('--dns', type=int, default=10000000, help='DNS query rows to seed')
+parser.add_argument('--domains', type=int, default=20000)
+parser.add_argument('--repeat', type=int, default=5)
+parser.add_argument('--skip-baseline', action='store_true', help='skip the per-device queries (slow: one scan per device)')
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp(prefix='edgeguard-bench-')
+os.environ.setdefault('EDGEGUARD_DB_PATH', args.db or os.path.join(workdir, 'edgeguard.db'))
+
+sys.path.append(str(Path(__file__).parent))
+sys.path.append(str(Path(__file__).parent / 'api'))
+from shared import database
+from shared.database import init_db, get_connection, get_read_connection
+from routes.discover import discover_all_devices
+
+def seed():
+    init_db()
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM dns_queries")
+    if cursor.fetchone()[0] >= args.dns:
+        conn.close()
+        return
+
+    print(f"Seeding {args.devices} devices and {args.dns} DNS queries into {database.DB_PATH} ...")
+    started = time.time()
+    cursor.executemany(
+        "INSERT OR IGNORE INTO devices (mac_address, ip_address, vendor, open_ports) VALUES (?, ?, ?, ?)",
+        [(f"02:00:00:00:{i // 256:02x}:{i % 256:02x}", f"10.{i // 65536}.{i // 256 % 256}.{i % 256}",
+          "Google" if i % 3 else None, "443,8008" if i % 5 == 0 else None) for i in range(args.devices)]
+    )
+    cursor.executemany("INSERT OR IGNORE INTO domains (name) VALUES (?)",
+                       [(f"host{i}.example{i % 97}.com",) for i in range(args.domains)])
+    # Each device queries its own subset of domains, generated inside SQLite
+    cursor.execute("""
+        WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < ?)
+        INSERT INTO dns_queries (device_id, domain_id, query_type, timestamp)
+        SELECT i % ? + 1, (i * 7919 + (i % ?) * 104729) % (? / 4) + 1 + (i % 4) * (? / 4), '1',
+               datetime('now', '-' || ((i * 31) % 1209600) || ' seconds')
+        FROM n
+    """, (args.dns, args.devices, args.devices, args.domains, args.domains))
+
+    # Rebuild the per-device rollup from the seeded rows, as on first startup
+    cursor.execute("DROP TABLE IF EXISTS device_domains")
+    conn.commit()
+    conn.close()
+    init_db()
+    print(f"Seeded in {time.time() - started:.0f}s")
+
+def per_device_queries():
+    """The former pattern: one DISTINCT query over dns_queries per device."""
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM devices ORDER BY last_seen DESC")
+    for (device_id,) in cursor.fetchall():
+        cursor.execute("""
+            SELECT DISTINCT dm.name
+            FROM dns_queries q
+            JOIN domains dm ON q.domain_id = dm.id
+            WHERE q.device_id = ?
+              AND dm.name NOT LIKE '%.in-addr.arpa'
+              AND dm.name NOT LIKE '%.local'
+            LIMIT 10
+        """, (device_id,))
+        cursor.fetchall()
+    conn.close()
+
+def timed(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - started)
+    return statistics.median(runs), result
+
+seed()
+endpoint, response = timed(discover_all_devices, args.repeat)
+with_domains = sum(1 for d in response['devices'] if d['dns_domains'])
+assert response['total_devices'] == args.devices
+assert all(len(d['dns_domains']) <= 10 for d in response['devices'])
+
+if not args.skip_baseline:
+    baseline, _ = timed(per_device_queries, 1)
+    print(f"per-device queries ({args.devices + 1} queries)  {baseline * 1000:10.1f} ms")
+print(f"/discover/devices (2 queries)        {endpoint * 1000:10.1f} ms   "
+      f"{with_domains}/{args.devices} devices with domains")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Check the Fingerbank cache against a local stub API, and time lookups.
+
+A stub server stands in for api.fingerbank.org. Many devices of a few models
+are identified concurrently. The script checks that each distinct
+combination reaches the API once, that answers survive a restart through
+the cache table, and that server errors are retried instead of cached.
+
+    python3 bench-fingerbank.py --devices 2000 --models 20
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--devices', type=int, default=2000)
+parser.add_argument('--models', type=int, default=20)
+parser.add_argument('--threads', type=int, default=16)
+parser.add_argument('--latency', type=float, default=0.05, help='stub API response time in seconds')
+args = parser.parse_args()
+
+requests_seen = []
+failing = set()
+
+class StubFingerbank(BaseHTTPRequestHandler):
+    def do_GET(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        requests_seen.append(payload)
+        time.sleep(args.latency)
+        if payload.get('dhcp_fingerprint') in failing:
+            self.send_response(503)
+            self.end_headers()
+            return
+        model = payload.get('dhcp_fingerprint', '').split(',')[-1]
+        body = {} if model == '0' else {
+            'device': {'name': f"Model {model}", 'parent_name': 'Linux'},
+            'device_class': {'name': 'IoT'},
+            'version': '1.0',
+            'score': 87,
+        }
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *_):
+        pass
+
+server = ThreadingHTTPServer(('127.0.0.1', 0), StubFingerbank)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+workdir = tempfile.mkdtemp(prefix='edgeguard-bench-')
+os.environ['EDGEGUARD_DB_PATH'] = os.path.join(workdir, 'edgeguard.db')
+os.environ['FINGERBANK_API_URL'] = f"http://127.0.0.1:{server.server_port}/api/v2/combinations/interrogate"
+os.environ['FINGERBANK_API_KEY'] = 'stub'
+
+sys.path.append(str(Path(__file__).parent))
+from shared.database import init_db
+from service.collectors import fingerbank_api
+
+init_db()
+
+def device(i):
+    """MAC, DHCP fingerprint and hostname for a device; model 0 is unknown to the stub."""
+    model = i % args.models
+    mac = f"{0x020000 + model:06x}{i:06x}"
+    return (':'.join(mac[j:j + 2] for j in range(0, 12, 2)),
+            f"1,3,6,15,{model}", f"sensor-{i:04x}.lan")
+
+def identify_all():
+    timings = []
+    def one(i):
+        started = time.perf_counter()
+        result = fingerbank_api.interrogate(*device(i)[:2], hostname=device(i)[2])
+        timings.append(time.perf_counter() - started)
+        expected = None if i % args.models == 0 else f"Model {i % args.models}"
+        assert (result and result['device_name']) == expected, (i, result)
+    order = list(range(args.devices))
+    random.shuffle(order)
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(one, order))
+    return timings
+
+def report(label, timings):
+    timings = sorted(timings)
+    print(f"{label:<28} {len(requests_seen):>6} API requests   "
+          f"p50 {statistics.median(timings) * 1000:8.3f} ms   p99 {timings[int(len(timings) * 0.99)] * 1000:8.3f} ms")
+
+print(f"{args.devices} devices, {args.models} models, {args.threads} threads, stub latency {args.latency * 1000:.0f} ms")
+report("cold cache", identify_all())
+assert len(requests_seen) == args.models, f"expected {args.models} API requests, got {len(requests_seen)}"
+
+# A restart loses the in-process state but keeps the cache table
+requests_seen.clear()
+fingerbank_api._in_flight.clear()
+report("warm cache (after restart)", identify_all())
+assert not requests_seen, "cached combinations were queried again"
+
+# Server errors reach every waiting caller and are not cached
+requests_seen.clear()
+failing.add('1,3,6,15,x')
+errors = []
+def failing_lookup(_):
+    try:
+        fingerbank_api.interrogate('02:aa:bb:00:00:01', '1,3,6,15,x')
+    except Exception as e:
+        errors.append(e)
+with ThreadPoolExecutor(8) as pool:
+    list(pool.map(failing_lookup, range(8)))
+assert len(errors) == 8, errors
+failing.clear()
+fingerbank_api.interrogate('02:aa:bb:00:00:01', '1,3,6,15,x')
+assert len(requests_seen) >= 2, "server error was cached"
+
+print(f"counters: {fingerbank_api.cache_counters}")
+print("OK")
+server.shutdown()
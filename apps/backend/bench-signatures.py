@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Check the compiled signature matcher against the per-signature scan, and time them.
+
+Random device profiles (vendor, DNS domains, open ports) are built from
+signature fragments and noise. Every profile must get the same result from
+both implementations, first for the shipped signatures and then for a
+synthetic set of --signatures entries.
+
+    python3 bench-signatures.py --profiles 20000 --signatures 2000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--profiles', type=int, default=20000)
+parser.add_argument('--signatures', type=int, default=2000, help='size of the synthetic signature set')
+parser.add_argument('--seed', type=int, default=1)
+args = parser.parse_args()
+
+sys.path.append(str(Path(__file__).parent))
+from service import device_signatures
+from service.device_signatures import SignatureMatcher, _identify_device_scan
+
+random.seed(args.seed)
+NOISE = ['apple.com', 'cdn.example.net', 'api.weather.io', 'time.nist.gov', 'Ring', 'GOOGLE', '']
+
+def synthetic_signatures(count):
+    words = [f"{random.choice('abcdefghij')}{random.choice('klmnop')}{random.randrange(100)}" for _ in range(count // 2)]
+    signatures = {}
+    for i in range(count):
+        signatures[f"sig_{i}"] = {
+            "vendors": [f"Vendor {random.choice(words)}" for _ in range(random.randrange(0, 3))],
+            "dns_patterns": [f"{random.choice(words)}.{random.choice(['com', 'net', 'io'])}"
+                             for _ in range(random.randrange(0, 4))],
+            "ports": random.sample([22, 80, 443, 554, 1883, 8008, 8080, 8443, 9999], random.randrange(0, 3)),
+            "device_type": f"Type {i % 17}",
+            "category": "iot",
+            "icon": "device",
+        }
+    return signatures
+
+def profiles(signatures, count):
+    sigs = list(signatures.values())
+    vendors = [v for s in sigs for v in s["vendors"]] + NOISE
+    patterns = [p for s in sigs for p in s["dns_patterns"]] + NOISE
+    ports = sorted({p for s in sigs for p in s["ports"]} | {1, 2, 3})
+    result = []
+    for _ in range(count):
+        vendor = random.choice([None, '', random.choice(vendors),
+                                f"{random.choice(vendors).upper()} Inc.", random.choice(NOISE)])
+        domains = [f"{random.choice(['', 'x.', 'api-'])}{random.choice(patterns)}{random.choice(['', '.cdn'])}"
+                   for _ in range(random.randrange(0, 12))]
+        open_ports = random.sample(ports, random.randrange(0, 4))
+        result.append((vendor, domains, open_ports))
+    return result
+
+def check(label, signatures):
+    device_signatures.DEVICE_SIGNATURES = signatures  # read by the reference scan
+    started = time.perf_counter()
+    matcher = SignatureMatcher(signatures)
+    build = time.perf_counter() - started
+
+    inputs = profiles(signatures, args.profiles)
+    started = time.perf_counter()
+    expected = [_identify_device_scan(*profile) for profile in inputs]
+    scan = time.perf_counter() - started
+    started = time.perf_counter()
+    actual = [matcher.identify(*profile) for profile in inputs]
+    compiled = time.perf_counter() - started
+
+    mismatches = [(p, e, a) for p, e, a in zip(inputs, expected, actual) if e != a]
+    for profile, e, a in mismatches[:5]:
+        print(f"  MISMATCH {profile}: scan={e} compiled={a}")
+    identified = sum(1 for e in expected if e['device_id'] != 'unknown')
+    print(f"{label:<24} {len(signatures):>6} signatures  {len(inputs)} profiles ({identified} identified)  "
+          f"scan {scan / len(inputs) * 1e6:9.1f} us  compiled {compiled / len(inputs) * 1e6:7.1f} us  "
+          f"build {build * 1000:.0f} ms  {'OK' if not mismatches else f'{len(mismatches)} MISMATCHES'}")
+    return not mismatches
+
+shipped = dict(device_signatures.DEVICE_SIGNATURES)
+ok = check("shipped signatures", shipped)
+ok = check("synthetic signatures", synthetic_signatures(args.signatures)) and ok
+device_signatures.DEVICE_SIGNATURES = shipped
+sys.exit(0 if ok else 1)
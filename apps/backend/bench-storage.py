@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Check that storage backends agree, and time their analytics queries.
+
+Every analytics query runs against each backend on the same database, and
+each backend's result must equal the SQLite result exactly. Both backends
+must be available unless --allow-missing is given. Rollups are brought up
+to date first, and the newest hours are left un-rolled on purpose so the
+days= queries have to combine rollups with raw rows.
+
+    python3 bench-storage.py --devices 200 --events 1000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--db', help='database path (default: temporary file)')
+parser.add_argument('--devices', type=int, default=200)
+parser.add_argument('--events', type=int, default=1000000, help='rows to seed per event table')
+parser.add_argument('--repeat', type=int, default=5, help='timed runs per query')
+parser.add_argument('--allow-missing', action='store_true', help='pass when only some backends can be opened')
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp(prefix='edgeguard-bench-')
+os.environ.setdefault('EDGEGUARD_DB_PATH', args.db or os.path.join(workdir, 'edgeguard.db'))
+
+sys.path.append(str(Path(__file__).parent))
+from shared import database
+from shared.database import COUNTER_TABLES, init_db, get_connection
+from shared.storage import BACKENDS
+from shared.retention import ROLLUPS, rollup_hourly, rollup_daily
+
+def seed():
+    """Create devices and DNS/TLS/HTTP/connection events over 30 days."""
+    init_db()
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM dns_queries")
+    if cursor.fetchone()[0] >= args.events:
+        conn.close()
+        return
+
+    print(f"Seeding {args.devices} devices and {args.events} events per table into {database.DB_PATH} ...")
+    cursor.executemany("INSERT OR IGNORE INTO devices (mac_address) VALUES (?)",
+                       [(f"02:00:00:00:{i // 256:02x}:{i % 256:02x}",) for i in range(args.devices)])
+    cursor.executemany("INSERT OR IGNORE INTO domains (name) VALUES (?)",
+                       [(f"host{i}.example{i % 97}.com",) for i in range(5000)])
+    cursor.executemany("INSERT OR IGNORE INTO hosts (name) VALUES (?)",
+                       [(f"host{i}.example{i % 97}.com",) for i in range(5000)])
+    offsets = [f"-{(i * 7919) % 2592000} seconds" for i in range(args.events)]
+    cursor.executemany(
+        "INSERT INTO dns_queries (device_id, domain_id, query_type, timestamp) VALUES (?, ?, '1', datetime('now', ?))",
+        [(i % args.devices + 1, (i * 31) % 5000 + 1, offsets[i]) for i in range(args.events)]
+    )
+    cursor.executemany(
+        "INSERT INTO tls_metadata (device_id, server_name_id, tls_version, timestamp) VALUES (?, ?, '0x0303', datetime('now', ?))",
+        [(i % args.devices + 1, (i * 17) % 5000 + 1, offsets[i]) for i in range(args.events)]
+    )
+    cursor.executemany(
+        "INSERT INTO http_metadata (device_id, method, host_id, timestamp) VALUES (?, 'GET', ?, datetime('now', ?))",
+        [(i % args.devices + 1, (i * 13) % 5000 + 1, offsets[i]) for i in range(args.events)]
+    )
+    cursor.executemany(
+        "INSERT OR IGNORE INTO connections (device_id, protocol, dst_ip, dst_port, bytes_sent, bytes_received, bucket, last_seen) "
+        "VALUES (?, 'TCP', ?, ?, ?, ?, strftime('%Y-%m-%d %H:00:00', 'now', ?6), datetime('now', ?6))",
+        [(i % args.devices + 1, f"93.184.{i % 250}.{(i * 7) % 200}", 443 if i % 3 else 80,
+          i % 1500, i % 9000, offsets[i]) for i in range(args.events)]
+    )
+    cursor.executemany(
+        "INSERT INTO traffic (device_id, timestamp, bytes_sent, bytes_received, packets_sent, packets_received) "
+        "VALUES (?, datetime('now', ?), ?, ?, ?, ?)",
+        [(i % 4 + 1, f"-{i * 60} seconds", i % 5000, i % 7000, i % 50, i % 70) for i in range(min(args.events, 43200))]
+    )
+    # Counters the capture side keeps up to date as it writes
+    cursor.execute("DELETE FROM domain_counts")
+    cursor.execute(COUNTER_TABLES['domain_counts'][1])
+    conn.commit()
+
+    # Roll up everything but the last few hours
+    for name in ('dns', 'connection'):
+        rollup_hourly(conn, name, ROLLUPS[name])
+        rollup_daily(conn, name, ROLLUPS[name])
+        cursor.execute("UPDATE rollup_state SET hourly_through = strftime('%Y-%m-%d %H:00:00', 'now', '-3 hours') "
+                       "WHERE name = ?", (name,))
+        cursor.execute(f"DELETE FROM {name}_hourly WHERE bucket >= strftime('%Y-%m-%d %H:00:00', 'now', '-3 hours')")
+    conn.commit()
+    conn.close()
+
+def queries():
+    conn = get_connection()
+    week, day, now = conn.execute("SELECT datetime('now', '-7 days'), datetime('now', '-1 day'), datetime('now')").fetchone()
+    conn.close()
+    return {
+        'domain_totals': lambda b: b.domain_totals(limit=20),
+        'domain_totals 1d': lambda b: b.domain_totals(limit=20, days=1),
+        'domain_totals 30d': lambda b: b.domain_totals(limit=20, days=30),
+        'destination_totals': lambda b: b.destination_totals(limit=20),
+        'destination_totals 7d': lambda b: b.destination_totals(limit=20, days=7),
+        'destination_totals 30d': lambda b: b.destination_totals(limit=20, days=30),
+        'traffic_series 1m': lambda b: b.traffic_series(1, 60, 60, day, now),
+        'traffic_series 5m step': lambda b: b.traffic_series(2, 60, 300, week, now),
+        'top_domains': lambda b: b.top_domains(limit=20),
+        'top_domains 7d': lambda b: b.top_domains(limit=20, since=week),
+        'top_destinations': lambda b: b.top_destinations(limit=20),
+        'activity dns 1h': lambda b: b.activity('dns', bucket_seconds=3600),
+        'activity connections 1d': lambda b: b.activity('connections', bucket_seconds=86400),
+        'activity http 5m device': lambda b: b.activity('http', bucket_seconds=300, since=week, device_id=1),
+        'device_domains': lambda b: b.device_domains(1, limit=50),
+    }
+
+seed()
+
+backends = {}
+for name, cls in BACKENDS.items():
+    try:
+        backends[name] = cls()
+    except Exception as e:
+        print(f"[{name}] unavailable: {e}")
+if len(backends) < len(BACKENDS) and not args.allow_missing:
+    print("Not every backend could be opened; nothing to compare (use --allow-missing to time the rest)")
+    sys.exit(1)
+
+checks = queries()
+reference = {}
+failures = 0
+
+print(f"\n{'query':28} " + ' '.join(f"{name + ' ms':>12}" for name in backends) + "  result")
+for label, call in checks.items():
+    timings = []
+    status = 'ok'
+    for name, backend in backends.items():
+        result = call(backend)
+        if label not in reference:
+            reference[label] = result
+            if not result:
+                status = 'EMPTY'
+                failures += 1
+        elif result != reference[label]:
+            status = f'MISMATCH ({name})'
+            failures += 1
+            for expected, actual in zip(reference[label], result):
+                if expected != actual:
+                    print(f"  {label}: sqlite {expected} != {name} {actual}")
+                    break
+            else:
+                print(f"  {label}: sqlite {len(reference[label])} rows != {name} {len(result)} rows")
+
+        runs = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            call(backend)
+            runs.append((time.perf_counter() - started) * 1000)
+        timings.append(statistics.median(runs))
+
+    print(f"{label:28} " + ' '.join(f"{t:12.1f}" for t in timings) + f"  {status}")
+
+for backend in backends.values():
+    backend.close()
+
+sys.exit(1 if failures else 0)
@@ -1,23 +1,137 @@
 """Device tracker for managing discovered devices."""
+import functools
+import inspect
 import logging
+import os
+import sqlite3
+import time
 from datetime import datetime
+from threading import Lock
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from shared.database import get_connection
-from service.collectors.hostname_resolver import resolve_hostname
-from service.collectors.vendor_lookup import get_vendor
-from service.collectors.fingerbank_api import identify_device_exact
+from shared.database import CONNECTION_BUCKET_SECONDS, TRAFFIC_RESOLUTIONS, is_busy_error
+from shared.storage import get_storage
+from shared.journal import EventJournal
+from shared.retention import rewind_rollups
+from shared import interning
+from service.enrichment import EnrichmentPool
+from service.collectors.hostname_resolver import HostnameResolver
+from service.collectors.vendor_lookup import lookup_vendor, is_locally_administered, VENDOR_API_ENABLED
 
 logger = logging.getLogger(__name__)
 
+# Event writers give up quickly on a locked database and spill to the journal
+WRITE_BUSY_TIMEOUT = float(os.getenv('EDGEGUARD_WRITE_BUSY_TIMEOUT', '0.25'))
+
+# Connection events are coalesced per flow and bucket, then flushed in batches
+CONNECTION_BATCH_SIZE = int(os.getenv('EDGEGUARD_CONNECTION_BATCH_SIZE', '500'))
+CONNECTION_FLUSH_INTERVAL = float(os.getenv('EDGEGUARD_CONNECTION_FLUSH_INTERVAL', '1.0'))
+
+def _timestamp(epoch):
+    """Format a Unix time like SQLite's CURRENT_TIMESTAMP (UTC)."""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(epoch))
+
+def spill_on_busy(method):
+    """Journal the event instead of dropping it when the database is busy.
+
+    Methods with a timestamp argument are journaled with the capture time,
+    so a replayed event is stored with when it happened.
+    """
+    timed = 'timestamp' in inspect.signature(method).parameters
+
+    def journal(self, args, kwargs):
+        if timed and kwargs.get('timestamp') is None:
+            kwargs = dict(kwargs, timestamp=time.time())
+        self.journal.append(method.__name__, {'args': args, 'kwargs': kwargs})
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # While a backlog exists, new events queue behind it to keep ordering
+        if self.journal.pending():
+            journal(self, args, kwargs)
+            return None
+        
+        try:
+            return method(self, *args, **kwargs)
+        except sqlite3.OperationalError as e:
+            if not is_busy_error(e):
+                raise
+            logger.debug(f"Database busy, journaling {method.__name__}: {e}")
+            journal(self, args, kwargs)
+            return None
+    return wrapper
+
 class DeviceTracker:
     """Track and store discovered devices."""
     
+    def __init__(self, journal=None, storage=None, enrichment=None, resolver=None):
+        self.journal = journal or EventJournal()
+        self.storage = storage or get_storage()
+        self.enrichment = enrichment or EnrichmentPool(self.apply_enrichment)
+        self.resolver = resolver or HostnameResolver(self.apply_hostnames)
+        self.connection_buffer = {}
+        self.connection_lock = Lock()
+        self.connection_flushed = time.time()
+        # Earliest capture time of replayed rows whose hours must be rolled up again
+        self.replayed_since = None
+    
+    def replay_journal(self, batch_size=500):
+        """Write spilled events back to the database. Returns events replayed."""
+        def apply(kind, payload):
+            method = getattr(type(self), kind)
+            method = getattr(method, '__wrapped__', method)
+            try:
+                method(self, *payload['args'], **payload['kwargs'])
+            except sqlite3.OperationalError as e:
+                if is_busy_error(e):
+                    raise
+                logger.error(f"Dropping journaled {kind} event: {e}")
+                return
+            except Exception as e:
+                logger.error(f"Dropping journaled {kind} event: {e}")
+                return
+            
+            if kind == 'write_connections':
+                captured = min((row[5] for row in payload['args'][0]), default=None)
+            else:
+                timestamp = payload['kwargs'].get('timestamp')
+                captured = _timestamp(timestamp) if timestamp else None
+            if captured and (self.replayed_since is None or captured < self.replayed_since):
+                self.replayed_since = captured
+        
+        try:
+            replayed = self.journal.replay(apply, batch_size)
+        except sqlite3.OperationalError:
+            # Still busy; the rest is retried on the next pass
+            replayed = 0
+        
+        if self.replayed_since:
+            conn = self.storage.connect()
+            try:
+                rewind_rollups(conn, self.replayed_since)
+                self.replayed_since = None
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Could not rewind rollups for replayed events, retrying: {e}")
+            finally:
+                conn.close()
+        return replayed
+    
     def add_or_update_device(self, mac_address, ip_address=None, hostname=None, dhcp_fingerprint=None, vendor_class=None):
-        """Add new device or update existing one."""
-        conn = get_connection()
+        """Add new device or update existing one. Returns True if the device is new.
+        
+        Reverse DNS, vendor API and Fingerbank lookups are queued and written
+        back later, so this never waits on the network.
+        """
+        # DHCP option 12, else a cached mDNS/DNS/PTR name
+        if hostname:
+            self.resolver.observe(ip_address, hostname, 'dhcp')
+        elif ip_address:
+            cached = self.resolver.cached(ip_address)
+            hostname = cached[0] if cached else None
+        
+        conn = self.storage.connect()
         cursor = conn.cursor()
         
         # Check if device exists
@@ -34,225 +148,349 @@ class DeviceTracker:
             """, (ip_address, mac_address))
             logger.debug(f"Updated device: {mac_address} -> {ip_address}")
             
-            # Resolve hostname if not set
-            if not existing[1] and ip_address:
-                resolved_hostname = hostname or resolve_hostname(ip_address)
-                if resolved_hostname:
-                    cursor.execute("UPDATE devices SET hostname = ? WHERE id = ?", (resolved_hostname, device_id))
-                    logger.info(f"Resolved hostname for {ip_address}: {resolved_hostname}")
+            # Hostname from a local source
+            if not existing[1] and hostname:
+                cursor.execute("UPDATE devices SET hostname = ? WHERE id = ?", (hostname, device_id))
             
-            # Lookup vendor if not set
-            if not existing[2]:
-                vendor = get_vendor(mac_address)
-                if vendor:
-                    cursor.execute("UPDATE devices SET vendor = ? WHERE id = ?", (vendor, device_id))
-                    logger.info(f"Found vendor for {mac_address}: {vendor}")
+            known_hostname = existing[1] or hostname
+            known_vendor = existing[2]
+            if not known_vendor:
+                known_vendor = lookup_vendor(mac_address)
+                if known_vendor:
+                    cursor.execute("UPDATE devices SET vendor = ? WHERE id = ?", (known_vendor, device_id))
+            new_fingerprint = dhcp_fingerprint and not existing[4]
             
             # Update DHCP info if provided
-            if dhcp_fingerprint and not existing[4]:
+            if new_fingerprint:
                 cursor.execute("""
                     UPDATE devices 
                     SET dhcp_fingerprint = ?, dhcp_vendor_class = ?
                     WHERE id = ?
                 """, (dhcp_fingerprint, vendor_class, device_id))
                 
-                # Query Fingerbank for exact device identification
-                self.identify_device_with_fingerbank(device_id, mac_address, dhcp_fingerprint, hostname)
-                
         else:
-            # Resolve hostname
-            resolved_hostname = hostname or (resolve_hostname(ip_address) if ip_address else None)
-            
-            # Lookup vendor
-            vendor = get_vendor(mac_address)
+            # Offline vendor index is fast enough to use inline
+            known_vendor = lookup_vendor(mac_address)
             
             # Insert new device
             cursor.execute("""
                 INSERT INTO devices (mac_address, ip_address, hostname, vendor, dhcp_fingerprint, dhcp_vendor_class)
                 VALUES (?, ?, ?, ?, ?, ?)
-            """, (mac_address, ip_address, resolved_hostname, vendor, dhcp_fingerprint, vendor_class))
+            """, (mac_address, ip_address, hostname, known_vendor, dhcp_fingerprint, vendor_class))
             
-            device_id = cursor.lastrowid
-            logger.info(f"New device: {mac_address} -> {ip_address} ({resolved_hostname or 'unknown'}) [{vendor or 'unknown'}]")
+            logger.info(f"New device: {mac_address} -> {ip_address} ({hostname or 'unknown'}) [{known_vendor or 'unknown'}]")
             
-            # Query Fingerbank for exact device identification
-            if dhcp_fingerprint:
-                self.identify_device_with_fingerbank(device_id, mac_address, dhcp_fingerprint, resolved_hostname)
+            known_hostname = hostname
+            new_fingerprint = bool(dhcp_fingerprint)
         
         conn.commit()
         conn.close()
+        
+        if not known_hostname and ip_address:
+            self.resolver.request(ip_address)
+        if not known_vendor and VENDOR_API_ENABLED and not is_locally_administered(mac_address):
+            self.enrichment.submit('vendor', mac_address, mac_address)
+        if new_fingerprint:
+            self.enrichment.submit('fingerbank', mac_address, mac_address, dhcp_fingerprint, None, known_hostname)
+        
+        return existing is None
+    
+    def observe_hostname(self, ip_address, hostname, source):
+        """Hostname seen on the network (mdns or dns), preferred over reverse DNS."""
+        self.resolver.observe(ip_address, hostname, source)
     
-    def identify_device_with_fingerbank(self, device_id, mac_address, dhcp_fingerprint, hostname):
-        """Use Fingerbank API to get exact device identification."""
-        device_info = identify_device_exact(mac_address, dhcp_fingerprint, hostname=hostname)
+    @spill_on_busy
+    def apply_hostnames(self, results):
+        """Fill in missing hostnames: [ip_address, hostname] items."""
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                UPDATE devices SET hostname = ?
+                WHERE ip_address = ? AND hostname IS NULL
+            """, [(hostname, ip) for ip, hostname in results])
+            conn.commit()
+        finally:
+            conn.close()
         
-        if device_info and device_info['score'] > 30:  # Only use if confidence is reasonable
-            conn = get_connection()
+        for ip, hostname in results:
+            logger.debug(f"Hostname for {ip}: {hostname}")
+    
+    @spill_on_busy
+    def apply_enrichment(self, results):
+        """Write back enrichment results: [source, mac_address, value] items.
+        
+        Only fills fields that are still empty, except Fingerbank matches with
+        reasonable confidence, which replace the identification.
+        """
+        vendors = [(value, mac) for source, mac, value in results if source == 'vendor']
+        identities = [
+            (value['device_name'], value['device_type'], value['os'], value['version'], value['score'], mac)
+            for source, mac, value in results
+            if source == 'fingerbank' and value['score'] > 30  # Only use if confidence is reasonable
+        ]
+        
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
+        try:
             cursor = conn.cursor()
-            
-            cursor.execute("""
+            cursor.executemany("UPDATE devices SET vendor = ? WHERE mac_address = ? AND vendor IS NULL", vendors)
+            cursor.executemany("""
                 UPDATE devices 
                 SET device_name = ?, device_type = ?, os_name = ?, os_version = ?, fingerbank_score = ?
-                WHERE id = ?
-            """, (
-                device_info['device_name'],
-                device_info['device_type'],
-                device_info['os'],
-                device_info['version'],
-                device_info['score'],
-                device_id
-            ))
-            
+                WHERE mac_address = ?
+            """, identities)
             conn.commit()
+        finally:
             conn.close()
+        
+        for source, mac, value in results:
+            if source == 'fingerbank':
+                logger.info(f"Exact device identified for {mac}: {value['device_name']} (confidence: {value['score']}%)")
+            else:
+                logger.info(f"Found {source} for {mac}: {value}")
+    
+    @spill_on_busy
+    def record_traffic(self, samples, timestamp=None):
+        """Add a traffic snapshot to device totals and every time-series resolution.
+
+        samples: [ip_address, bytes_sent, bytes_received, packets_sent, packets_received]
+        """
+        now = int(timestamp or time.time())
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
+        try:
+            cursor = conn.cursor()
+            
+            cursor.executemany("""
+                UPDATE devices 
+                SET total_bytes_sent = total_bytes_sent + ?,
+                    total_bytes_received = total_bytes_received + ?,
+                    total_packets_sent = total_packets_sent + ?,
+                    total_packets_received = total_packets_received + ?
+                WHERE ip_address = ?
+            """, [sample[1:] + sample[:1] for sample in samples])
+            
+            for seconds, (table, column) in TRAFFIC_RESOLUTIONS.items():
+                bucket = _timestamp(now // seconds * seconds)
+                cursor.executemany(f"""
+                    INSERT INTO {table} (device_id, {column}, bytes_sent, bytes_received, packets_sent, packets_received)
+                    SELECT id, ?, ?, ?, ?, ? FROM devices WHERE ip_address = ? LIMIT 1
+                    ON CONFLICT(device_id, {column}) DO UPDATE SET
+                        bytes_sent = bytes_sent + excluded.bytes_sent,
+                        bytes_received = bytes_received + excluded.bytes_received,
+                        packets_sent = packets_sent + excluded.packets_sent,
+                        packets_received = packets_received + excluded.packets_received
+                """, [[bucket] + sample[1:] + sample[:1] for sample in samples])
             
-            logger.info(f"Exact device identified: {device_info['device_name']} (confidence: {device_info['score']}%)")
+            conn.commit()
+        finally:
+            conn.close()
     
+    @spill_on_busy
     def update_traffic_stats(self, ip_address, bytes_sent=0, bytes_received=0, packets_sent=0, packets_received=0):
         """Update traffic statistics for device."""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE devices 
-            SET total_bytes_sent = total_bytes_sent + ?,
-                total_bytes_received = total_bytes_received + ?,
-                total_packets_sent = total_packets_sent + ?,
-                total_packets_received = total_packets_received + ?
-            WHERE ip_address = ?
-        """, (bytes_sent, bytes_received, packets_sent, packets_received, ip_address))
-        
-        conn.commit()
-        conn.close()
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
+        try:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                UPDATE devices 
+                SET total_bytes_sent = total_bytes_sent + ?,
+                    total_bytes_received = total_bytes_received + ?,
+                    total_packets_sent = total_packets_sent + ?,
+                    total_packets_received = total_packets_received + ?
+                WHERE ip_address = ?
+            """, (bytes_sent, bytes_received, packets_sent, packets_received, ip_address))
+            
+            conn.commit()
+        finally:
+            conn.close()
     
-    def log_dns_query(self, ip_address, domain, query_type):
+    @spill_on_busy
+    def log_dns_query(self, ip_address, domain, query_type, timestamp=None):
         """Log DNS query."""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # Get device ID
-        cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (ip_address,))
-        result = cursor.fetchone()
-        
-        if result:
-            device_id = result[0]
-            cursor.execute("""
-                INSERT INTO dns_queries (device_id, domain, query_type)
-                VALUES (?, ?, ?)
-            """, (device_id, domain, str(query_type)))
-            logger.debug(f"DNS query: {ip_address} -> {domain}")
-        
-        conn.commit()
-        conn.close()
+        now = _timestamp(timestamp or time.time())
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
+        try:
+            cursor = conn.cursor()
+            
+            # Get device ID
+            cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (ip_address,))
+            result = cursor.fetchone()
+            
+            if result:
+                device_id = result[0]
+                domain_id = interning.domains.get_id(cursor, domain)
+                cursor.execute("""
+                    INSERT INTO dns_queries (device_id, domain_id, query_type, timestamp)
+                    VALUES (?, ?, ?, ?)
+                """, (device_id, domain_id, str(query_type), now))
+                cursor.execute("""
+                    INSERT INTO domain_counts (domain_id, count, last_seen)
+                    VALUES (?, 1, ?)
+                    ON CONFLICT(domain_id) DO UPDATE SET
+                        count = count + 1,
+                        last_seen = MAX(last_seen, excluded.last_seen)
+                """, (domain_id, now))
+                cursor.execute("""
+                    INSERT INTO device_domains (device_id, domain_id, query_count, last_seen)
+                    VALUES (?, ?, 1, ?)
+                    ON CONFLICT(device_id, domain_id) DO UPDATE SET
+                        query_count = query_count + 1,
+                        last_seen = MAX(last_seen, excluded.last_seen)
+                """, (device_id, domain_id, now))
+                logger.debug(f"DNS query: {ip_address} -> {domain}")
+            
+            conn.commit()
+        finally:
+            conn.close()
     
     def log_connection(self, src_ip, src_port, dst_ip, dst_port, protocol, bytes_sent):
-        """Log network connection (batched to reduce DB writes)."""
+        """Log network connection (coalesced in memory, written in batches)."""
+        now = time.time()
+        bucket = int(now) // CONNECTION_BUCKET_SECONDS * CONNECTION_BUCKET_SECONDS
+        key = (src_ip, protocol or '', dst_ip or '', dst_port or 0, bucket)
+        
+        with self.connection_lock:
+            flow = self.connection_buffer.get(key)
+            if flow:
+                flow[1] += bytes_sent
+                flow[2] += 1
+                flow[4] = now
+            else:
+                self.connection_buffer[key] = [src_port, bytes_sent, 1, now, now]
+            
+            due = (len(self.connection_buffer) >= CONNECTION_BATCH_SIZE
+                   or now - self.connection_flushed >= CONNECTION_FLUSH_INTERVAL)
+        
+        if due:
+            self.flush_connections()
+    
+    def flush_connections(self):
+        """Write buffered flows with one batched upsert."""
+        with self.connection_lock:
+            if not self.connection_buffer:
+                return
+            buffer = self.connection_buffer
+            self.connection_buffer = {}
+            self.connection_flushed = time.time()
+        
+        rows = [
+            [protocol, src_ip, src_port, dst_ip, dst_port, _timestamp(bucket),
+             sent, packets, _timestamp(first_seen), _timestamp(last_seen), src_ip]
+            for (src_ip, protocol, dst_ip, dst_port, bucket), (src_port, sent, packets, first_seen, last_seen)
+            in buffer.items()
+        ]
+        self.write_connections(rows)
+    
+    @spill_on_busy
+    def write_connections(self, rows):
+        """Upsert coalesced flows; rows for unknown source IPs are skipped."""
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
+        try:
+            conn.executemany("""
+                INSERT INTO connections (protocol, src_ip, src_port, dst_ip, dst_port, bucket,
+                                         bytes_sent, packets_sent, first_seen, last_seen, device_id)
+                SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, id FROM devices WHERE ip_address = ? LIMIT 1
+                ON CONFLICT(device_id, protocol, dst_ip, dst_port, bucket) DO UPDATE SET
+                    bytes_sent = bytes_sent + excluded.bytes_sent,
+                    packets_sent = packets_sent + excluded.packets_sent,
+                    last_seen = MAX(last_seen, excluded.last_seen)
+            """, rows)
+            conn.commit()
+        finally:
+            conn.close()
+    
+    @spill_on_busy
+    def log_http_metadata(self, src_ip, method, host, path, full_url, user_agent, referer, timestamp=None):
+        """Log HTTP request metadata."""
+        now = _timestamp(timestamp or time.time())
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
         try:
-            conn = get_connection()
             cursor = conn.cursor()
             
-            # Get device ID
             cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (src_ip,))
             result = cursor.fetchone()
             
             if result:
                 device_id = result[0]
-                
-                # Check if connection exists (simplified query)
+                host_id = interning.hosts.get_id(cursor, host)
+                url_id = interning.urls.get_id(cursor, full_url)
+                user_agent_id = interning.user_agents.get_id(cursor, user_agent)
                 cursor.execute("""
-                    SELECT id FROM connections 
-                    WHERE device_id = ? AND dst_ip = ? AND dst_port = ? AND protocol = ?
-                    LIMIT 1
-                """, (device_id, dst_ip, dst_port, protocol))
-                
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # Update existing connection
+                    INSERT INTO http_metadata (device_id, method, host_id, path, url_id, user_agent_id, referer, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (device_id, method, host_id, path, url_id, user_agent_id, referer, now))
+                if host_id:
                     cursor.execute("""
-                        UPDATE connections 
-                        SET bytes_sent = bytes_sent + ?, 
-                            packets_sent = packets_sent + 1,
-                            last_seen = CURRENT_TIMESTAMP
-                        WHERE id = ?
-                    """, (bytes_sent, existing[0]))
-                else:
-                    # Insert new connection
+                        INSERT INTO http_host_counts (host_id, count, last_seen)
+                        VALUES (?, 1, ?)
+                        ON CONFLICT(host_id) DO UPDATE SET
+                            count = count + 1,
+                            last_seen = MAX(last_seen, excluded.last_seen)
+                    """, (host_id, now))
+                if url_id:
                     cursor.execute("""
-                        INSERT INTO connections (device_id, protocol, src_ip, src_port, dst_ip, dst_port, bytes_sent, packets_sent)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, 1)
-                    """, (device_id, protocol, src_ip, src_port, dst_ip, dst_port, bytes_sent))
+                        INSERT INTO url_counts (url_id, count, last_seen)
+                        VALUES (?, 1, ?)
+                        ON CONFLICT(url_id) DO UPDATE SET
+                            count = count + 1,
+                            last_seen = MAX(last_seen, excluded.last_seen)
+                    """, (url_id, now))
+                logger.info(f"HTTP: {method} {full_url} - {user_agent}")
             
             conn.commit()
-        except sqlite3.OperationalError:
-            # Skip if database is locked
-            pass
         finally:
-            try:
-                conn.close()
-            except:
-                pass
-    
-    def log_http_metadata(self, src_ip, method, host, path, full_url, user_agent, referer):
-        """Log HTTP request metadata."""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (src_ip,))
-        result = cursor.fetchone()
-        
-        if result:
-            device_id = result[0]
-            cursor.execute("""
-                INSERT INTO http_metadata (device_id, method, host, path, full_url, user_agent, referer)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (device_id, method, host, path, full_url, user_agent, referer))
-            logger.info(f"HTTP: {method} {full_url} - {user_agent}")
-        
-        conn.commit()
-        conn.close()
+            conn.close()
     
-    def log_tls_metadata(self, src_ip, dst_ip, tls_version):
+    @spill_on_busy
+    def log_tls_metadata(self, src_ip, dst_ip, tls_version, timestamp=None):
         """Log TLS/SSL metadata."""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (src_ip,))
-        result = cursor.fetchone()
-        
-        if result:
-            device_id = result[0]
-            cursor.execute("""
-                INSERT INTO tls_metadata (device_id, tls_version)
-                VALUES (?, ?)
-            """, (device_id, tls_version))
-        
-        conn.commit()
-        conn.close()
+        now = _timestamp(timestamp or time.time())
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
+        try:
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (src_ip,))
+            result = cursor.fetchone()
+            
+            if result:
+                device_id = result[0]
+                cursor.execute("""
+                    INSERT INTO tls_metadata (device_id, tls_version, timestamp)
+                    VALUES (?, ?, ?)
+                """, (device_id, tls_version, now))
+            
+            conn.commit()
+        finally:
+            conn.close()
     
-    def log_port_scan(self, src_ip, target_ip, ports):
+    @spill_on_busy
+    def log_port_scan(self, src_ip, target_ip, ports, timestamp=None):
         """Log port scan attempt."""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (src_ip,))
-        result = cursor.fetchone()
-        
-        if result:
-            device_id = result[0]
-            for port in ports:
-                cursor.execute("""
-                    INSERT INTO port_scans (device_id, target_ip, target_port, scan_type)
-                    VALUES (?, ?, ?, 'SYN')
-                """, (device_id, target_ip, port))
-            logger.warning(f"Port scan detected: {src_ip} -> {target_ip} ({len(ports)} ports)")
-        
-        conn.commit()
-        conn.close()
+        now = _timestamp(timestamp or time.time())
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
+        try:
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (src_ip,))
+            result = cursor.fetchone()
+            
+            if result:
+                device_id = result[0]
+                for port in ports:
+                    cursor.execute("""
+                        INSERT INTO port_scans (device_id, target_ip, target_port, scan_type, timestamp)
+                        VALUES (?, ?, ?, 'SYN', ?)
+                    """, (device_id, target_ip, port, now))
+                logger.warning(f"Port scan detected: {src_ip} -> {target_ip} ({len(ports)} ports)")
+            
+            conn.commit()
+        finally:
+            conn.close()
     
     def log_dhcp_event(self, src_ip, event_type, packet):
         """Log DHCP event."""
-        conn = get_connection()
+        conn = self.storage.connect()
         cursor = conn.cursor()
         
         cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (src_ip,))
@@ -268,49 +506,57 @@ class DeviceTracker:
         conn.commit()
         conn.close()
     
-    def log_icmp_event(self, src_ip, dst_ip, icmp_type, icmp_code):
+    @spill_on_busy
+    def log_icmp_event(self, src_ip, dst_ip, icmp_type, icmp_code, timestamp=None):
         """Log ICMP event."""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (src_ip,))
-        result = cursor.fetchone()
-        
-        if result:
-            device_id = result[0]
-            cursor.execute("""
-                INSERT INTO icmp_events (device_id, icmp_type, src_ip, dst_ip)
-                VALUES (?, ?, ?, ?)
-            """, (device_id, f"{icmp_type}/{icmp_code}", src_ip, dst_ip))
-        
-        conn.commit()
-        conn.close()
+        now = _timestamp(timestamp or time.time())
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
+        try:
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (src_ip,))
+            result = cursor.fetchone()
+            
+            if result:
+                device_id = result[0]
+                cursor.execute("""
+                    INSERT INTO icmp_events (device_id, icmp_type, src_ip, dst_ip, timestamp)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (device_id, f"{icmp_type}/{icmp_code}", src_ip, dst_ip, now))
+            
+            conn.commit()
+        finally:
+            conn.close()
     
-    def log_service_discovery(self, ip_address, service_type, service_name, service_info):
+    @spill_on_busy
+    def log_service_discovery(self, ip_address, service_type, service_name, service_info, timestamp=None):
         """Log discovered service."""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (ip_address,))
-        result = cursor.fetchone()
-        
-        if result:
-            device_id = result[0]
-            cursor.execute("""
-                INSERT INTO service_discovery (device_id, service_type, service_name, service_info)
-                VALUES (?, ?, ?, ?)
-            """, (device_id, service_type, service_name, service_info))
-            logger.info(f"Service discovered: {service_name} on {ip_address}")
-            
-            # Update device type if we can infer it
-            if service_type:
-                self.update_device_type_from_service(device_id, service_type)
-        
-        conn.commit()
-        conn.close()
+        now = _timestamp(timestamp or time.time())
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
+        try:
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (ip_address,))
+            result = cursor.fetchone()
+            
+            if result:
+                device_id = result[0]
+                cursor.execute("""
+                    INSERT INTO service_discovery (device_id, service_type, service_name, service_info, timestamp)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (device_id, service_type, service_name, service_info, now))
+                logger.info(f"Service discovered: {service_name} on {ip_address}")
+                
+                # Update device type if we can infer it
+                if service_type:
+                    self.update_device_type_from_service(cursor, device_id, service_type)
+            
+            conn.commit()
+        finally:
+            conn.close()
     
-    def update_device_type_from_service(self, device_id, service_type):
-        """Infer device type from discovered services."""
+    def update_device_type_from_service(self, cursor, device_id, service_type):
+        """Infer device type from discovered services (runs in the caller's transaction)."""
         device_type_map = {
             '_airplay': 'Apple TV / AirPlay Device',
             '_googlecast': 'Chromecast / Google Cast Device',
@@ -328,40 +574,41 @@ class DeviceTracker:
         
         for service_key, device_type in device_type_map.items():
             if service_key in service_type.lower():
-                conn = get_connection()
-                cursor = conn.cursor()
                 cursor.execute("UPDATE devices SET device_type = ? WHERE id = ? AND device_type IS NULL", 
                              (device_type, device_id))
-                conn.commit()
-                conn.close()
                 break
     
+    @spill_on_busy
     def log_tcp_fingerprint(self, ip_address, os_name, ttl, window_size, tcp_options, mss):
         """Log TCP/IP fingerprint for OS detection."""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (ip_address,))
-        result = cursor.fetchone()
-        
-        if result:
-            device_id = result[0]
-            # Update device with OS information
-            cursor.execute("""
-                UPDATE devices 
-                SET os_name = ?
-                WHERE id = ? AND os_name IS NULL
-            """, (os_name, device_id))
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
+        try:
+            cursor = conn.cursor()
             
-            logger.info(f"TCP/IP OS detected: {ip_address} -> {os_name}")
-        
-        conn.commit()
-        conn.close()
+            cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (ip_address,))
+            result = cursor.fetchone()
+            
+            if result:
+                device_id = result[0]
+                # Update device with OS information
+                cursor.execute("""
+                    UPDATE devices 
+                    SET os_name = ?
+                    WHERE id = ? AND os_name IS NULL
+                """, (os_name, device_id))
+                
+                logger.info(f"TCP/IP OS detected: {ip_address} -> {os_name}")
+            
+            conn.commit()
+        finally:
+            conn.close()
     
-    def log_visited_site(self, ip_address, domain):
+    @spill_on_busy
+    def log_visited_site(self, ip_address, domain, timestamp=None):
         """Log visited website from SNI."""
+        now = _timestamp(timestamp or time.time())
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
         try:
-            conn = get_connection()
             cursor = conn.cursor()
             
             cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (ip_address,))
@@ -369,31 +616,36 @@ class DeviceTracker:
             
             if result:
                 device_id = result[0]
+                domain_id = interning.domains.get_id(cursor, domain)
                 
                 # Insert or update visited site
                 cursor.execute("""
-                    INSERT INTO visited_sites (device_id, domain, visit_count)
-                    VALUES (?, ?, 1)
-                    ON CONFLICT(device_id, domain) DO UPDATE SET
-                        last_seen = CURRENT_TIMESTAMP,
+                    INSERT INTO visited_sites (device_id, domain_id, visit_count, first_seen, last_seen)
+                    VALUES (?, ?, 1, ?, ?)
+                    ON CONFLICT(device_id, domain_id) DO UPDATE SET
+                        last_seen = MAX(last_seen, excluded.last_seen),
                         visit_count = visit_count + 1
-                """, (device_id, domain))
+                """, (device_id, domain_id, now, now))
+                cursor.execute("""
+                    INSERT INTO site_counts (domain_id, visits, last_seen)
+                    VALUES (?, 1, ?)
+                    ON CONFLICT(domain_id) DO UPDATE SET
+                        visits = visits + 1,
+                        last_seen = MAX(last_seen, excluded.last_seen)
+                """, (domain_id, now))
                 
                 logger.info(f"Site visited: {domain} from {ip_address}")
             
             conn.commit()
-        except sqlite3.OperationalError:
-            pass
         finally:
-            try:
-                conn.close()
-            except:
-                pass
+            conn.close()
     
-    def log_ja3_fingerprint(self, ip_address, ja3_hash, ja3_string):
+    @spill_on_busy
+    def log_ja3_fingerprint(self, ip_address, ja3_hash, ja3_string, timestamp=None):
         """Log JA3 TLS fingerprint."""
+        now = _timestamp(timestamp or time.time())
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
         try:
-            conn = get_connection()
             cursor = conn.cursor()
             
             cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (ip_address,))
@@ -411,27 +663,23 @@ class DeviceTracker:
                 
                 # Store in JA3 table
                 cursor.execute("""
-                    INSERT INTO ja3_fingerprints (device_id, ja3_hash, ja3_string)
-                    VALUES (?, ?, ?)
+                    INSERT INTO ja3_fingerprints (device_id, ja3_hash, ja3_string, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?)
                     ON CONFLICT(device_id, ja3_hash) DO UPDATE SET
-                        last_seen = CURRENT_TIMESTAMP
-                """, (device_id, ja3_hash, ja3_string))
+                        last_seen = MAX(last_seen, excluded.last_seen)
+                """, (device_id, ja3_hash, ja3_string, now, now))
                 
                 logger.info(f"JA3 fingerprint: {ip_address} -> {ja3_hash}")
             
             conn.commit()
-        except sqlite3.OperationalError:
-            pass
         finally:
-            try:
-                conn.close()
-            except:
-                pass
+            conn.close()
     
+    @spill_on_busy
     def log_open_ports(self, ip_address, ports):
         """Log discovered open ports."""
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
         try:
-            conn = get_connection()
             cursor = conn.cursor()
             
             cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (ip_address,))
@@ -450,18 +698,14 @@ class DeviceTracker:
                 logger.info(f"Open ports on {ip_address}: {ports_str}")
             
             conn.commit()
-        except sqlite3.OperationalError:
-            pass
         finally:
-            try:
-                conn.close()
-            except:
-                pass
+            conn.close()
     
+    @spill_on_busy
     def log_netdisco_device(self, ip_address, device_type, device_name, manufacturer, model, raw_info):
         """Log device discovered by netdisco."""
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
         try:
-            conn = get_connection()
             cursor = conn.cursor()
             
             cursor.execute("SELECT id FROM devices WHERE ip_address = ?", (ip_address,))
@@ -481,18 +725,14 @@ class DeviceTracker:
                 logger.info(f"Netdisco updated: {ip_address} - {device_name} ({device_type})")
             
             conn.commit()
-        except sqlite3.OperationalError:
-            pass
         finally:
-            try:
-                conn.close()
-            except:
-                pass
+            conn.close()
     
+    @spill_on_busy
     def log_nmap_device(self, ip_address, nmap_info):
         """Log device discovered by nmap."""
+        conn = self.storage.connect(timeout=WRITE_BUSY_TIMEOUT)
         try:
-            conn = get_connection()
             cursor = conn.cursor()
             
             # Check if device exists
@@ -526,17 +766,12 @@ class DeviceTracker:
             logger.info(f"Nmap updated: {ip_address} - {hostname} ({vendor})")
             
             conn.commit()
-        except sqlite3.OperationalError:
-            pass
         finally:
-            try:
-                conn.close()
-            except:
-                pass
+            conn.close()
     
     def mark_inactive_devices(self, timeout_minutes=30):
         """Mark devices as inactive if not seen recently."""
-        conn = get_connection()
+        conn = self.storage.connect()
         cursor = conn.cursor()
         
         cursor.execute("""
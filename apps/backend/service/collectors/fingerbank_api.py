@@ -1,9 +1,17 @@
 """Fingerbank API integration for exact device identification."""
 import requests
+import hashlib
+import json
 import logging
 import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import Future
 from pathlib import Path
 
+from shared.database import get_connection, get_read_connection
+
 logger = logging.getLogger(__name__)
 
 # Load API key from .env file
@@ -17,61 +25,186 @@ def load_api_key():
     return os.getenv('FINGERBANK_API_KEY', 'YOUR_API_KEY_HERE')
 
 FINGERBANK_API_KEY = load_api_key()
-FINGERBANK_API_URL = "https://api.fingerbank.org/api/v2/combinations/interrogate"
+FINGERBANK_API_URL = os.getenv('FINGERBANK_API_URL', "https://api.fingerbank.org/api/v2/combinations/interrogate")
 
-def identify_device_exact(mac_address, dhcp_fingerprint=None, user_agent=None, hostname=None):
+# Answers are cached in fingerbank_cache; "no match" is cached for less time
+FINGERBANK_CACHE_DAYS = int(os.getenv('EDGEGUARD_FINGERBANK_CACHE_DAYS', '30'))
+FINGERBANK_NEGATIVE_CACHE_DAYS = int(os.getenv('EDGEGUARD_FINGERBANK_NEGATIVE_CACHE_DAYS', '1'))
+
+# Serial-number-like parts of hostnames: hex or digit runs containing a digit
+HOSTNAME_VARIABLE = re.compile(r'[0-9a-f]*[0-9][0-9a-f]*')
+LOCAL_DOMAINS = ('.local', '.lan', '.home', '.localdomain')
+
+cache_counters = {'hits': 0, 'misses': 0, 'coalesced': 0}
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+def hostname_pattern(hostname):
+    """Hostname with local suffixes and serial numbers removed.
+    
+    'ESP_3A4F2B.lan' and 'esp_11aa22' both become 'esp_#'.
+    """
+    if not hostname:
+        return None
+    name = hostname.strip().rstrip('.').lower()
+    for suffix in LOCAL_DOMAINS:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return HOSTNAME_VARIABLE.sub('#', name)
+
+def normalize_request(mac_address, dhcp_fingerprint=None, user_agent=None, hostname=None):
+    """Inputs that determine Fingerbank's answer, normalized for caching."""
+    return {
+        'oui': mac_address.replace(':', '').replace('-', '').replace('.', '')[:6].upper() if mac_address else None,
+        'dhcp_fingerprint': ','.join(part.strip() for part in dhcp_fingerprint.split(',')) if dhcp_fingerprint else None,
+        'user_agent': user_agent.strip() if user_agent else None,
+        'hostname': hostname_pattern(hostname),
+    }
+
+def cache_key(request):
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+
+def query_api(mac_address, dhcp_fingerprint=None, user_agent=None, hostname=None):
     """
     Query Fingerbank API for exact device identification.
     
-    Returns: dict with device_name, device_type, os, version, score
+    Returns: dict with device_name, device_type, os, version, score, or None
+    if Fingerbank has no match (404). Raises on network errors and on every
+    other error status (a rejected API key, rate limiting, server errors) so
+    callers retry instead of caching a miss.
+    """
+    # Build query payload
+    payload = {}
+    
+    if mac_address:
+        # Extract OUI (first 6 chars)
+        payload['mac'] = mac_address.replace(':', '').replace('-', '')[:6]
+    
+    if dhcp_fingerprint:
+        payload['dhcp_fingerprint'] = dhcp_fingerprint
+    
+    if user_agent:
+        payload['user_agent'] = user_agent
+    
+    if hostname:
+        payload['hostname'] = hostname
+    
+    # Query Fingerbank API
+    response = requests.get(
+        FINGERBANK_API_URL,
+        params={'key': FINGERBANK_API_KEY},
+        json=payload,
+        timeout=5
+    )
+    
+    if response.status_code == 404:
+        return None
+    
+    if response.status_code in (401, 403):
+        logger.error(f"Fingerbank rejected the API key ({response.status_code}). Check FINGERBANK_API_KEY.")
+    
+    if response.status_code != 200:
+        raise requests.HTTPError(f"Fingerbank API error: {response.status_code}", response=response)
+    
+    data = response.json()
+    if 'device' not in data:
+        return None
+    
+    device_info = {
+        'device_name': data['device'].get('name'),
+        'device_type': data.get('device_class', {}).get('name'),
+        'os': data.get('device', {}).get('parent_name'),
+        'version': data.get('version'),
+        'score': data.get('score', 0)
+    }
+    
+    logger.info(f"Fingerbank identified: {device_info['device_name']} (score: {device_info['score']})")
+    return device_info
+
+def _cached_result(key):
+    """(True, result) for a live cache entry, else (False, None)."""
+    try:
+        conn = get_read_connection()
+        try:
+            row = conn.execute(
+                "SELECT result FROM fingerbank_cache WHERE cache_key = ? AND expires_at > CURRENT_TIMESTAMP", (key,)
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.debug(f"Fingerbank cache read failed: {e}")
+        return False, None
+    if row is None:
+        return False, None
+    return True, json.loads(row[0]) if row[0] else None
+
+def _store_result(key, request, result):
+    days = FINGERBANK_CACHE_DAYS if result else FINGERBANK_NEGATIVE_CACHE_DAYS
+    try:
+        conn = get_connection(timeout=5.0)
+        try:
+            conn.execute("""
+                INSERT OR REPLACE INTO fingerbank_cache (cache_key, request, result, fetched_at, expires_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP, datetime('now', ?))
+            """, (key, json.dumps(request, sort_keys=True), json.dumps(result) if result else None, f'+{days} days'))
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning(f"Fingerbank cache write failed: {e}")
+
+def interrogate(mac_address, dhcp_fingerprint=None, user_agent=None, hostname=None):
+    """Identify a device, using the cache for combinations seen before.
+    
+    Concurrent calls with the same normalized inputs share one API request.
+    Raises like query_api on transient errors, which are not cached.
     """
     if FINGERBANK_API_KEY == "YOUR_API_KEY_HERE":
         logger.warning("Fingerbank API key not configured. Set FINGERBANK_API_KEY in environment.")
         return None
     
+    request = normalize_request(mac_address, dhcp_fingerprint, user_agent, hostname)
+    key = cache_key(request)
+    
+    found, result = _cached_result(key)
+    if found:
+        cache_counters['hits'] += 1
+        return result
+    
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+    
+    if not leader:
+        cache_counters['coalesced'] += 1
+        return future.result()
+    
     try:
-        # Build query payload
-        payload = {}
+        # The previous leader may have stored its answer just before we took over
+        found, result = _cached_result(key)
+        if found:
+            cache_counters['hits'] += 1
+            future.set_result(result)
+            return result
         
-        if mac_address:
-            # Extract OUI (first 6 chars)
-            payload['mac'] = mac_address.replace(':', '').replace('-', '')[:6]
-        
-        if dhcp_fingerprint:
-            payload['dhcp_fingerprint'] = dhcp_fingerprint
-        
-        if user_agent:
-            payload['user_agent'] = user_agent
-        
-        if hostname:
-            payload['hostname'] = hostname
-        
-        # Query Fingerbank API
-        response = requests.get(
-            FINGERBANK_API_URL,
-            params={'key': FINGERBANK_API_KEY},
-            json=payload,
-            timeout=5
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            if 'device' in data:
-                device_info = {
-                    'device_name': data['device'].get('name'),
-                    'device_type': data.get('device_class', {}).get('name'),
-                    'os': data.get('device', {}).get('parent_name'),
-                    'version': data.get('version'),
-                    'score': data.get('score', 0)
-                }
-                
-                logger.info(f"Fingerbank identified: {device_info['device_name']} (score: {device_info['score']})")
-                return device_info
-        else:
-            logger.warning(f"Fingerbank API error: {response.status_code}")
-            
+        cache_counters['misses'] += 1
+        result = query_api(mac_address, dhcp_fingerprint, user_agent, hostname)
+        _store_result(key, request, result)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+
+def identify_device_exact(mac_address, dhcp_fingerprint=None, user_agent=None, hostname=None):
+    """Query Fingerbank, returning None on any failure."""
+    try:
+        return interrogate(mac_address, dhcp_fingerprint, user_agent, hostname)
     except Exception as e:
         logger.error(f"Fingerbank API request failed: {e}")
-    
-    return None
+        return None
@@ -1,9 +1,40 @@
-"""Hostname resolver using reverse DNS."""
-import socket
+"""Hostname resolver using local sources and batched reverse DNS."""
+import asyncio
+import ipaddress
 import logging
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+from shared.database import queue_write
 
 logger = logging.getLogger(__name__)
 
+# Cache lifetimes (seconds); PTR answers use the record TTL up to HOSTNAME_TTL
+HOSTNAME_TTL = int(os.getenv('EDGEGUARD_HOSTNAME_TTL', '3600'))
+HOSTNAME_NEGATIVE_TTL = int(os.getenv('EDGEGUARD_HOSTNAME_NEGATIVE_TTL', '900'))
+# Timeouts and server failures are retried sooner than "no PTR record"
+HOSTNAME_FAILURE_TTL = 60
+
+# Nameserver for PTR queries; defaults to the first one in /etc/resolv.conf
+DNS_SERVER = os.getenv('EDGEGUARD_DNS_SERVER')
+DNS_TIMEOUT = float(os.getenv('EDGEGUARD_DNS_TIMEOUT', '2.0'))
+DNS_ATTEMPTS = 2
+
+# Requests arriving within this window go out together
+BATCH_WINDOW = 0.05
+MAX_BATCH = 256
+
+# Names from DHCP option 12, mDNS and sniffed DNS answers win over PTR
+LOCAL_SOURCES = ('dhcp', 'mdns', 'dns')
+
+TYPE_A = 1
+TYPE_PTR = 12
+RCODE_NXDOMAIN = 3
+
 def resolve_hostname(ip_address):
     """Resolve hostname from IP address."""
     try:
@@ -11,3 +42,262 @@ def resolve_hostname(ip_address):
         return hostname
     except (socket.herror, socket.gaierror, socket.timeout):
         return None
+
+def system_nameserver(path='/etc/resolv.conf'):
+    """First nameserver in resolv.conf, or None."""
+    try:
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2 and fields[0] == 'nameserver':
+                    return fields[1]
+    except OSError:
+        pass
+    return None
+
+def build_ptr_query(query_id, ip_address):
+    """DNS PTR query packet for an IPv4 or IPv6 address."""
+    name = ipaddress.ip_address(ip_address).reverse_pointer
+    qname = b''.join(bytes([len(label)]) + label.encode('ascii') for label in name.split('.')) + b'\x00'
+    return struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0) + qname + struct.pack('!HH', TYPE_PTR, 1)
+
+def _read_name(data, offset):
+    """Decode a possibly compressed DNS name; returns (name, offset after it)."""
+    labels = []
+    end = None
+    for _ in range(128):
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+        elif length == 0:
+            return '.'.join(labels), end if end is not None else offset + 1
+        else:
+            labels.append(data[offset + 1:offset + 1 + length].decode('ascii', errors='replace'))
+            offset += 1 + length
+    raise ValueError("DNS name compression loop")
+
+def parse_answers(data):
+    """Parse a DNS response into (query id, rcode, [(name, type, ttl, rdata)])."""
+    query_id, flags, qdcount, ancount = struct.unpack_from('!HHHH', data)
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = _read_name(data, offset)
+        offset += 4
+
+    answers = []
+    for _ in range(ancount):
+        name, offset = _read_name(data, offset)
+        rtype, _, ttl, rdlength = struct.unpack_from('!HHIH', data, offset)
+        offset += 10
+        if rtype == TYPE_PTR:
+            rdata = _read_name(data, offset)[0]
+        elif rtype == TYPE_A and rdlength == 4:
+            rdata = socket.inet_ntoa(data[offset:offset + 4])
+        else:
+            rdata = None
+        answers.append((name, rtype, ttl, rdata))
+        offset += rdlength
+    return query_id, flags & 0x0F, answers
+
+def local_names(records):
+    """(ip_address, hostname) pairs for private addresses in scapy DNS answer records.
+
+    Covers PTR answers (reverse lookups) and A answers (forward lookups).
+    """
+    for rr in records:
+        try:
+            name = rr.rrname.decode('utf-8').rstrip('.')
+            if rr.type == TYPE_PTR:
+                hostname = rr.rdata.decode('utf-8') if isinstance(rr.rdata, bytes) else str(rr.rdata)
+                ip_address = _reverse_pointer_ip(name)
+            elif rr.type == TYPE_A:
+                hostname, ip_address = name, str(rr.rdata)
+            else:
+                continue
+            if ip_address and ipaddress.ip_address(ip_address).is_private and not hostname.startswith('_'):
+                yield ip_address, hostname.rstrip('.')
+        except (AttributeError, UnicodeDecodeError, ValueError):
+            continue
+
+def _reverse_pointer_ip(name):
+    """IPv4 address of an in-addr.arpa name, or None."""
+    if not name.endswith('.in-addr.arpa'):
+        return None
+    octets = name[:-len('.in-addr.arpa')].split('.')
+    return '.'.join(reversed(octets)) if len(octets) == 4 else None
+
+class _PTRProtocol(asyncio.DatagramProtocol):
+    """Matches responses to outstanding queries by id."""
+
+    def __init__(self):
+        self.waiting = {}
+
+    def datagram_received(self, data, addr):
+        try:
+            query_id, rcode, answers = parse_answers(data)
+        except (ValueError, IndexError, struct.error):
+            return
+        future = self.waiting.pop(query_id, None)
+        if future and not future.done():
+            future.set_result((rcode, answers))
+
+class HostnameResolver:
+    """Resolve device hostnames without blocking the caller.
+
+    Names observed locally (DHCP option 12, mDNS, sniffed DNS answers) are
+    cached and used first. Other addresses are queued and resolved with PTR
+    queries sent in batches from an asyncio loop on a background thread.
+    Positive and negative answers are cached with TTLs.
+
+    write_results([[ip_address, hostname], ...]) is queued on the database
+    writer thread whenever new names are learned.
+    """
+
+    def __init__(self, write_results, nameserver=None):
+        self.write_results = write_results
+        self.nameserver = nameserver or DNS_SERVER or system_nameserver()
+        self.cache = {}  # ip -> (hostname or None, expires, source)
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.loop = None
+        self.queue = None
+        self.started = threading.Event()
+        self.thread = None
+        self.counters = {'local': 0, 'ptr_queries': 0, 'resolved': 0, 'negative': 0, 'failed': 0, 'cache_hits': 0}
+
+    def cached(self, ip_address):
+        """(hostname, source) if a live cache entry exists, else None."""
+        with self.lock:
+            entry = self.cache.get(ip_address)
+            if entry and entry[1] > time.time():
+                return entry[0], entry[2]
+        return None
+
+    def observe(self, ip_address, hostname, source):
+        """Record a name seen locally (dhcp, mdns or dns)."""
+        if not ip_address or not hostname:
+            return
+        hostname = hostname.rstrip('.')
+        with self.lock:
+            entry = self.cache.get(ip_address)
+            changed = not entry or entry[0] != hostname
+            self.cache[ip_address] = (hostname, time.time() + HOSTNAME_TTL, source)
+            if changed:
+                self.counters['local'] += 1
+        if changed:
+            self._write([[ip_address, hostname]])
+
+    def request(self, ip_address):
+        """Queue a PTR lookup unless the address is cached or in flight."""
+        if not ip_address:
+            return
+        with self.lock:
+            entry = self.cache.get(ip_address)
+            if entry and entry[1] > time.time():
+                self.counters['cache_hits'] += 1
+                return
+            if ip_address in self.pending:
+                return
+            self.pending.add(ip_address)
+
+        if not self.nameserver:
+            self._store(ip_address, None, HOSTNAME_FAILURE_TTL)
+            return
+        self._start()
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, ip_address)
+
+    def _start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run_loop, daemon=True)
+                self.thread.start()
+        self.started.wait()
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.Queue()
+        self.started.set()
+        try:
+            self.loop.run_until_complete(self._serve())
+        except OSError as e:
+            logger.error(f"Reverse DNS disabled, cannot reach {self.nameserver}: {e}")
+            with self.lock:
+                self.nameserver = None
+                self.pending.clear()
+
+    async def _serve(self):
+        transport, protocol = await self.loop.create_datagram_endpoint(
+            _PTRProtocol, remote_addr=(self.nameserver, 53)
+        )
+        try:
+            while True:
+                batch = [await self.queue.get()]
+                await asyncio.sleep(BATCH_WINDOW)
+                while not self.queue.empty() and len(batch) < MAX_BATCH:
+                    batch.append(self.queue.get_nowait())
+
+                answers = await asyncio.gather(*(self._query(transport, protocol, ip) for ip in batch))
+                learned = [[ip, hostname] for ip, hostname in zip(batch, answers) if hostname]
+                if learned:
+                    self._write(learned)
+        finally:
+            transport.close()
+
+    async def _query(self, transport, protocol, ip_address):
+        """Resolve one address, caching the outcome. Returns the hostname or None."""
+        for _ in range(DNS_ATTEMPTS):
+            query_id = random.randrange(1 << 16)
+            while query_id in protocol.waiting:
+                query_id = random.randrange(1 << 16)
+            future = self.loop.create_future()
+            protocol.waiting[query_id] = future
+            try:
+                packet = build_ptr_query(query_id, ip_address)
+            except ValueError:
+                protocol.waiting.pop(query_id, None)
+                return self._store(ip_address, None, HOSTNAME_FAILURE_TTL)
+
+            with self.lock:
+                self.counters['ptr_queries'] += 1
+            transport.sendto(packet)
+            try:
+                rcode, answers = await asyncio.wait_for(future, DNS_TIMEOUT)
+            except asyncio.TimeoutError:
+                protocol.waiting.pop(query_id, None)
+                continue
+
+            for _, rtype, ttl, rdata in answers:
+                if rtype == TYPE_PTR and rdata:
+                    return self._store(ip_address, rdata, min(max(ttl, HOSTNAME_FAILURE_TTL), HOSTNAME_TTL))
+            if rcode in (0, RCODE_NXDOMAIN):
+                return self._store(ip_address, None, HOSTNAME_NEGATIVE_TTL)
+            break
+
+        return self._store(ip_address, None, HOSTNAME_FAILURE_TTL, failed=True)
+
+    def _store(self, ip_address, hostname, ttl, failed=False):
+        """Cache a PTR outcome unless a local name arrived meanwhile."""
+        with self.lock:
+            self.pending.discard(ip_address)
+            entry = self.cache.get(ip_address)
+            if entry and entry[2] in LOCAL_SOURCES and entry[1] > time.time():
+                return None
+            self.cache[ip_address] = (hostname, time.time() + ttl, 'ptr')
+            self.counters['resolved' if hostname else 'failed' if failed else 'negative'] += 1
+
+            # Drop expired entries now and then
+            if len(self.cache) > 10000:
+                now = time.time()
+                self.cache = {ip: e for ip, e in self.cache.items() if e[1] > now}
+        return hostname
+
+    def _write(self, results):
+        queue_write(self.write_results, results)
+
+    def stats(self):
+        """Counters and cache size."""
+        with self.lock:
+            return dict(self.counters, cached=len(self.cache), pending=len(self.pending))
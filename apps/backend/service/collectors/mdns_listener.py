@@ -1,5 +1,6 @@
 """mDNS/Bonjour service discovery for device identification."""
 from scapy.all import sniff, DNS, DNSQR, DNSRR
+from service.collectors.hostname_resolver import local_names
 import logging
 
 logger = logging.getLogger(__name__)
@@ -7,8 +8,9 @@ logger = logging.getLogger(__name__)
 class MDNSListener:
     """Listen for mDNS announcements to discover device services."""
     
-    def __init__(self, callback):
+    def __init__(self, callback, hostname_callback=None):
         self.callback = callback
+        self.hostname_callback = hostname_callback
     
     def handle_packet(self, packet):
         """Handle mDNS packet."""
@@ -17,6 +19,11 @@ class MDNSListener:
             
             # mDNS responses
             if dns.qr == 1 and packet.haslayer(DNSRR):
+                # Host records (name.local -> address) name the device
+                if self.hostname_callback:
+                    for ip_address, hostname in local_names(dns.an[i] for i in range(dns.ancount)):
+                        self.hostname_callback(ip_address, hostname, 'mdns')
+                
                 for i in range(dns.ancount):
                     try:
                         rr = dns.an[i]
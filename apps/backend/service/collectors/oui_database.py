@@ -0,0 +1,194 @@
+"""Offline MAC vendor lookup from the IEEE registry (MA-L, MA-M, MA-S).
+
+The registry CSVs are compiled into a single index file that is memory-mapped
+on first use, so startup costs a few page faults and lookups are three binary
+searches (36-, 28- then 24-bit prefix) with no network access.
+
+Index layout (native byte order):
+    header   magic, byte-order marker, entry count, names offset
+    keys     uint64[count], sorted; (prefix left-aligned to 48 bits << 8) | prefix bits
+    names    uint32[count], offset of the entry's organization in the string table
+    strings  newline-terminated UTF-8 organization names, deduplicated
+
+Rebuild it from fresh registry files with:
+    python3 -m service.collectors.oui_database refresh oui.csv mam.csv oui36.csv
+"""
+import csv
+import logging
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+OUI_INDEX_PATH = Path(os.getenv('EDGEGUARD_OUI_INDEX', '/var/lib/edgeguard/oui.idx'))
+
+MAGIC = b'EGOUI001'
+BYTE_ORDER_MARK = 0x0102030405060708
+HEADER = struct.Struct('=8sQQQ')
+
+# Registry -> assignment length in bits
+REGISTRY_BITS = {'MA-L': 24, 'MA-M': 28, 'MA-S': 36}
+
+# Longest prefix first
+PREFIX_BITS = (36, 28, 24)
+
+# Seconds between checks for a refreshed index file
+RELOAD_CHECK_INTERVAL = 60
+
+def _key(mac_value, bits):
+    """Index key of the bits-long prefix of a 48-bit MAC value."""
+    return ((mac_value >> (48 - bits)) << (48 - bits) << 8) | bits
+
+def _mac_value(mac_address):
+    digits = mac_address.replace(':', '').replace('-', '').replace('.', '')
+    if len(digits) != 12:
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+def is_locally_administered(mac_address):
+    """True for randomized and other locally administered MACs, which have no registered vendor."""
+    mac_value = _mac_value(mac_address)
+    return mac_value is not None and bool(mac_value >> 40 & 0x02)
+
+def parse_registry(path):
+    """Yield (key, organization) from an IEEE registry CSV (oui.csv, mam.csv, oui36.csv)."""
+    with open(path, newline='', encoding='utf-8', errors='replace') as f:
+        for row in csv.DictReader(f):
+            bits = REGISTRY_BITS.get((row.get('Registry') or '').strip())
+            assignment = (row.get('Assignment') or '').strip()
+            name = ' '.join((row.get('Organization Name') or '').split())
+            if not bits or not name or len(assignment) * 4 != bits:
+                continue
+            try:
+                prefix = int(assignment, 16)
+            except ValueError:
+                continue
+            yield _key(prefix << (48 - bits), bits), name
+
+def build_index(registry_paths, index_path=OUI_INDEX_PATH):
+    """Compile registry CSVs into an index file, replacing it atomically.
+
+    Returns the number of prefixes written.
+    """
+    entries = {}
+    for path in registry_paths:
+        for key, name in parse_registry(path):
+            entries[key] = name
+
+    keys = array('Q', sorted(entries))
+    offsets = array('I')
+    strings = bytearray()
+    string_offsets = {}
+    for key in keys:
+        name = entries[key]
+        if name not in string_offsets:
+            string_offsets[name] = len(strings)
+            strings += name.encode('utf-8') + b'\n'
+        offsets.append(string_offsets[name])
+
+    index_path = Path(index_path)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, BYTE_ORDER_MARK, len(keys), HEADER.size + len(keys) * 12))
+        f.write(keys.tobytes())
+        f.write(offsets.tobytes())
+        f.write(strings)
+    os.replace(tmp_path, index_path)
+
+    logger.info(f"Built OUI index with {len(keys)} prefixes at {index_path}")
+    return len(keys)
+
+class OUIIndex:
+    """Read-only view of an index file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self.mtime = os.fstat(f.fileno()).st_mtime
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, byte_order, count, names_offset = HEADER.unpack_from(self.map)
+        if magic != MAGIC or byte_order != BYTE_ORDER_MARK:
+            self.map.close()
+            raise ValueError(f"{self.path} is not an OUI index for this platform, rebuild it")
+
+        view = memoryview(self.map)
+        self.keys = view[HEADER.size:HEADER.size + count * 8].cast('Q')
+        self.names = view[HEADER.size + count * 8:names_offset].cast('I')
+        self.names_offset = names_offset
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, mac_address):
+        """Organization for the longest registered prefix of a MAC, or None."""
+        value = _mac_value(mac_address)
+        if value is None:
+            return None
+        keys = self.keys
+        for bits in PREFIX_BITS:
+            key = _key(value, bits)
+            i = bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                start = self.names_offset + self.names[i]
+                return self.map[start:self.map.find(b'\n', start)].decode('utf-8')
+        return None
+
+_index = None
+_index_checked = 0
+_index_lock = Lock()
+
+def _current_index():
+    """Loaded index, reopened when the file has been refreshed."""
+    global _index, _index_checked
+    now = time.monotonic()
+    if _index is not None and now - _index_checked < RELOAD_CHECK_INTERVAL:
+        return _index
+
+    with _index_lock:
+        _index_checked = now
+        try:
+            mtime = OUI_INDEX_PATH.stat().st_mtime
+        except OSError:
+            return _index
+        if _index is None or mtime != _index.mtime:
+            try:
+                _index = OUIIndex(OUI_INDEX_PATH)
+                logger.info(f"Loaded OUI index with {len(_index)} prefixes")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not load OUI index: {e}")
+        return _index
+
+def lookup_vendor(mac_address):
+    """Vendor from the offline index, or None if unknown or no index is installed."""
+    index = _current_index()
+    return index.lookup(mac_address) if index else None
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="EdgeGuard offline OUI vendor database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    refresh = subparsers.add_parser('refresh', help="Rebuild the index from IEEE registry CSVs")
+    refresh.add_argument('registry', nargs='+', help="oui.csv, mam.csv and/or oui36.csv")
+    refresh.add_argument('--output', default=str(OUI_INDEX_PATH))
+    lookup = subparsers.add_parser('lookup', help="Look up MAC addresses")
+    lookup.add_argument('mac', nargs='+')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'refresh':
+        print(f"{build_index(args.registry, args.output)} prefixes written to {args.output}")
+    else:
+        for mac in args.mac:
+            print(f"{mac}\t{lookup_vendor(mac) or 'unknown'}")
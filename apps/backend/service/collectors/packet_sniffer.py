@@ -1,9 +1,10 @@
 """Packet sniffer for traffic statistics and connection tracking."""
-from scapy.all import sniff, IP, TCP, UDP, DNS, DNSQR, ICMP, DHCP, Raw
+from scapy.all import sniff, IP, TCP, UDP, DNS, DNSQR, DNSRR, ICMP, DHCP, Raw
 from scapy.layers.http import HTTPRequest, HTTPResponse
 from service.collectors.tcp_fingerprinter import TCPFingerprinter
 from service.collectors.sni_extractor import SNIExtractor
 from service.collectors.ja3_fingerprinter import JA3Fingerprinter
+from service.collectors.hostname_resolver import local_names
 import logging
 from collections import defaultdict
 import time
@@ -24,7 +25,8 @@ class PacketSniffer:
     
     def __init__(self, traffic_callback, dns_callback, connection_callback, 
                  http_callback, tls_callback, port_scan_callback, 
-                 dhcp_callback, icmp_callback, tcp_fingerprint_callback, sni_callback, ja3_callback):
+                 dhcp_callback, icmp_callback, tcp_fingerprint_callback, sni_callback, ja3_callback,
+                 hostname_callback=None):
         self.traffic_callback = traffic_callback
         self.dns_callback = dns_callback
         self.connection_callback = connection_callback
@@ -36,6 +38,7 @@ class PacketSniffer:
         self.tcp_fingerprint_callback = tcp_fingerprint_callback
         self.sni_callback = sni_callback
         self.ja3_callback = ja3_callback
+        self.hostname_callback = hostname_callback
         
         self.stats = defaultdict(lambda: {
             'sent': 0, 'received': 0, 
@@ -112,6 +115,11 @@ class PacketSniffer:
                 query = dns_layer.qd.qname.decode('utf-8').rstrip('.')
                 query_type = dns_layer.qd.qtype
                 self.dns_callback(src_ip, query, query_type)
+            
+            # Passive DNS: names the local resolver hands out for LAN addresses
+            elif self.hostname_callback and packet.haslayer(DNSRR):
+                for ip_address, hostname in local_names(dns_layer.an[i] for i in range(dns_layer.ancount)):
+                    self.hostname_callback(ip_address, hostname, 'dns')
         
         # Track HTTP metadata
         if packet.haslayer(HTTPRequest):
@@ -177,6 +185,15 @@ class PacketSniffer:
         """Reset traffic stats."""
         self.stats.clear()
     
+    def take_stats(self):
+        """Return current traffic stats and start a new interval."""
+        stats = self.stats
+        self.stats = defaultdict(lambda: {
+            'sent': 0, 'received': 0, 
+            'packets_sent': 0, 'packets_received': 0
+        })
+        return dict(stats)
+    
     def start(self, interface=None):
         """Start packet sniffing."""
         logger.info(f"Starting packet sniffer on interface: {interface or 'all'}")
@@ -1,124 +1,106 @@
 """TCP/IP stack fingerprinting for OS detection."""
-from scapy.all import TCP, IP
+from collections import OrderedDict
+from functools import lru_cache
+from scapy.all import TCP, IP, Ether
+import ipaddress
 import logging
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from service.os_fingerprints import observe, identify_os
 
 logger = logging.getLogger(__name__)
 
+# IPs whose fingerprint is remembered; the least recently seen is forgotten
+FINGERPRINT_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=4096)
+def is_local_address(ip):
+    """True for private (LAN) addresses; internet hosts are not fingerprinted."""
+    try:
+        return ipaddress.ip_address(ip).is_private
+    except ValueError:
+        return False
+
 class TCPFingerprinter:
-    """Passive TCP/IP stack fingerprinting for OS detection."""
-    
-    # OS signatures database
-    OS_SIGNATURES = {
-        # Windows
-        (128, 8192): "Windows 10/11",
-        (128, 65535): "Windows Server",
-        (128, 16384): "Windows 7/8",
-        
-        # Linux/Android
-        (64, 5840): "Linux 2.4-2.6",
-        (64, 5720): "Linux 3.x-4.x",
-        (64, 29200): "Linux 5.x+",
-        (64, 14600): "Android",
-        
-        # iOS/macOS
-        (64, 65535): "iOS/macOS",
-        
-        # Other
-        (255, 4128): "Cisco IOS",
-        (64, 5840): "FreeBSD",
-        (255, 8760): "Solaris",
-    }
-    
-    def __init__(self, callback):
+    """Passive TCP/IP stack fingerprinting for OS detection.
+
+    SYNs identify clients and SYN+ACKs identify local servers, matched
+    against p0f-style signatures (see service/os_fingerprints.py). Only
+    packets from private addresses are considered: replies from internet
+    servers would cost a database write each and, all carrying the
+    gateway's MAC, evict the LAN devices from the cache.
+    """
+
+    def __init__(self, callback, cache_size=FINGERPRINT_CACHE_SIZE):
         self.callback = callback
-        self.fingerprinted = set()  # Track already fingerprinted IPs
-    
+        self.cache_size = cache_size
+        self.fingerprinted = OrderedDict()  # IP -> MAC when it was fingerprinted
+
     def fingerprint_packet(self, packet):
         """Extract TCP/IP fingerprint from packet."""
         if not (packet.haslayer(IP) and packet.haslayer(TCP)):
             return None
-        
+
         ip = packet[IP]
         tcp = packet[TCP]
         src_ip = ip.src
-        
-        # Only fingerprint SYN packets (connection initiation)
-        if tcp.flags != 'S':
+
+        # Only SYN and SYN+ACK packets (connection setup) carry a stack's defaults
+        flags = int(tcp.flags)
+        if flags & 0x17 not in (0x02, 0x12):
             return None
-        
-        # Skip if already fingerprinted
-        if src_ip in self.fingerprinted:
+
+        if not is_local_address(src_ip):
             return None
-        
+
+        # Skip if already fingerprinted, unless the IP moved to another device
+        mac = packet[Ether].src if packet.haslayer(Ether) else None
+        if src_ip in self.fingerprinted and self.fingerprinted[src_ip] == mac:
+            self.fingerprinted.move_to_end(src_ip)
+            return None
+
         # Extract fingerprint features
-        ttl = ip.ttl
-        window = tcp.window
-        
-        # Extract TCP options
-        options = []
-        if tcp.options:
-            for opt in tcp.options:
-                if isinstance(opt, tuple):
-                    options.append(opt[0])
-                else:
-                    options.append(str(opt))
-        
-        # Get MSS (Maximum Segment Size)
-        mss = None
-        for opt in tcp.options:
-            if isinstance(opt, tuple) and opt[0] == 'MSS':
-                mss = opt[1]
-                break
-        
+        header_length = (tcp.dataofs or 5) * 4
+        observation = observe(
+            ttl=ip.ttl,
+            ip_options_length=(ip.ihl or 5) * 4 - 20,
+            df=bool(ip.flags.DF),
+            ip_id=ip.id,
+            ip_reserved=bool(ip.flags.evil),
+            ecn=ip.tos & 0x03,
+            flags=flags,
+            seq=tcp.seq,
+            ack=tcp.ack,
+            window=tcp.window,
+            urgent_pointer=tcp.urgptr,
+            options=bytes(tcp)[20:header_length],
+            payload_length=len(tcp.payload)
+        )
+        if observation is None:
+            return None
+
         # Identify OS
-        os_guess = self.identify_os(ttl, window, options, mss)
-        
-        if os_guess:
-            self.fingerprinted.add(src_ip)
-            self.callback(
-                ip_address=src_ip,
-                os_name=os_guess,
-                ttl=ttl,
-                window_size=window,
-                tcp_options=','.join(options),
-                mss=mss
-            )
-            logger.info(f"TCP/IP fingerprint: {src_ip} -> {os_guess} (TTL={ttl}, Win={window})")
-            return os_guess
-        
-        return None
-    
-    def identify_os(self, ttl, window, options, mss):
-        """Identify OS from TCP/IP characteristics."""
-        # Normalize TTL (account for hops)
-        if ttl <= 64:
-            normalized_ttl = 64
-        elif ttl <= 128:
-            normalized_ttl = 128
-        else:
-            normalized_ttl = 255
-        
-        # Check signature database
-        signature = (normalized_ttl, window)
-        if signature in self.OS_SIGNATURES:
-            return self.OS_SIGNATURES[signature]
-        
-        # Fallback to TTL-based detection
-        if normalized_ttl == 128:
-            return "Windows (Unknown Version)"
-        elif normalized_ttl == 64:
-            # Distinguish between Linux/Android and iOS/macOS
-            if window == 65535:
-                return "iOS/macOS"
-            elif window < 10000:
-                return "Linux/Android"
-            else:
-                return "Linux (Unknown Version)"
-        elif normalized_ttl == 255:
-            return "Network Device (Cisco/Router)"
-        
-        return "Unknown OS"
-    
+        os_guess, match = identify_os(observation)
+
+        self.fingerprinted[src_ip] = mac
+        self.fingerprinted.move_to_end(src_ip)
+        if len(self.fingerprinted) > self.cache_size:
+            self.fingerprinted.popitem(last=False)
+
+        self.callback(
+            ip_address=src_ip,
+            os_name=os_guess,
+            ttl=observation.ttl,
+            window_size=observation.window,
+            tcp_options=observation.layout,
+            mss=observation.mss
+        )
+        logger.info(f"TCP/IP fingerprint: {src_ip} -> {os_guess} ({match} match, {observation.direction}, "
+                    f"TTL={observation.ttl}, Win={observation.window}, Opts={observation.layout})")
+        return os_guess
+
     def reset_cache(self):
         """Reset fingerprinted IPs cache."""
         self.fingerprinted.clear()
@@ -1,21 +1,40 @@
 """MAC vendor lookup using IEEE OUI database."""
 import requests
 import logging
+import os
+
+from service.collectors.oui_database import lookup_vendor, is_locally_administered
 
 logger = logging.getLogger(__name__)
 
+# Fall back to macvendors.com for MACs missing from the offline index
+VENDOR_API_ENABLED = os.getenv('EDGEGUARD_VENDOR_API', '1') != '0'
+
+def fetch_vendor(mac_address):
+    """Get vendor name from macvendors.com.
+    
+    Returns None if the vendor is unknown; raises on network errors and
+    rate limiting so callers can retry.
+    """
+    # Format MAC address
+    mac = mac_address.replace(':', '').replace('-', '').upper()
+    
+    # Use free API
+    response = requests.get(f"https://api.macvendors.com/{mac}", timeout=2)
+    
+    if response.status_code == 200:
+        return response.text.strip()
+    if response.status_code == 404:
+        return None
+    raise requests.HTTPError(f"macvendors.com returned {response.status_code}", response=response)
+
 def get_vendor(mac_address):
-    """Get vendor name from MAC address using macvendors.com API."""
+    """Get vendor name from the offline index, then the macvendors.com API."""
+    vendor = lookup_vendor(mac_address)
+    if vendor or not VENDOR_API_ENABLED or is_locally_administered(mac_address):
+        return vendor
     try:
-        # Format MAC address
-        mac = mac_address.replace(':', '').replace('-', '').upper()
-        
-        # Use free API
-        response = requests.get(f"https://api.macvendors.com/{mac}", timeout=2)
-        
-        if response.status_code == 200:
-            return response.text.strip()
-        return None
+        return fetch_vendor(mac_address)
     except Exception as e:
         logger.debug(f"Vendor lookup failed for {mac_address}: {e}")
         return None
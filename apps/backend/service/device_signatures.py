@@ -1,4 +1,11 @@
 """IoT device identification database with known signatures."""
+from collections import deque
+from functools import lru_cache
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from service.signature_packs import PackLoader
 
 # Device signatures based on vendor, DNS patterns, ports, and services
 DEVICE_SIGNATURES = {
@@ -205,10 +212,178 @@ DEVICE_CATEGORIES = {
     "iot": {"name": "IoT Devices", "color": "#84cc16"}
 }
 
+class _PatternAutomaton:
+    """Aho-Corasick automaton: which patterns occur in a text, as a bitmask.
+    
+    patterns: (pattern, bit) pairs; a pattern may appear with several bits.
+    Matching is case-sensitive; callers pass lowercased patterns and text.
+    """
+    
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.output = [0]
+        self.always = 0  # bits of empty patterns, which occur in every text
+        
+        for pattern, bit in patterns:
+            if not pattern:
+                self.always |= bit
+                continue
+            node = 0
+            for char in pattern:
+                nxt = self.goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][char] = nxt
+                    self.goto.append({})
+                    self.output.append(0)
+                node = nxt
+            self.output[node] |= bit
+        
+        # Breadth-first failure links (root's children fail to the root);
+        # each node also reports the patterns ending at its failure state
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, nxt in self.goto[node].items():
+                queue.append(nxt)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[nxt] = self.goto[state].get(char, 0)
+                self.output[nxt] |= self.output[self.fail[nxt]]
+    
+    def search(self, text):
+        goto, fail, output = self.goto, self.fail, self.output
+        found = self.always
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            found |= output[node]
+        return found
+
+class SignatureMatcher:
+    """Signatures compiled for scoring all of them in one pass.
+    
+    Vendor strings and DNS patterns go into Aho-Corasick automata and ports
+    into a port -> signatures bitmap, so each input is scanned once rather
+    than once per signature. Results are identical to scoring signatures one
+    by one: the first signature (in definition order) with the best score
+    wins if its confidence is at least 0.5.
+    """
+    
+    def __init__(self, signatures, categories=None):
+        self.categories = categories if categories is not None else DEVICE_CATEGORIES
+        self.ids = list(signatures)
+        self.signatures = [signatures[device_id] for device_id in self.ids]
+        self.vendors = _PatternAutomaton(
+            (vendor.lower(), 1 << i) for i, sig in enumerate(self.signatures) for vendor in sig["vendors"]
+        )
+        self.dns = _PatternAutomaton(
+            (pattern.lower(), 1 << i) for i, sig in enumerate(self.signatures) for pattern in sig["dns_patterns"]
+        )
+        self.ports = {}
+        for i, sig in enumerate(self.signatures):
+            for port in sig["ports"]:
+                self.ports[port] = self.ports.get(port, 0) | 1 << i
+        
+        # Vendors and domains repeat across devices
+        self.vendor_mask = lru_cache(maxsize=4096)(lambda vendor: self.vendors.search(vendor.lower()))
+        self.domain_mask = lru_cache(maxsize=65536)(lambda domain: self.dns.search(domain.lower()))
+    
+    def identify(self, vendor, dns_domains, open_ports, hostname=None):
+        max_score = 0
+        v = d = p = 0
+        if vendor:
+            max_score += 3
+            v = self.vendor_mask(vendor)
+        if dns_domains:
+            max_score += 2
+            for domain in dns_domains:
+                d |= self.domain_mask(domain)
+        if open_ports:
+            max_score += 1
+            for port in set(open_ports):
+                p |= self.ports.get(port, 0)
+        
+        if max_score == 0:
+            return dict(UNKNOWN_DEVICE)
+        
+        # Signatures at each score, best first; ties go to the earliest signature
+        for score, mask in (
+            (6, v & d & p),
+            (5, v & d & ~p),
+            (4, v & ~d & p),
+            (3, (v & ~d & ~p) | (~v & d & p)),
+            (2, ~v & d & ~p),
+            (1, ~v & ~d & p),
+        ):
+            if mask:
+                confidence = score / max_score
+                if confidence < 0.5:  # At least 50% confidence
+                    break
+                index = (mask & -mask).bit_length() - 1
+                signature = self.signatures[index]
+                return {
+                    'device_id': self.ids[index],
+                    'device_type': signature['device_type'],
+                    'category': signature['category'],
+                    'icon': signature['icon'],
+                    'confidence': confidence
+                }
+        
+        return dict(UNKNOWN_DEVICE)
+
+UNKNOWN_DEVICE = {
+    'device_id': 'unknown',
+    'device_type': 'Unknown Device',
+    'category': 'iot',
+    'icon': 'device',
+    'confidence': 0.0
+}
+
+# Built-in signatures plus packs from disk; see service/signature_packs.py
+_signatures = PackLoader(
+    'devices',
+    {'devices': DEVICE_SIGNATURES, 'categories': DEVICE_CATEGORIES},
+    lambda sections: SignatureMatcher(sections['devices'], sections['categories'])
+)
+
 def identify_device(vendor, dns_domains, open_ports, hostname=None):
     """
     Identify device type based on vendor, DNS patterns, and ports.
     
+    Returns: {
+        'device_id': str,
+        'device_type': str,
+        'category': str,
+        'icon': str,
+        'confidence': float (0-1)
+    }
+    """
+    return _signatures.current().identify(vendor, dns_domains, open_ports, hostname)
+
+def device_categories():
+    """Categories from the built-in table and loaded signature packs."""
+    return _signatures.current().categories
+
+def signatures_digest():
+    """Content hash of the active signatures; changes when a pack is swapped in."""
+    _signatures.current()
+    return _signatures.digest
+
+def reload_signatures():
+    """Pick up changed signature packs now. Returns True if the signatures changed."""
+    return _signatures.reload()
+
+def _identify_device_scan(vendor, dns_domains, open_ports, hostname=None):
+    """
+    Identify device type by scoring every signature in turn.
+    
+    Reference implementation for SignatureMatcher; see bench-signatures.py.
+    
     Returns: {
         'device_id': str,
         'device_type': str,
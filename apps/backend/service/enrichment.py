@@ -0,0 +1,183 @@
+"""Asynchronous device enrichment (vendor, Fingerbank) off the capture path.
+
+Each lookup source has its own job queue served by a fixed number of worker
+threads, which is that source's concurrency limit. Failed lookups are retried
+with exponential backoff. Results are collected and written back in batches
+through the shared database writer thread.
+"""
+import heapq
+import itertools
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+from queue import Queue, Full
+
+sys.path.append(str(Path(__file__).parent.parent))
+from shared.database import queue_write
+from service.collectors.vendor_lookup import fetch_vendor
+from service.collectors.fingerbank_api import interrogate
+
+logger = logging.getLogger(__name__)
+
+# Source -> (lookup function, worker threads)
+SOURCES = {
+    'vendor': (fetch_vendor, int(os.getenv('EDGEGUARD_VENDOR_WORKERS', '1'))),
+    'fingerbank': (interrogate, int(os.getenv('EDGEGUARD_FINGERBANK_WORKERS', '2'))),
+}
+
+QUEUE_SIZE = 10000
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 300.0
+
+# Results are written back at most this often
+FLUSH_INTERVAL = 1.0
+
+# A finished lookup is not repeated for the same device within this window
+RESUBMIT_AFTER = 3600
+# Lookups that found nothing (unknown vendor or device) wait longer; lookups
+# that failed after all retries use RESUBMIT_AFTER
+RESUBMIT_NEGATIVE_AFTER = int(os.getenv('EDGEGUARD_ENRICHMENT_NEGATIVE_TTL', '86400'))
+MAX_COMPLETED = 50000
+
+class EnrichmentPool:
+    """Per-source worker pools for slow lookups.
+
+    write_results(results) is called on the database writer thread with a
+    list of [source, mac_address, value] items.
+    """
+
+    def __init__(self, write_results, sources=None):
+        self.write_results = write_results
+        self.sources = sources or SOURCES
+        self.queues = {source: Queue(maxsize=QUEUE_SIZE) for source in self.sources}
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.completed = {}
+        self.retries = []
+        self.sequence = itertools.count()
+        self.results = []
+        self.counters = {'submitted': 0, 'succeeded': 0, 'retried': 0, 'failed': 0, 'dropped': 0}
+        self.started = False
+        self.running = False
+
+    def start(self):
+        """Start worker and scheduler threads."""
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+            self.running = True
+
+        for source, (_, workers) in self.sources.items():
+            for _ in range(workers):
+                threading.Thread(target=self._worker, args=(source,), daemon=True).start()
+        threading.Thread(target=self._scheduler, daemon=True).start()
+
+    def stop(self):
+        """Stop accepting work and write back what has finished."""
+        self.running = False
+        self.flush()
+
+    def submit(self, source, mac_address, *args):
+        """Queue a lookup unless it is already pending or recently done.
+
+        Returns immediately; False if the job was skipped or dropped.
+        """
+        key = (source, mac_address)
+        now = time.time()
+        with self.lock:
+            if key in self.pending or now < self.completed.get(key, 0):
+                return False
+            self.pending.add(key)
+            self.counters['submitted'] += 1
+
+        self.start()
+        try:
+            self.queues[source].put_nowait([source, mac_address, args, 0])
+        except Full:
+            with self.lock:
+                self.pending.discard(key)
+                self.counters['dropped'] += 1
+            logger.warning(f"Enrichment queue for {source} is full, dropping lookup for {mac_address}")
+            return False
+        return True
+
+    def _finish(self, source, mac_address, succeeded, resubmit_after=RESUBMIT_AFTER):
+        now = time.time()
+        with self.lock:
+            key = (source, mac_address)
+            self.pending.discard(key)
+            self.completed[key] = now + resubmit_after
+            self.counters['succeeded' if succeeded else 'failed'] += 1
+            if len(self.completed) > MAX_COMPLETED:
+                self.completed = {k: t for k, t in self.completed.items() if t > now}
+
+    def _worker(self, source):
+        lookup, _ = self.sources[source]
+        queue = self.queues[source]
+        while self.running:
+            job = queue.get()
+            _, mac_address, args, attempts = job
+            try:
+                value = lookup(*args)
+            except Exception as e:
+                attempts += 1
+                if attempts >= MAX_ATTEMPTS:
+                    logger.warning(f"{source} lookup for {mac_address} failed after {attempts} attempts: {e}")
+                    self._finish(source, mac_address, False)
+                    continue
+
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+                delay *= random.uniform(0.5, 1.0)
+                logger.debug(f"{source} lookup for {mac_address} failed ({e}), retrying in {delay:.1f}s")
+                with self.lock:
+                    job[3] = attempts
+                    heapq.heappush(self.retries, (time.time() + delay, next(self.sequence), job))
+                    self.counters['retried'] += 1
+                continue
+
+            with self.lock:
+                if value is not None:
+                    self.results.append([source, mac_address, value])
+            self._finish(source, mac_address, True, RESUBMIT_AFTER if value is not None else RESUBMIT_NEGATIVE_AFTER)
+
+    def _scheduler(self):
+        """Requeue due retries and flush results to the writer."""
+        last_flush = time.time()
+        while self.running:
+            time.sleep(0.2)
+            now = time.time()
+
+            due = []
+            with self.lock:
+                while self.retries and self.retries[0][0] <= now:
+                    due.append(heapq.heappop(self.retries)[2])
+            for job in due:
+                try:
+                    self.queues[job[0]].put_nowait(job)
+                except Full:
+                    self._finish(job[0], job[1], False)
+
+            if now - last_flush >= FLUSH_INTERVAL:
+                self.flush()
+                last_flush = now
+
+    def flush(self):
+        """Hand collected results to the database writer thread."""
+        with self.lock:
+            results, self.results = self.results, []
+        if results:
+            queue_write(self.write_results, results)
+
+    def stats(self):
+        """Counters and queue depths."""
+        with self.lock:
+            return dict(self.counters,
+                        pending=len(self.pending),
+                        retrying=len(self.retries),
+                        queued={source: queue.qsize() for source, queue in self.queues.items()})
@@ -0,0 +1,178 @@
+"""Background device identification, persisted in the devices.ident_* columns.
+
+Triggers bump devices.ident_dirty when a device's vendor, hostname or open
+ports change, or when it queries a domain for the first time. Every device
+is marked when the active signatures change (a signature pack was added,
+edited or removed). The monitor periodically re-identifies only marked
+devices, so the discover endpoints read stored results instead of scoring
+every device per request.
+"""
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from shared.database import get_connection
+from service.device_signatures import identify_device, signatures_digest, reload_signatures
+
+logger = logging.getLogger(__name__)
+
+IDENTIFY_INTERVAL = int(os.getenv('EDGEGUARD_IDENTIFY_INTERVAL', '30'))
+IDENTIFY_BATCH_SIZE = 500
+
+# Reverse lookups and mDNS names say nothing about the device model
+DOMAIN_FILTER = "dm.name NOT LIKE '%.in-addr.arpa' AND dm.name NOT LIKE '%.local'"
+
+def parse_ports(open_ports):
+    """Ports stored as a comma-separated string, as a list of ints."""
+    if not open_ports:
+        return []
+    try:
+        return [int(p.strip()) for p in open_ports.split(',') if p.strip()]
+    except ValueError:
+        return []
+
+def _device_domains(cursor, device_ids=None):
+    """Distinct queried domains for each device id, or for every device."""
+    if device_ids is None:
+        domains = {}
+        cursor.execute(f"""
+            SELECT dd.device_id, dm.name
+            FROM device_domains dd
+            JOIN domains dm ON dd.domain_id = dm.id
+            WHERE {DOMAIN_FILTER}
+        """)
+        for device_id, name in cursor.fetchall():
+            domains.setdefault(device_id, []).append(name)
+        return domains
+
+    domains = {device_id: [] for device_id in device_ids}
+    placeholders = ','.join('?' * len(device_ids))
+    cursor.execute(f"""
+        SELECT dd.device_id, dm.name
+        FROM device_domains dd
+        JOIN domains dm ON dd.domain_id = dm.id
+        WHERE dd.device_id IN ({placeholders}) AND {DOMAIN_FILTER}
+    """, device_ids)
+    for device_id, name in cursor.fetchall():
+        domains[device_id].append(name)
+    return domains
+
+def _identify_rows(devices, domains):
+    """UPDATE parameters for (id, vendor, hostname, open_ports, ident_dirty) rows."""
+    identifications = [
+        identify_device(vendor, domains.get(device_id, []), parse_ports(open_ports), hostname)
+        for device_id, vendor, hostname, open_ports, _ in devices
+    ]
+    return [
+        (
+            identification['device_id'],
+            identification['device_type'],
+            identification['category'],
+            identification['icon'],
+            identification['confidence'],
+            device_id,
+            dirty
+        )
+        for (device_id, _, _, _, dirty), identification in zip(devices, identifications)
+    ]
+
+def _store(cursor, results):
+    # A device whose inputs changed since it was read keeps ident_dirty set
+    cursor.executemany("""
+        UPDATE devices
+        SET ident_signature = ?, ident_type = ?, ident_category = ?, ident_icon = ?,
+            ident_confidence = ?, ident_dirty = 0, identified_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND ident_dirty = ?
+    """, results)
+
+def identify_dirty_devices(batch_size=IDENTIFY_BATCH_SIZE):
+    """Re-identify devices whose inputs changed. Returns the number updated.
+
+    A device changed again while its batch was being scored keeps a non-zero
+    ident_dirty and is picked up on the next pass.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    updated = 0
+    last_id = 0
+    try:
+        digest = signatures_digest()
+        cursor.execute("SELECT signatures_digest FROM identification_state WHERE name = 'devices'")
+        row = cursor.fetchone()
+        if not row or row[0] != digest:
+            marked = _mark_all_dirty(cursor, digest)
+            conn.commit()
+            logger.info(f"Signatures changed, re-identifying {marked} devices")
+
+        while True:
+            cursor.execute("""
+                SELECT id, vendor, hostname, open_ports, ident_dirty
+                FROM devices
+                WHERE ident_dirty > 0 AND id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, batch_size))
+            devices = cursor.fetchall()
+            if not devices:
+                break
+            last_id = devices[-1][0]
+
+            results = _identify_rows(devices, _device_domains(cursor, [row[0] for row in devices]))
+            _store(cursor, results)
+            conn.commit()
+            updated += len(results)
+    finally:
+        conn.close()
+
+    if updated:
+        logger.info(f"Identified {updated} devices")
+    return updated
+
+def reclassify_all():
+    """Re-identify every device in one batch, e.g. after a signature update.
+
+    Returns the device count and the time spent reading, scoring and writing.
+    """
+    reload_signatures()
+    digest = signatures_digest()
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, vendor, hostname, open_ports, ident_dirty FROM devices")
+        devices = cursor.fetchall()
+        domains = _device_domains(cursor)
+        read = time.perf_counter()
+
+        results = _identify_rows(devices, domains)
+        identified = time.perf_counter()
+
+        _store(cursor, results)
+        _record_digest(cursor, digest)
+        conn.commit()
+    finally:
+        conn.close()
+    finished = time.perf_counter()
+
+    logger.info(f"Reclassified {len(devices)} devices in {(finished - started) * 1000:.0f} ms")
+    return {
+        'devices': len(devices),
+        'read_ms': round((read - started) * 1000, 1),
+        'identify_ms': round((identified - read) * 1000, 1),
+        'write_ms': round((finished - identified) * 1000, 1),
+        'total_ms': round((finished - started) * 1000, 1)
+    }
+
+def _record_digest(cursor, digest):
+    cursor.execute("""
+        INSERT OR REPLACE INTO identification_state (name, signatures_digest) VALUES ('devices', ?)
+    """, (digest,))
+
+def _mark_all_dirty(cursor, digest):
+    cursor.execute("UPDATE devices SET ident_dirty = ident_dirty + 1")
+    marked = cursor.rowcount
+    _record_digest(cursor, digest)
+    return marked
@@ -8,6 +8,10 @@ from threading import Thread
 
 sys.path.append(str(Path(__file__).parent.parent))
 from shared.database import init_db
+from shared.retention import run_retention
+from shared.maintenance import run_due_tasks
+from shared.events import EventBus, EventSocketServer
+from service.identification import identify_dirty_devices, IDENTIFY_INTERVAL
 from service.collectors.arp_listener import ARPListener
 from service.collectors.packet_sniffer import PacketSniffer
 from service.collectors.device_tracker import DeviceTracker
@@ -35,9 +39,11 @@ class EdgeGuardMonitor:
     
     def __init__(self):
         self.running = False
+        self.events = EventBus()
+        self.event_server = EventSocketServer(self.events)
         self.device_tracker = DeviceTracker()
         self.arp_listener = ARPListener(self.on_device_discovered)
-        self.mdns_listener = MDNSListener(self.on_mdns_service)
+        self.mdns_listener = MDNSListener(self.on_mdns_service, self.on_hostname)
         self.ssdp_listener = SSDPListener(self.on_ssdp_device)
         self.dhcp_fingerprinter = DHCPFingerprinter(self.on_dhcp_fingerprint)
         self.port_scanner = PortScanner(self.on_ports_discovered)
@@ -54,12 +60,14 @@ class EdgeGuardMonitor:
             icmp_callback=self.on_icmp_event,
             tcp_fingerprint_callback=self.on_tcp_fingerprint,
             sni_callback=self.on_sni_domain,
-            ja3_callback=self.on_ja3_fingerprint
+            ja3_callback=self.on_ja3_fingerprint,
+            hostname_callback=self.on_hostname
         )
     
     def on_device_discovered(self, mac_address, ip_address):
         """Callback when device is discovered via ARP."""
-        self.device_tracker.add_or_update_device(mac_address, ip_address)
+        if self.device_tracker.add_or_update_device(mac_address, ip_address):
+            self.events.publish('device', ip=ip_address, mac=mac_address, hostname=None)
     
     def on_traffic(self, ip_address, bytes_sent, bytes_received, packets_sent, packets_received):
         """Callback for traffic statistics."""
@@ -68,6 +76,7 @@ class EdgeGuardMonitor:
     def on_dns_query(self, ip_address, domain, query_type):
         """Callback for DNS queries."""
         self.device_tracker.log_dns_query(ip_address, domain, query_type)
+        self.events.publish('dns', ip=ip_address, domain=domain, query_type=query_type)
     
     def on_connection(self, src_ip, src_port, dst_ip, dst_port, protocol, bytes_sent):
         """Callback for network connections."""
@@ -84,6 +93,7 @@ class EdgeGuardMonitor:
     def on_port_scan(self, src_ip, target_ip, ports):
         """Callback for port scan detection."""
         self.device_tracker.log_port_scan(src_ip, target_ip, ports)
+        self.events.publish('port_scan', ip=src_ip, target_ip=target_ip, ports=sorted(ports))
     
     def on_dhcp_event(self, src_ip, event_type, packet):
         """Callback for DHCP events."""
@@ -125,6 +135,10 @@ class EdgeGuardMonitor:
                     f"Model: {device_model}" if device_model else None
                 )
     
+    def on_hostname(self, ip_address, hostname, source):
+        """Callback for hostnames seen in mDNS or DNS answers."""
+        self.device_tracker.observe_hostname(ip_address, hostname, source)
+    
     def on_ssdp_device(self, location, server, usn, device_type, src_ip):
         """Callback for SSDP/UPnP device discovery."""
         self.device_tracker.log_service_discovery(
@@ -136,13 +150,15 @@ class EdgeGuardMonitor:
     
     def on_dhcp_fingerprint(self, mac_address, ip_address, hostname, vendor_class, dhcp_fingerprint):
         """Callback for DHCP fingerprinting."""
-        self.device_tracker.add_or_update_device(
+        is_new = self.device_tracker.add_or_update_device(
             mac_address, 
             ip_address, 
             hostname, 
             dhcp_fingerprint, 
             vendor_class
         )
+        if is_new:
+            self.events.publish('device', ip=ip_address, mac=mac_address, hostname=hostname)
     
     def on_tcp_fingerprint(self, ip_address, os_name, ttl, window_size, tcp_options, mss):
         """Callback for TCP/IP fingerprinting."""
@@ -151,6 +167,7 @@ class EdgeGuardMonitor:
     def on_sni_domain(self, ip_address, domain):
         """Callback for SNI domain extraction."""
         self.device_tracker.log_visited_site(ip_address, domain)
+        self.events.publish('sni', ip=ip_address, domain=domain)
     
     def on_ja3_fingerprint(self, ip_address, ja3_hash, ja3_string):
         """Callback for JA3 fingerprinting."""
@@ -188,20 +205,59 @@ class EdgeGuardMonitor:
             time.sleep(300)  # Every 5 minutes
             self.device_tracker.mark_inactive_devices()
     
+    def run_retention_jobs(self):
+        """Periodically roll up event tables and purge expired rows."""
+        while self.running:
+            time.sleep(3600)  # Every hour
+            try:
+                run_retention()
+            except Exception as e:
+                logger.error(f"Retention job failed: {e}")
+    
+    def run_maintenance_jobs(self):
+        """Run due backups, WAL checkpoints and incremental vacuums."""
+        while self.running:
+            time.sleep(60)
+            try:
+                run_due_tasks()
+            except Exception as e:
+                logger.error(f"Maintenance job failed: {e}")
+    
+    def run_identification_jobs(self):
+        """Re-identify devices whose vendor, hostname, ports or domains changed."""
+        while self.running:
+            time.sleep(IDENTIFY_INTERVAL)
+            try:
+                identify_dirty_devices()
+            except Exception as e:
+                logger.error(f"Identification job failed: {e}")
+    
+    def replay_spilled_events(self):
+        """Flush buffered flows and drain the spill journal once database pressure drops."""
+        while self.running:
+            time.sleep(1)
+            try:
+                self.device_tracker.flush_connections()
+            except Exception as e:
+                logger.error(f"Connection flush failed: {e}")
+            if not self.device_tracker.journal.pending() and not self.device_tracker.replayed_since:
+                continue
+            replayed = self.device_tracker.replay_journal()
+            if replayed:
+                logger.info(f"Replayed {replayed} journaled events")
+    
     def update_traffic_stats(self):
-        """Periodically update traffic stats from sniffer."""
+        """Periodically record traffic samples from sniffer."""
         while self.running:
+            started = time.time()
             time.sleep(60)  # Every minute
-            stats = self.packet_sniffer.get_stats()
-            for ip, data in stats.items():
-                self.device_tracker.update_traffic_stats(
-                    ip, 
-                    data['sent'], 
-                    data['received'],
-                    data['packets_sent'],
-                    data['packets_received']
-                )
-            self.packet_sniffer.reset_stats()
+            stats = self.packet_sniffer.take_stats()
+            samples = [
+                [ip, data['sent'], data['received'], data['packets_sent'], data['packets_received']]
+                for ip, data in stats.items()
+            ]
+            if samples:
+                self.device_tracker.record_traffic(samples, started)
     
     def start(self):
         """Start monitoring service."""
@@ -216,6 +272,26 @@ class EdgeGuardMonitor:
         cleanup_thread = Thread(target=self.cleanup_inactive_devices, daemon=True)
         cleanup_thread.start()
         
+        # Start retention thread
+        retention_thread = Thread(target=self.run_retention_jobs, daemon=True)
+        retention_thread.start()
+        
+        # Start maintenance thread
+        maintenance_thread = Thread(target=self.run_maintenance_jobs, daemon=True)
+        maintenance_thread.start()
+        
+        # Start identification thread
+        identification_thread = Thread(target=self.run_identification_jobs, daemon=True)
+        identification_thread.start()
+        
+        # Start journal replay thread
+        replay_thread = Thread(target=self.replay_spilled_events, daemon=True)
+        replay_thread.start()
+        
+        # Start live event socket thread
+        event_thread = Thread(target=self.event_server.start, daemon=True)
+        event_thread.start()
+        
         # Start discovery scan thread
         discovery_thread = Thread(target=self.run_discovery_scan, daemon=True)
         discovery_thread.start()
@@ -250,6 +326,9 @@ class EdgeGuardMonitor:
         """Stop monitoring service."""
         logger.info("Stopping EdgeGuard monitoring service...")
         self.running = False
+        self.event_server.stop()
+        self.device_tracker.flush_connections()
+        self.device_tracker.enrichment.stop()
 
 def signal_handler(sig, frame):
     """Handle shutdown signals."""
@@ -0,0 +1,399 @@
+"""Passive OS fingerprinting from TCP SYN and SYN+ACK packets, p0f style.
+
+Signatures use the p0f 3 syntax:
+
+    ver:ittl:olen:mss:wsize,scale:olayout:quirks:pclass
+
+    ver      IP version: 4, 6 or * for either
+    ittl     initial TTL; the observed TTL may be lower by up to MAX_DISTANCE hops
+    olen     length of IP options
+    mss      maximum segment size, or *
+    wsize    window size: a number, mss*N, mtu*N, %N (a multiple of N) or *
+    scale    window scale, or *
+    olayout  TCP options in order: mss, nop, ws, sok, sack, ts, eol+N (N bytes after EOL)
+    quirks   df, id+, id-, ecn, 0+, seq-, ack+, ack-, uptr+, urgf+, pushf+,
+             ts1-, ts2+, opt+, exws, bad
+    pclass   0 for no payload, + for payload, * for either
+
+Signatures are indexed by direction and option layout, which rarely varies
+between two packets from one stack, so a packet's candidates are a single
+dict lookup. A candidate matching every field is an exact match. Failing
+that, one that only differs in TTL distance or in the DF/IP ID/ECN quirks
+is a fuzzy match. Without either, the OS family is guessed from the TTL.
+The first matching signature wins; entries from signature packs come before
+the built-in ones.
+"""
+import logging
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from service.signature_packs import PackLoader
+
+logger = logging.getLogger(__name__)
+
+# Hops between a host and the sensor before a TTL stops counting as exact
+MAX_DISTANCE = 35
+
+# Quirks that middleboxes and stack settings change for the same OS
+FUZZY_QUIRKS = frozenset({'df', 'id+', 'id-', 'ecn'})
+
+QUIRKS = frozenset({'df', 'id+', 'id-', 'ecn', '0+', 'flow', 'seq-', 'ack+', 'ack-', 'uptr+',
+                    'urgf+', 'pushf+', 'ts1-', 'ts2+', 'opt+', 'exws', 'bad'})
+
+# TCP option kind -> layout name
+OPTION_NAMES = {1: 'nop', 2: 'mss', 3: 'ws', 4: 'sok', 5: 'sack', 8: 'ts'}
+
+# TCP flags
+FIN, SYN, RST, PSH, ACK, URG, ECE, CWR, NS = 0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x100
+
+DIRECTIONS = ('syn', 'syn+ack')
+
+# Built-in signatures: (direction, OS, p0f signatures)
+OS_SIGNATURES = [
+    # Linux / Android
+    ('syn', 'Linux 3.11+', ['*:64:0:*:mss*20,10:mss,sok,ts,nop,ws:df,id+:0',
+                            '*:64:0:*:mss*20,7:mss,sok,ts,nop,ws:df,id+:0',
+                            '*:64:0:*:mss*20,7:mss,sok,ts,nop,ws:df:0',
+                            '*:64:0:*:mss*45,7:mss,sok,ts,nop,ws:df:0',
+                            '*:64:0:*:mss*44,7:mss,sok,ts,nop,ws:df:0']),
+    ('syn', 'Linux 3.1-3.10', ['*:64:0:*:mss*10,4:mss,sok,ts,nop,ws:df,id+:0',
+                               '*:64:0:*:mss*10,5:mss,sok,ts,nop,ws:df,id+:0',
+                               '*:64:0:*:mss*10,6:mss,sok,ts,nop,ws:df,id+:0',
+                               '*:64:0:*:mss*10,7:mss,sok,ts,nop,ws:df,id+:0']),
+    ('syn', 'Linux 2.6', ['*:64:0:*:mss*4,6:mss,sok,ts,nop,ws:df,id+:0',
+                          '*:64:0:*:mss*4,7:mss,sok,ts,nop,ws:df,id+:0',
+                          '*:64:0:*:mss*4,8:mss,sok,ts,nop,ws:df,id+:0']),
+    ('syn', 'Linux 2.4', ['*:64:0:*:mss*4,0:mss,sok,ts,nop,ws:df,id+:0',
+                          '*:64:0:*:mss*4,1:mss,sok,ts,nop,ws:df,id+:0',
+                          '*:64:0:*:mss*4,2:mss,sok,ts,nop,ws:df,id+:0',
+                          '*:64:0:*:5840,0:mss,sok,ts,nop,ws:df,id+:0']),
+    ('syn', 'Android', ['*:64:0:*:mss*44,1:mss,sok,ts,nop,ws:df,id+:0',
+                        '*:64:0:*:mss*44,3:mss,sok,ts,nop,ws:df,id+:0',
+                        '*:64:0:*:65535,8:mss,sok,ts,nop,ws:df:0']),
+    ('syn', 'Linux (embedded)', ['*:64:0:*:mss*4,0:mss,sok,ts:df,id+:0',
+                                 '*:64:0:*:mss*4,0:mss:df,id+:0',
+                                 '*:64:0:*:5840,0:mss:df,id+:0',
+                                 '*:64:0:*:mss*4,0:mss,nop,nop,sok:df,id+:0']),
+
+    # Windows
+    ('syn', 'Windows 10/11', ['*:128:0:*:64240,8:mss,nop,ws,nop,nop,sok:df,id+:0',
+                              '*:128:0:*:65535,8:mss,nop,ws,nop,nop,sok:df,id+:0',
+                              '*:128:0:*:64800,8:mss,nop,ws,nop,nop,sok:df,id+:0']),
+    ('syn', 'Windows 7/8', ['*:128:0:*:8192,0:mss,nop,nop,sok:df,id+:0',
+                            '*:128:0:*:8192,2:mss,nop,ws,nop,nop,sok:df,id+:0',
+                            '*:128:0:*:8192,8:mss,nop,ws,nop,nop,sok:df,id+:0',
+                            '*:128:0:*:8192,2:mss,nop,ws,sok,ts:df,id+:0']),
+    ('syn', 'Windows XP', ['*:128:0:*:16384,0:mss,nop,nop,sok:df,id+:0',
+                           '*:128:0:*:65535,0:mss,nop,nop,sok:df,id+:0',
+                           '*:128:0:*:65535,0:mss,nop,ws,nop,nop,sok:df,id+:0',
+                           '*:128:0:*:65535,1:mss,nop,ws,nop,nop,sok:df,id+:0',
+                           '*:128:0:*:65535,2:mss,nop,ws,nop,nop,sok:df,id+:0']),
+
+    # Apple
+    ('syn', 'iOS/macOS', ['*:64:0:*:65535,6:mss,nop,ws,nop,nop,ts,sok,eol+1:df:0',
+                          '*:64:0:*:65535,6:mss,nop,ws,nop,nop,ts,sok,eol+1:df,id+:0',
+                          '*:64:0:*:65535,5:mss,nop,ws,nop,nop,ts,sok,eol+1:df,id+:0',
+                          '*:64:0:*:65535,4:mss,nop,ws,nop,nop,ts,sok,eol+1:df,id+:0',
+                          '*:64:0:*:65535,3:mss,nop,ws,nop,nop,ts,sok,eol+1:df,id+:0',
+                          '*:64:0:*:65535,2:mss,nop,ws,nop,nop,ts,sok,eol+1:df,id+:0',
+                          '*:64:0:*:65535,1:mss,nop,ws,nop,nop,ts,sok,eol+1:df,id+:0']),
+
+    # BSD and others
+    ('syn', 'FreeBSD', ['*:64:0:*:65535,6:mss,nop,ws,sok,ts:df,id+:0',
+                        '*:64:0:*:65535,3:mss,nop,ws,sok,ts:df,id+:0',
+                        '*:64:0:*:65535,1:mss,nop,ws,sok,ts:df,id+:0',
+                        '*:64:0:*:65535,0:mss,nop,ws,sok,ts:df,id+:0']),
+    ('syn', 'OpenBSD', ['*:64:0:*:16384,0:mss,nop,nop,sok,nop,ws,nop,nop,ts:df,id+:0',
+                        '*:64:0:*:16384,3:mss,nop,nop,sok,nop,ws,nop,nop,ts:df,id+:0']),
+    ('syn', 'Solaris', ['*:64:0:*:32850,1:nop,ws,nop,nop,ts,nop,nop,sok,mss:df,id+:0',
+                        '*:64:0:*:mss*34,0:mss,nop,ws,nop,nop,sok:df,id+:0',
+                        '*:255:0:*:8760,0:mss,nop,ws,nop,nop,sok:df,id+:0']),
+    ('syn', 'Cisco IOS', ['*:255:0:*:4128,0:mss::0']),
+
+    # Responses from local servers (SYN+ACK)
+    ('syn+ack', 'Linux', ['*:64:0:*:mss*10,0:mss:df:0',
+                          '*:64:0:*:mss*10,0:mss,sok,ts:df:0',
+                          '*:64:0:*:mss*10,0:mss,nop,nop,ts:df:0',
+                          '*:64:0:*:mss*10,0:mss,nop,nop,sok:df:0',
+                          '*:64:0:*:mss*10,*:mss,nop,ws:df:0',
+                          '*:64:0:*:mss*10,*:mss,sok,ts,nop,ws:df:0',
+                          '*:64:0:*:mss*10,*:mss,nop,nop,sok,nop,ws:df:0',
+                          '*:64:0:*:mss*45,*:mss,nop,nop,sok,nop,ws:df:0',
+                          '*:64:0:*:mss*45,*:mss,sok,ts,nop,ws:df:0',
+                          '*:64:0:*:mss*44,*:mss,sok,ts,nop,ws:df:0',
+                          '*:64:0:*:%8,*:mss,sok,ts,nop,ws:df:0',
+                          '*:64:0:*:5792,*:mss,sok,ts,nop,ws:df:0',
+                          '*:64:0:*:5792,0:mss,sok,ts:df:0']),
+    ('syn+ack', 'Linux (embedded)', ['*:64:0:*:mss*4,0:mss:df:0',
+                                     '*:64:0:*:5840,0:mss:df:0',
+                                     '*:64:0:*:mss*4,0:mss,nop,nop,sok:df:0']),
+    ('syn+ack', 'Windows 10/11', ['*:128:0:*:65535,8:mss,nop,ws,sok,ts:df,id+:0',
+                                  '*:128:0:*:65535,8:mss,nop,ws,nop,nop,sok:df,id+:0',
+                                  '*:128:0:*:64240,8:mss,nop,ws,nop,nop,sok:df,id+:0',
+                                  '*:128:0:*:65535,0:mss,nop,ws,sok,ts:df,id+:0']),
+    ('syn+ack', 'Windows 7/8', ['*:128:0:*:8192,0:mss:df,id+:0',
+                                '*:128:0:*:8192,0:mss,sok:df,id+:0',
+                                '*:128:0:*:8192,8:mss,nop,ws,sok,ts:df,id+:0',
+                                '*:128:0:*:8192,0:mss,nop,nop,sok:df,id+:0',
+                                '*:128:0:*:8192,8:mss,nop,ws,nop,nop,sok:df,id+:0']),
+    ('syn+ack', 'Windows XP', ['*:128:0:*:65535,0:mss:df,id+:0',
+                               '*:128:0:*:65535,0:mss,nop,nop,sok:df,id+:0',
+                               '*:128:0:*:16384,0:mss,nop,nop,sok:df,id+:0']),
+    ('syn+ack', 'iOS/macOS', ['*:64:0:*:65535,*:mss,nop,ws,nop,nop,ts,sok,eol+1:df:0',
+                              '*:64:0:*:65535,*:mss,nop,ws,nop,nop,ts,sok,eol+1:df,id+:0',
+                              '*:64:0:*:65535,*:mss,nop,ws,sok,eol+1:df,id+:0',
+                              '*:64:0:*:65535,*:mss,nop,ws,sok,eol+1:df:0']),
+    ('syn+ack', 'FreeBSD', ['*:64:0:*:65535,*:mss,nop,ws,sok,ts:df,id+:0',
+                            '*:64:0:*:65535,*:mss,nop,ws,sok,ts:df:0']),
+    ('syn+ack', 'Cisco IOS', ['*:255:0:*:4128,0:mss::0']),
+]
+
+Signature = namedtuple('Signature', 'name direction version ittl olen mss wsize scale layout quirks pclass')
+
+Observation = namedtuple('Observation', 'direction version ttl olen mss window scale layout quirks payload')
+
+def _number(value, field, signature):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"bad {field} {value!r} in {signature!r}")
+
+def parse_signature(signature, name='', direction='syn'):
+    """Signature from p0f syntax; raises ValueError if malformed."""
+    fields = signature.split(':')
+    if len(fields) != 8:
+        raise ValueError(f"expected 8 fields in {signature!r}")
+    version, ittl, olen, mss, window, layout, quirks, pclass = fields
+    if direction not in DIRECTIONS:
+        raise ValueError(f"direction must be one of {', '.join(DIRECTIONS)}")
+    if version not in ('4', '6', '*'):
+        raise ValueError(f"bad version {version!r} in {signature!r}")
+
+    if ',' not in window:
+        raise ValueError(f"expected wsize,scale in {signature!r}")
+    wsize, scale = window.split(',', 1)
+    if wsize == '*':
+        wsize = None
+    elif wsize.startswith(('mss*', 'mtu*')):
+        wsize = (wsize[:3], _number(wsize[4:], 'wsize', signature))
+    elif wsize.startswith('%'):
+        wsize = ('%', _number(wsize[1:], 'wsize', signature))
+        if not wsize[1]:
+            raise ValueError(f"bad wsize %0 in {signature!r}")
+    else:
+        wsize = ('=', _number(wsize, 'wsize', signature))
+
+    for option in layout.split(',') if layout else []:
+        if option not in OPTION_NAMES.values() and not option.startswith('eol+'):
+            raise ValueError(f"bad option {option!r} in {signature!r}")
+    unknown = set(quirks.split(',') if quirks else []) - QUIRKS
+    if unknown:
+        raise ValueError(f"bad quirks {', '.join(sorted(unknown))} in {signature!r}")
+    if pclass not in ('0', '+', '*'):
+        raise ValueError(f"bad pclass {pclass!r} in {signature!r}")
+
+    return Signature(
+        name=name,
+        direction=direction,
+        version=None if version == '*' else int(version),
+        ittl=_number(ittl.rstrip('-'), 'ittl', signature),
+        olen=_number(olen, 'olen', signature),
+        mss=None if mss == '*' else _number(mss, 'mss', signature),
+        wsize=wsize,
+        scale=None if scale == '*' else _number(scale, 'scale', signature),
+        layout=layout,
+        quirks=frozenset(quirks.split(',') if quirks else ()),
+        pclass=None if pclass == '*' else pclass == '+'
+    )
+
+def parse_tcp_options(data):
+    """(layout, mss, scale, ts1, ts2, quirks) from raw TCP option bytes."""
+    layout = []
+    mss = scale = ts1 = ts2 = None
+    quirks = set()
+    i = 0
+    while i < len(data):
+        kind = data[i]
+        if kind == 0:
+            rest = data[i + 1:]
+            layout.append(f"eol+{len(rest)}")
+            if any(rest):
+                quirks.add('opt+')
+            break
+        if kind == 1:
+            layout.append('nop')
+            i += 1
+            continue
+        if i + 1 >= len(data) or data[i + 1] < 2 or i + data[i + 1] > len(data):
+            quirks.add('bad')
+            break
+        length = data[i + 1]
+        value = data[i + 2:i + length]
+        layout.append(OPTION_NAMES.get(kind, f"?{kind}"))
+        if kind == 2:
+            if length == 4:
+                mss = int.from_bytes(value, 'big')
+            else:
+                quirks.add('bad')
+        elif kind == 3:
+            if length == 3:
+                scale = value[0]
+                if scale > 14:
+                    quirks.add('exws')
+            else:
+                quirks.add('bad')
+        elif kind == 4 and length != 2:
+            quirks.add('bad')
+        elif kind == 8:
+            if length == 10:
+                ts1 = int.from_bytes(value[:4], 'big')
+                ts2 = int.from_bytes(value[4:], 'big')
+            else:
+                quirks.add('bad')
+        i += length
+    return ','.join(layout), mss, scale, ts1, ts2, quirks
+
+def observe(ttl, ip_options_length, df, ip_id, ip_reserved, ecn, flags, seq, ack, window,
+            urgent_pointer, options, payload_length, version=4):
+    """Observation for a SYN or SYN+ACK, or None for any other segment.
+
+    flags: TCP flags as an int (including ECE, CWR and NS); ecn: the IP ECN
+    bits; options: raw TCP option bytes.
+    """
+    if flags & (SYN | ACK | RST | FIN) == SYN:
+        direction = 'syn'
+    elif flags & (SYN | ACK | RST | FIN) == SYN | ACK:
+        direction = 'syn+ack'
+    else:
+        return None
+
+    layout, mss, scale, ts1, ts2, quirks = parse_tcp_options(options)
+    if df:
+        quirks.add('df')
+        if ip_id:
+            quirks.add('id+')
+    elif not ip_id:
+        quirks.add('id-')
+    if ecn or flags & (ECE | CWR | NS):
+        quirks.add('ecn')
+    if ip_reserved:
+        quirks.add('0+')
+    if not seq:
+        quirks.add('seq-')
+    if ack and not flags & ACK:
+        quirks.add('ack+')
+    if not ack and flags & ACK:
+        quirks.add('ack-')
+    if urgent_pointer and not flags & URG:
+        quirks.add('uptr+')
+    if flags & URG:
+        quirks.add('urgf+')
+    if flags & PSH:
+        quirks.add('pushf+')
+    if ts1 == 0:
+        quirks.add('ts1-')
+    if ts2 and direction == 'syn':
+        quirks.add('ts2+')
+
+    return Observation(direction, version, ttl, ip_options_length, mss, window, scale, layout,
+                       frozenset(quirks), payload_length > 0)
+
+def initial_ttl(ttl):
+    """Most likely initial TTL for an observed one."""
+    for initial in (32, 64, 128):
+        if ttl <= initial:
+            return initial
+    return 255
+
+def _window_matches(wsize, observation):
+    if wsize is None:
+        return True
+    kind, value = wsize
+    window, mss = observation.window, observation.mss
+    if kind == '=':
+        return window == value
+    if kind == '%':
+        return window % value == 0
+    if not mss:
+        return False
+    if kind == 'mss':
+        return window == mss * value
+    # MTU is the MSS plus the IP and TCP headers
+    return window == (mss + (40 if observation.version == 4 else 60)) * value
+
+def _matches(signature, observation, fuzzy):
+    if signature.version is not None and signature.version != observation.version:
+        return False
+    if signature.olen != observation.olen:
+        return False
+    if signature.mss is not None and signature.mss != observation.mss:
+        return False
+    if signature.scale is not None and signature.scale != (observation.scale or 0):
+        return False
+    if signature.pclass is not None and signature.pclass != observation.payload:
+        return False
+    if not _window_matches(signature.wsize, observation):
+        return False
+    if signature.ittl < observation.ttl:
+        return False
+    if fuzzy:
+        return signature.quirks - FUZZY_QUIRKS == observation.quirks - FUZZY_QUIRKS
+    return signature.quirks == observation.quirks and signature.ittl - observation.ttl <= MAX_DISTANCE
+
+class OSSignatureIndex:
+    """Signatures bucketed by (direction, option layout)."""
+
+    def __init__(self, signatures):
+        self.buckets = {}
+        for signature in signatures:
+            self.buckets.setdefault((signature.direction, signature.layout), []).append(signature)
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def match(self, observation):
+        """(signature, 'exact' or 'fuzzy'), or (None, None)."""
+        candidates = self.buckets.get((observation.direction, observation.layout), ())
+        for fuzzy, kind in ((False, 'exact'), (True, 'fuzzy')):
+            for signature in candidates:
+                if _matches(signature, observation, fuzzy):
+                    return signature, kind
+        return None, None
+
+def _ttl_guess(observation):
+    """OS family from the initial TTL alone."""
+    ttl = initial_ttl(observation.ttl)
+    if ttl == 128:
+        return "Windows (Unknown Version)"
+    if ttl == 64:
+        if observation.window == 65535:
+            return "iOS/macOS"
+        if observation.window < 10000:
+            return "Linux/Android"
+        return "Linux (Unknown Version)"
+    if ttl == 255:
+        return "Network Device (Cisco/Router)"
+    return "Unknown OS"
+
+def identify_os(observation):
+    """(OS name, match kind) with kind 'exact', 'fuzzy' or 'ttl'."""
+    signature, kind = _signatures.current().match(observation)
+    if signature:
+        return signature.name, kind
+    return _ttl_guess(observation), 'ttl'
+
+def _compile(sections):
+    return OSSignatureIndex([
+        parse_signature(entry['sig'], entry['name'], entry.get('direction', 'syn'))
+        for entry in sections['os']
+    ])
+
+# Built-in signatures plus the "os" entries of packs; see service/signature_packs.py
+_signatures = PackLoader(
+    'os',
+    {'os': [{'name': name, 'sig': sig, 'direction': direction}
+            for direction, name, sigs in OS_SIGNATURES for sig in sigs]},
+    _compile
+)
@@ -0,0 +1,269 @@
+"""Signature packs: device and OS signatures loaded from JSON files on disk.
+
+Every *.json file in EDGEGUARD_SIGNATURE_DIR is a pack:
+
+    {
+        "name": "acme",
+        "version": 3,
+        "devices": {"acme_cam": {"vendors": ["Acme"], "dns_patterns": ["cam.acme.com"], "ports": [554],
+                                 "device_type": "Acme Camera", "category": "security", "icon": "camera"}},
+        "categories": {"camera": {"name": "Cameras", "color": "#0ea5e9"}},
+        "os": [{"name": "AcmeOS", "sig": "*:64:0:*:mss*4,6:mss,sok,ts,nop,ws:df,id+:0", "direction": "syn"}]
+    }
+
+Packs apply in file name order on top of the built-in signatures; an entry
+with the same id replaces the earlier one. A device's category must be a
+built-in one or defined in the same pack. OS entries are p0f signatures
+(see service/os_fingerprints.py), and direction defaults to "syn". Each consumer (device
+identification, TCP fingerprinting) has a PackLoader for its sections, and
+compiles the merged sections from the validated JSON (a few milliseconds).
+Readers get the active compiled object without locking; a background thread
+checks the directory every RELOAD_CHECK_INTERVAL seconds and swaps in a new
+one with a single assignment. A pack that fails to parse or validate is
+skipped, and its last good version (a copy kept in LAST_GOOD_DIR, so this
+survives restarts, and validated again when used) stays in use.
+
+Check packs before installing them with:
+    python3 -m service.signature_packs check acme.json
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PACK_DIR = Path(os.getenv('EDGEGUARD_SIGNATURE_DIR', '/var/lib/edgeguard/signatures'))
+LAST_GOOD_DIR = Path(os.getenv('EDGEGUARD_SIGNATURE_LAST_GOOD', '/var/lib/edgeguard/signatures-last-good'))
+
+# Seconds between checks for added, changed or removed packs
+RELOAD_CHECK_INTERVAL = int(os.getenv('EDGEGUARD_SIGNATURE_RELOAD', '10'))
+
+PACK_KEYS = {'name', 'version', 'description', 'devices', 'categories', 'os'}
+DEVICE_KEYS = {'vendors', 'dns_patterns', 'ports', 'device_type', 'category', 'icon'}
+
+def _require(condition, message):
+    if not condition:
+        raise ValueError(message)
+
+def _strings(value, where):
+    _require(isinstance(value, list) and all(isinstance(s, str) and s for s in value),
+             f"{where} must be a list of non-empty strings")
+
+def validate_pack(pack):
+    """Raise ValueError describing the first problem with a parsed pack."""
+    _require(isinstance(pack, dict), "pack must be a JSON object")
+    unknown = set(pack) - PACK_KEYS
+    _require(not unknown, f"unknown keys: {', '.join(sorted(unknown))}")
+    _require(isinstance(pack.get('version'), int) and not isinstance(pack.get('version'), bool),
+             "version must be an integer")
+
+    devices = pack.get('devices', {})
+    _require(isinstance(devices, dict), "devices must be an object")
+    for device_id, signature in devices.items():
+        where = f"devices.{device_id}"
+        _require(isinstance(signature, dict), f"{where} must be an object")
+        _require(set(signature) == DEVICE_KEYS, f"{where} must have exactly: {', '.join(sorted(DEVICE_KEYS))}")
+        _strings(signature['vendors'], f"{where}.vendors")
+        _strings(signature['dns_patterns'], f"{where}.dns_patterns")
+        _require(isinstance(signature['ports'], list)
+                 and all(isinstance(p, int) and not isinstance(p, bool) and 0 < p < 65536 for p in signature['ports']),
+                 f"{where}.ports must be a list of port numbers")
+        for key in ('device_type', 'category', 'icon'):
+            _require(isinstance(signature[key], str) and signature[key], f"{where}.{key} must be a non-empty string")
+
+    categories = pack.get('categories', {})
+    _require(isinstance(categories, dict), "categories must be an object")
+    for category_id, category in categories.items():
+        _require(isinstance(category, dict) and set(category) == {'name', 'color'}
+                 and all(isinstance(v, str) for v in category.values()),
+                 f"categories.{category_id} must have string name and color")
+
+    # Imported here: both modules load their own signatures through this one
+    from service.device_signatures import DEVICE_CATEGORIES
+    from service.os_fingerprints import parse_signature
+
+    for device_id, signature in devices.items():
+        _require(signature['category'] in DEVICE_CATEGORIES or signature['category'] in categories,
+                 f"devices.{device_id}.category {signature['category']!r} is not a built-in category "
+                 f"or defined in this pack")
+
+    entries = pack.get('os', [])
+    _require(isinstance(entries, list), "os must be a list")
+    for i, entry in enumerate(entries):
+        _require(isinstance(entry, dict) and {'name', 'sig'} <= set(entry) <= {'name', 'sig', 'direction'},
+                 f"os[{i}] must have name and sig, and optionally direction")
+        _require(isinstance(entry['name'], str) and entry['name'], f"os[{i}].name must be a non-empty string")
+        _require(isinstance(entry['sig'], str), f"os[{i}].sig must be a string")
+        try:
+            parse_signature(entry['sig'], entry['name'], entry.get('direction', 'syn'))
+        except ValueError as e:
+            raise ValueError(f"os[{i}]: {e}")
+
+def _keep_last_good(path):
+    """Copy a valid pack aside, to fall back on if a later edit breaks it."""
+    copy = LAST_GOOD_DIR / path.name
+    try:
+        data = path.read_bytes()
+        if copy.exists() and copy.read_bytes() == data:
+            return
+        LAST_GOOD_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = copy.with_name(f"{copy.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, copy)
+    except OSError as e:
+        logger.warning(f"Could not keep a copy of signature pack {path.name}: {e}")
+
+def read_pack(path):
+    """Parsed and validated pack from a file; raises ValueError or OSError."""
+    pack = json.loads(Path(path).read_bytes())
+    validate_pack(pack)
+    return pack
+
+class PackLoader:
+    """Compiled form of some pack sections merged over built-in defaults.
+
+    name: used in log messages. builtin: {section: dict or list}; dict sections
+    merge by key, and list entries from later packs go first. compile: merged
+    sections -> the object handed to readers.
+    """
+
+    def __init__(self, name, builtin, compile):
+        self.name = name
+        self.builtin = builtin
+        self.compile = compile
+        self._files = {}  # path -> (mtime and size, version, sections or None if never valid)
+        self._active = (None, None)  # (content digest, compiled)
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+        with self._lock:
+            self._reload()
+
+    def current(self):
+        """Active compiled object; never waits for a reload."""
+        if time.monotonic() - self._checked >= RELOAD_CHECK_INTERVAL and self._lock.acquire(blocking=False):
+            self._checked = time.monotonic()
+            threading.Thread(target=self._reload_and_release, name=f"{self.name}-signatures", daemon=True).start()
+        return self._active[1]
+
+    @property
+    def digest(self):
+        """Content hash of the active merged sections."""
+        return self._active[0]
+
+    def reload(self):
+        """Check for changed packs now. Returns True if new signatures were swapped in."""
+        with self._lock:
+            return self._reload()
+
+    def _reload_and_release(self):
+        try:
+            self._reload()
+        except Exception as e:
+            logger.error(f"Signature reload failed: {e}")
+        finally:
+            self._lock.release()
+
+    def _scan(self):
+        """Refresh the per-file state from the pack directory; False if no file changed."""
+        try:
+            paths = sorted(PACK_DIR.glob('*.json'))
+        except OSError:
+            paths = []
+
+        stamps = {}
+        for path in paths:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            stamps[path] = (stat.st_mtime_ns, stat.st_size)
+        if stamps == {path: state[0] for path, state in self._files.items()}:
+            return False
+
+        files = {}
+        for path, stamp in stamps.items():
+            previous = self._files.get(path)
+            if previous and previous[0] == stamp:
+                files[path] = previous
+                continue
+            try:
+                pack = read_pack(path)
+                _keep_last_good(path)
+            except (OSError, ValueError) as e:
+                if previous and previous[2] is not None:
+                    logger.error(f"Invalid signature pack {path.name}, keeping version {previous[1]}: {e}")
+                    files[path] = (stamp, previous[1], previous[2])
+                    continue
+                try:
+                    pack = read_pack(LAST_GOOD_DIR / path.name)
+                    logger.error(f"Invalid signature pack {path.name}, using last good version {pack['version']}: {e}")
+                except (OSError, ValueError):
+                    logger.error(f"Invalid signature pack {path.name}, skipped: {e}")
+                    files[path] = (stamp, None, None)
+                    continue
+            sections = {section: pack[section] for section in self.builtin if section in pack}
+            files[path] = (stamp, pack['version'], sections)
+            if sections:
+                logger.info(f"Loaded {self.name} signatures from {path.name} version {pack['version']}")
+        self._files = files
+        return True
+
+    def _merged(self):
+        merged = {}
+        for section, content in self.builtin.items():
+            merged[section] = dict(content) if isinstance(content, dict) else list(content)
+        for _, _, sections in self._files.values():
+            for section, content in (sections or {}).items():
+                if isinstance(merged[section], dict):
+                    merged[section].update(content)
+                else:
+                    merged[section][:0] = content
+        return merged
+
+    def _reload(self):
+        self._checked = time.monotonic()
+        # Only stats the packs unless one was added, changed or removed
+        if not self._scan() and self._active[0] is not None:
+            return False
+        merged = self._merged()
+        encoded = json.dumps(merged, sort_keys=True, separators=(',', ':'))
+        digest = hashlib.sha256(encoded.encode()).hexdigest()
+        if digest == self._active[0]:
+            return False
+
+        try:
+            compiled = self.compile(merged)
+        except Exception as e:
+            logger.error(f"Could not compile {self.name} signatures, keeping the previous set: {e}")
+            return False
+
+        self._active = (digest, compiled)
+        logger.info(f"Active {self.name} signatures: {digest[:12]} "
+                    f"({', '.join(f'{len(content)} {section}' for section, content in merged.items())})")
+        return True
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="EdgeGuard signature packs")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    check = subparsers.add_parser('check', help="Validate pack files")
+    check.add_argument('pack', nargs='+')
+    args = parser.parse_args()
+
+    ok = True
+    for path in args.pack:
+        try:
+            pack = read_pack(path)
+        except (OSError, ValueError) as e:
+            print(f"{path}\tinvalid: {e}")
+            ok = False
+            continue
+        counts = ', '.join(f"{len(pack[section])} {section}" for section in ('devices', 'categories', 'os') if section in pack)
+        print(f"{path}\tversion {pack['version']}\t{counts or 'empty'}")
+    sys.exit(0 if ok else 1)
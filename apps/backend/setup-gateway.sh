@@ -51,6 +51,14 @@ iptables -t nat -A PREROUTING -i $INTERFACE -p tcp --dport 53 -j REDIRECT --to-p
 # Save iptables rules
 iptables-save > /etc/iptables/rules.v4 2>/dev/null || true
 
+# DuckDB analytics backend: its sqlite extension is downloaded now, while
+# online, because the API never downloads it at runtime
+if python3 -c "import duckdb" 2>/dev/null; then
+    echo "Installing DuckDB sqlite extension..."
+    (cd /opt/edgeguard && python3 -m shared.storage install-extension) || echo "WARNING: DuckDB analytics backend unavailable"
+    chmod -R a+rX /var/lib/edgeguard/duckdb-extensions 2>/dev/null || true
+fi
+
 echo ""
 echo "✅ Gateway setup complete!"
 echo ""
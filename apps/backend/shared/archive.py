@@ -0,0 +1,325 @@
+"""Columnar archive of aged event data: one Parquet file per table per day.
+
+Rows older than EDGEGUARD_ARCHIVE_AFTER_DAYS are exported (denormalized, so
+files are self-contained) to <archive dir>/<table>/<YYYY-MM-DD>.parquet and
+then removed from the live database. query_archive() scans the files locally
+with DuckDB, which pushes predicates down into the Parquet readers.
+
+    python3 -m shared.archive run
+    python3 -m shared.archive query "SELECT domain, COUNT(*) FROM dns_queries GROUP BY 1" --since 2026-01-01
+"""
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from shared.database import get_connection
+from shared.retention import delete_in_chunks
+
+# Optional dependencies: archiving needs pyarrow, querying needs duckdb
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(os.getenv('EDGEGUARD_ARCHIVE_DIR', '/var/lib/edgeguard/archive'))
+ARCHIVE_AFTER_DAYS = int(os.getenv('EDGEGUARD_ARCHIVE_AFTER_DAYS', '0'))  # 0 disables archiving
+ARCHIVE_COMPRESSION = os.getenv('EDGEGUARD_ARCHIVE_COMPRESSION', 'zstd')
+FETCH_BATCH_SIZE = 10000
+
+# Archived tables: alias used in the SELECT, time column, rollup that must
+# cover a day before it is archived, denormalized SELECT and column types.
+ARCHIVE_TABLES = {
+    'dns_queries': {
+        'alias': 'q',
+        'time_column': 'timestamp',
+        'rollup': 'dns',
+        'select': """
+            SELECT q.id, q.device_id, dev.mac_address, dm.name, q.query_type, q.timestamp
+            FROM dns_queries q
+            JOIN domains dm ON q.domain_id = dm.id
+            LEFT JOIN devices dev ON q.device_id = dev.id
+        """,
+        'columns': [('id', 'int64'), ('device_id', 'int64'), ('mac_address', 'string'),
+                    ('domain', 'string'), ('query_type', 'string'), ('timestamp', 'timestamp')],
+    },
+    'connections': {
+        'alias': 'c',
+        'time_column': 'last_seen',
+        'rollup': 'connection',
+        'select': """
+            SELECT c.id, c.device_id, dev.mac_address, c.protocol, c.src_ip, c.src_port,
+                   c.dst_ip, c.dst_port, c.bytes_sent, c.bytes_received, c.packets_sent,
+                   c.packets_received, c.bucket, c.first_seen, c.last_seen
+            FROM connections c
+            LEFT JOIN devices dev ON c.device_id = dev.id
+        """,
+        'columns': [('id', 'int64'), ('device_id', 'int64'), ('mac_address', 'string'),
+                    ('protocol', 'string'), ('src_ip', 'string'), ('src_port', 'int64'),
+                    ('dst_ip', 'string'), ('dst_port', 'int64'), ('bytes_sent', 'int64'),
+                    ('bytes_received', 'int64'), ('packets_sent', 'int64'),
+                    ('packets_received', 'int64'), ('bucket', 'timestamp'),
+                    ('first_seen', 'timestamp'),
+                    ('last_seen', 'timestamp')],
+    },
+    'http_metadata': {
+        'alias': 'h',
+        'time_column': 'timestamp',
+        'rollup': 'http',
+        'select': """
+            SELECT h.id, h.device_id, dev.mac_address, h.method, hs.name, h.path, u.name,
+                   ua.name, h.referer, h.status_code, h.timestamp
+            FROM http_metadata h
+            LEFT JOIN hosts hs ON h.host_id = hs.id
+            LEFT JOIN urls u ON h.url_id = u.id
+            LEFT JOIN user_agents ua ON h.user_agent_id = ua.id
+            LEFT JOIN devices dev ON h.device_id = dev.id
+        """,
+        'columns': [('id', 'int64'), ('device_id', 'int64'), ('mac_address', 'string'),
+                    ('method', 'string'), ('host', 'string'), ('path', 'string'),
+                    ('full_url', 'string'), ('user_agent', 'string'), ('referer', 'string'),
+                    ('status_code', 'int64'), ('timestamp', 'timestamp')],
+    },
+    'tls_metadata': {
+        'alias': 't',
+        'time_column': 'timestamp',
+        'rollup': 'tls',
+        'select': """
+            SELECT t.id, t.device_id, dev.mac_address, dm.name, t.tls_version, t.cipher_suite,
+                   t.cert_issuer, t.cert_subject, t.cert_expiry, t.timestamp
+            FROM tls_metadata t
+            LEFT JOIN domains dm ON t.server_name_id = dm.id
+            LEFT JOIN devices dev ON t.device_id = dev.id
+        """,
+        'columns': [('id', 'int64'), ('device_id', 'int64'), ('mac_address', 'string'),
+                    ('server_name', 'string'), ('tls_version', 'string'),
+                    ('cipher_suite', 'string'), ('cert_issuer', 'string'),
+                    ('cert_subject', 'string'), ('cert_expiry', 'string'),
+                    ('timestamp', 'timestamp')],
+    },
+    'icmp_events': {
+        'alias': 'i',
+        'time_column': 'timestamp',
+        'rollup': 'icmp',
+        'select': """
+            SELECT i.id, i.device_id, dev.mac_address, i.icmp_type, i.src_ip, i.dst_ip, i.timestamp
+            FROM icmp_events i
+            LEFT JOIN devices dev ON i.device_id = dev.id
+        """,
+        'columns': [('id', 'int64'), ('device_id', 'int64'), ('mac_address', 'string'),
+                    ('icmp_type', 'string'), ('src_ip', 'string'), ('dst_ip', 'string'),
+                    ('timestamp', 'timestamp')],
+    },
+    'port_scans': {
+        'alias': 'p',
+        'time_column': 'timestamp',
+        'rollup': 'port_scan',
+        'select': """
+            SELECT p.id, p.device_id, dev.mac_address, p.target_ip, p.target_port, p.scan_type, p.timestamp
+            FROM port_scans p
+            LEFT JOIN devices dev ON p.device_id = dev.id
+        """,
+        'columns': [('id', 'int64'), ('device_id', 'int64'), ('mac_address', 'string'),
+                    ('target_ip', 'string'), ('target_port', 'int64'), ('scan_type', 'string'),
+                    ('timestamp', 'timestamp')],
+    },
+}
+
+DUCKDB_TYPES = {'int64': 'BIGINT', 'string': 'VARCHAR', 'timestamp': 'TIMESTAMP'}
+
+def _schema(columns):
+    types = {'int64': pa.int64(), 'string': pa.string(), 'timestamp': pa.timestamp('s')}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+def _record_batch(rows, columns, schema):
+    arrays = []
+    for index, (name, kind) in enumerate(columns):
+        values = [row[index] for row in rows]
+        if kind == 'timestamp':
+            array = pc.strptime(pa.array(values, pa.string()), format='%Y-%m-%d %H:%M:%S', unit='s')
+        else:
+            array = pa.array(values, schema.field(name).type)
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def _day_path(table, day):
+    return ARCHIVE_DIR / table / f"{day}.parquet"
+
+def export_day(conn, table, day):
+    """Write one day of a table to Parquet. Returns rows written."""
+    spec = ARCHIVE_TABLES[table]
+    schema = _schema(spec['columns'])
+    start = f"{day} 00:00:00"
+    stop = (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d 00:00:00')
+    alias = spec['alias']
+
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        {spec['select']}
+        WHERE {alias}.{spec['time_column']} >= ? AND {alias}.{spec['time_column']} < ?
+        ORDER BY {alias}.id
+    """, (start, stop))
+
+    batches = []
+    while True:
+        rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not rows:
+            break
+        batches.append(_record_batch(rows, spec['columns'], schema))
+
+    data = pa.Table.from_batches(batches, schema=schema)
+    path = _day_path(table, day)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # A previous run may have written the file but not finished deleting rows
+    if path.exists():
+        existing = pq.read_table(path, schema=schema)
+        data = data.filter(pc.invert(pc.is_in(data['id'], value_set=existing['id'])))
+        data = pa.concat_tables([existing, data])
+
+    if data.num_rows == 0:
+        return 0
+
+    tmp = path.with_suffix('.tmp')
+    pq.write_table(data, tmp, compression=ARCHIVE_COMPRESSION)
+    os.replace(tmp, path)
+    return data.num_rows
+
+def archive_table(conn, table, days=None):
+    """Archive whole days older than `days` for one table, oldest first."""
+    spec = ARCHIVE_TABLES[table]
+    days = days or ARCHIVE_AFTER_DAYS
+    cursor = conn.cursor()
+
+    # Never archive (and delete) rows the rollups have not covered yet
+    cursor.execute("""
+        SELECT MIN(date('now', ?), date(COALESCE(
+            (SELECT hourly_through FROM rollup_state WHERE name = ?), '0000-01-01')))
+    """, (f'-{days} days', spec['rollup']))
+    cutoff_day = cursor.fetchone()[0]
+
+    cursor.execute(f"SELECT date(MIN({spec['time_column']})) FROM {table}")
+    day = cursor.fetchone()[0]
+
+    archived = {}
+    while day and day < cutoff_day:
+        archived[day] = export_day(conn, table, day)
+        next_day = (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+        # Everything before next_day is now archived
+        delete_in_chunks(conn, table, spec['time_column'], f"{next_day} 00:00:00")
+        cursor.execute("""
+            INSERT INTO archive_state (name, archived_through) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET archived_through = excluded.archived_through
+        """, (table, f"{next_day} 00:00:00"))
+        conn.commit()
+
+        cursor.execute(f"SELECT date(MIN({spec['time_column']})) FROM {table}")
+        day = cursor.fetchone()[0]
+
+    return archived
+
+def archiving_enabled():
+    """True if archiving is configured and pyarrow is installed."""
+    if ARCHIVE_AFTER_DAYS <= 0:
+        return False
+    if not PYARROW_AVAILABLE:
+        logger.warning("EDGEGUARD_ARCHIVE_AFTER_DAYS is set but pyarrow is not installed")
+        return False
+    return True
+
+def run_archive():
+    """Move aged partitions of every event table into Parquet files."""
+    if not archiving_enabled():
+        return {}
+
+    conn = get_connection()
+    summary = {}
+    try:
+        for table in ARCHIVE_TABLES:
+            started = time.time()
+            archived = archive_table(conn, table)
+            if archived:
+                summary[table] = {
+                    'days': len(archived),
+                    'rows': sum(archived.values()),
+                    'duration_ms': int((time.time() - started) * 1000)
+                }
+                logger.info(f"Archived {table}: {summary[table]}")
+    finally:
+        conn.close()
+
+    return summary
+
+def archive_files(table, since=None, until=None):
+    """Parquet files for a table whose day falls within [since, until]."""
+    files = sorted((ARCHIVE_DIR / table).glob('*.parquet'))
+    if since:
+        files = [f for f in files if f.stem >= since[:10]]
+    if until:
+        files = [f for f in files if f.stem <= until[:10]]
+    return files
+
+def query_archive(sql, params=None, since=None, until=None):
+    """Run SQL over archived tables with DuckDB.
+
+    Each archived table is exposed as a view of the same name over its
+    Parquet files, restricted to the days in [since, until] (YYYY-MM-DD).
+    Returns (column names, rows).
+    """
+    if not DUCKDB_AVAILABLE:
+        raise RuntimeError("duckdb is not installed")
+
+    db = duckdb.connect()
+    try:
+        for table, spec in ARCHIVE_TABLES.items():
+            files = archive_files(table, since, until)
+            if files:
+                paths = ', '.join(f"'{f}'" for f in files)
+                db.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet([{paths}])")
+            else:
+                columns = ', '.join(f"NULL::{DUCKDB_TYPES[kind]} AS {name}" for name, kind in spec['columns'])
+                db.execute(f"CREATE VIEW {table} AS SELECT {columns} WHERE false")
+        result = db.execute(sql, params or [])
+        columns = [d[0] for d in result.description]
+        return columns, result.fetchall()
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="EdgeGuard event archive")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_parser = sub.add_parser('run', help='archive aged partitions now')
+    run_parser.add_argument('--days', type=int, help='archive data older than this many days')
+    query_parser = sub.add_parser('query', help='run SQL over archived data')
+    query_parser.add_argument('sql')
+    query_parser.add_argument('--since', help='first day to scan (YYYY-MM-DD)')
+    query_parser.add_argument('--until', help='last day to scan (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'run':
+        if args.days:
+            ARCHIVE_AFTER_DAYS = args.days
+        print(run_archive())
+    else:
+        columns, rows = query_archive(args.sql, since=args.since, until=args.until)
+        print('\t'.join(columns))
+        for row in rows:
+            print('\t'.join('' if v is None else str(v) for v in row))
+        sys.exit(0)
@@ -1,14 +1,35 @@
 """Shared database schema and connection for EdgeGuard backend."""
+import os
 import sqlite3
 from pathlib import Path
 from datetime import datetime
 from threading import Lock
-from queue import Queue
+from queue import Queue, LifoQueue, Empty, Full
 import threading
 
-DB_PATH = Path("/var/lib/edgeguard/edgeguard.db")
+DB_PATH = Path(os.getenv('EDGEGUARD_DB_PATH', '/var/lib/edgeguard/edgeguard.db'))
 db_lock = Lock()
 
+# Read pool tuning for API queries
+READ_POOL_SIZE = int(os.getenv('EDGEGUARD_READ_POOL_SIZE', '8'))
+READ_MMAP_SIZE = int(os.getenv('EDGEGUARD_READ_MMAP_SIZE', str(256 * 1024 * 1024)))
+READ_CACHE_KIB = int(os.getenv('EDGEGUARD_READ_CACHE_KIB', str(64 * 1024)))
+
+# Width of a connections row: a flow gets one row per bucket. Connections
+# are rolled up hourly by bucket, so a bucket must fit evenly in an hour.
+CONNECTION_BUCKET_SECONDS = int(os.getenv('EDGEGUARD_CONNECTION_BUCKET_SECONDS', '3600'))
+if CONNECTION_BUCKET_SECONDS <= 0 or 3600 % CONNECTION_BUCKET_SECONDS:
+    raise ValueError(f"EDGEGUARD_CONNECTION_BUCKET_SECONDS must divide 3600, got {CONNECTION_BUCKET_SECONDS}")
+
+# Per-device traffic time series: resolution (seconds) -> (table, time column).
+# `traffic` holds per-minute samples; the others are downsampled as samples arrive.
+TRAFFIC_RESOLUTIONS = {
+    60: ('traffic', 'timestamp'),
+    300: ('traffic_5m', 'bucket'),
+    3600: ('traffic_hourly', 'bucket'),
+    86400: ('traffic_daily', 'bucket'),
+}
+
 # Write queue for serializing database operations
 write_queue = Queue()
 _writer_thread = None
@@ -48,12 +69,28 @@ def init_db():
     
     conn = sqlite3.connect(DB_PATH)
     
+    # Let maintenance return free pages in steps (only applies to new databases;
+    # see `python3 -m shared.maintenance enable-incremental-vacuum`)
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    
     # Enable WAL mode for better concurrency
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA busy_timeout=5000")
     
     cursor = conn.cursor()
     
+    # Move tables still storing raw strings aside; rows are copied back below
+    legacy_tables = _rename_legacy_tables(cursor)
+    
+    # Dictionary tables for long, highly repeated strings
+    for table in ('domains', 'hosts', 'urls', 'user_agents'):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL
+            )
+        """)
+    
     # Devices table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS devices (
@@ -81,7 +118,7 @@ def init_db():
         )
     """)
     
-    # Traffic table
+    # Traffic table: per-device per-minute samples
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS traffic (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -127,23 +164,25 @@ def init_db():
         CREATE TABLE IF NOT EXISTS dns_queries (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             device_id INTEGER,
-            domain TEXT NOT NULL,
+            domain_id INTEGER NOT NULL,
             query_type TEXT,
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (device_id) REFERENCES devices(id)
+            FOREIGN KEY (device_id) REFERENCES devices(id),
+            FOREIGN KEY (domain_id) REFERENCES domains(id)
         )
     """)
     
-    # Connections table
+    # Connections table: one row per flow per time bucket
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS connections (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            device_id INTEGER,
-            protocol TEXT,
+            device_id INTEGER NOT NULL,
+            protocol TEXT NOT NULL,
             src_ip TEXT,
             src_port INTEGER,
-            dst_ip TEXT,
-            dst_port INTEGER,
+            dst_ip TEXT NOT NULL,
+            dst_port INTEGER NOT NULL,
+            bucket TEXT NOT NULL,
             dst_country TEXT,
             bytes_sent INTEGER DEFAULT 0,
             bytes_received INTEGER DEFAULT 0,
@@ -152,6 +191,7 @@ def init_db():
             session_duration INTEGER DEFAULT 0,
             first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (device_id, protocol, dst_ip, dst_port, bucket),
             FOREIGN KEY (device_id) REFERENCES devices(id)
         )
     """)
@@ -162,14 +202,17 @@ def init_db():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             device_id INTEGER,
             method TEXT,
-            host TEXT,
+            host_id INTEGER,
             path TEXT,
-            full_url TEXT,
-            user_agent TEXT,
+            url_id INTEGER,
+            user_agent_id INTEGER,
             referer TEXT,
             status_code INTEGER,
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (device_id) REFERENCES devices(id)
+            FOREIGN KEY (device_id) REFERENCES devices(id),
+            FOREIGN KEY (host_id) REFERENCES hosts(id),
+            FOREIGN KEY (url_id) REFERENCES urls(id),
+            FOREIGN KEY (user_agent_id) REFERENCES user_agents(id)
         )
     """)
     
@@ -178,14 +221,15 @@ def init_db():
         CREATE TABLE IF NOT EXISTS tls_metadata (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             device_id INTEGER,
-            server_name TEXT,
+            server_name_id INTEGER,
             tls_version TEXT,
             cipher_suite TEXT,
             cert_issuer TEXT,
             cert_subject TEXT,
             cert_expiry TEXT,
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (device_id) REFERENCES devices(id)
+            FOREIGN KEY (device_id) REFERENCES devices(id),
+            FOREIGN KEY (server_name_id) REFERENCES domains(id)
         )
     """)
     
@@ -264,12 +308,13 @@ def init_db():
         CREATE TABLE IF NOT EXISTS visited_sites (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             device_id INTEGER,
-            domain TEXT NOT NULL,
+            domain_id INTEGER NOT NULL,
             first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             visit_count INTEGER DEFAULT 1,
             FOREIGN KEY (device_id) REFERENCES devices(id),
-            UNIQUE(device_id, domain)
+            FOREIGN KEY (domain_id) REFERENCES domains(id),
+            UNIQUE(device_id, domain_id)
         )
     """)
     
@@ -287,12 +332,609 @@ def init_db():
         )
     """)
     
+    # Copy rows from legacy string tables into the dictionary-encoded schema
+    _copy_legacy_tables(cursor, legacy_tables)
+    
+    # Time indexes used by rollups, retention and time-range queries
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_dns_queries_timestamp ON dns_queries(timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_http_metadata_timestamp ON http_metadata(timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tls_metadata_timestamp ON tls_metadata(timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_icmp_events_timestamp ON icmp_events(timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_port_scans_timestamp ON port_scans(timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_connections_last_seen ON connections(last_seen)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_connections_bucket ON connections(bucket)")
+    
+    # Per-device and newest-first indexes for keyset-paginated list endpoints
+    # (rowid tables: every index ends in id, so (time, id) order comes free)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_dns_queries_device ON dns_queries(device_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_http_metadata_device ON http_metadata(device_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_connections_device ON connections(device_id, last_seen)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_visited_sites_last_seen ON visited_sites(last_seen)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_visited_sites_device ON visited_sites(device_id, last_seen)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_threats_detected_at ON threats(detected_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_threats_device ON threats(device_id, detected_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices(last_seen)")
+    
+    # Lookup indexes used by /search to fetch events for matched strings
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_dns_queries_domain ON dns_queries(domain_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_http_metadata_host ON http_metadata(host_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_http_metadata_url ON http_metadata(url_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_http_metadata_user_agent ON http_metadata(user_agent_id, timestamp)")
+    
+    # Downsampled traffic series, one row per device per bucket
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_traffic_device_time ON traffic(device_id, timestamp)")
+    for table, _ in list(TRAFFIC_RESOLUTIONS.values())[1:]:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket TEXT NOT NULL,
+                device_id INTEGER NOT NULL,
+                bytes_sent INTEGER DEFAULT 0,
+                bytes_received INTEGER DEFAULT 0,
+                packets_sent INTEGER DEFAULT 0,
+                packets_received INTEGER DEFAULT 0,
+                PRIMARY KEY (device_id, bucket)
+            )
+        """)
+    
+    # Hourly/daily rollups of raw event tables (see shared/retention.py)
+    for resolution in ('hourly', 'daily'):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS dns_{resolution} (
+                bucket TEXT NOT NULL,
+                device_id INTEGER NOT NULL,
+                domain_id INTEGER NOT NULL,
+                query_count INTEGER DEFAULT 0,
+                PRIMARY KEY (bucket, device_id, domain_id)
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS connection_{resolution} (
+                bucket TEXT NOT NULL,
+                device_id INTEGER NOT NULL,
+                protocol TEXT NOT NULL,
+                dst_ip TEXT NOT NULL,
+                dst_port INTEGER NOT NULL,
+                flow_count INTEGER DEFAULT 0,
+                bytes_sent INTEGER DEFAULT 0,
+                bytes_received INTEGER DEFAULT 0,
+                packets_sent INTEGER DEFAULT 0,
+                packets_received INTEGER DEFAULT 0,
+                PRIMARY KEY (bucket, device_id, protocol, dst_ip, dst_port)
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS http_{resolution} (
+                bucket TEXT NOT NULL,
+                device_id INTEGER NOT NULL,
+                host_id INTEGER NOT NULL,
+                request_count INTEGER DEFAULT 0,
+                PRIMARY KEY (bucket, device_id, host_id)
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS tls_{resolution} (
+                bucket TEXT NOT NULL,
+                device_id INTEGER NOT NULL,
+                server_name_id INTEGER NOT NULL,
+                tls_version TEXT NOT NULL,
+                handshake_count INTEGER DEFAULT 0,
+                PRIMARY KEY (bucket, device_id, server_name_id, tls_version)
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS icmp_{resolution} (
+                bucket TEXT NOT NULL,
+                device_id INTEGER NOT NULL,
+                icmp_type TEXT NOT NULL,
+                event_count INTEGER DEFAULT 0,
+                PRIMARY KEY (bucket, device_id, icmp_type)
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS port_scan_{resolution} (
+                bucket TEXT NOT NULL,
+                device_id INTEGER NOT NULL,
+                target_ip TEXT NOT NULL,
+                probe_count INTEGER DEFAULT 0,
+                PRIMARY KEY (bucket, device_id, target_ip)
+            )
+        """)
+    
+    # Rollup progress: last hour/day that has been fully aggregated
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            hourly_through TEXT,
+            daily_through TEXT
+        )
+    """)
+    
+    # Archive progress: raw rows before archived_through live in Parquet files
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archive_state (
+            name TEXT PRIMARY KEY,
+            archived_through TEXT
+        )
+    """)
+    
+    # Content hash of the signatures the stored identifications came from
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS identification_state (
+            name TEXT PRIMARY KEY,
+            signatures_digest TEXT
+        )
+    """)
+    
+    # Fingerbank answers per normalized (OUI, DHCP fingerprint, user agent,
+    # hostname pattern); result is NULL for "no match"
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fingerbank_cache (
+            cache_key TEXT PRIMARY KEY,
+            request TEXT NOT NULL,
+            result TEXT,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL
+        )
+    """)
+    
+    # Maintenance task history (backups, checkpoints, vacuum)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task TEXT NOT NULL,
+            started_at TIMESTAMP NOT NULL,
+            duration_ms INTEGER,
+            status TEXT,
+            details TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_maintenance_runs_task
+        ON maintenance_runs(task, started_at)
+    """)
+    
+    # Rollups still keyed by raw strings are rebuilt with dictionary ids
+    _copy_legacy_tables(cursor, legacy_tables)
+    
+    # Materialized counters for top-N endpoints, maintained by the writer
+    _create_counter_tables(cursor)
+    
+    # Trigram full-text indexes over the dictionary tables
+    _create_search_indexes(cursor)
+    
+    # Persisted signature identification, recomputed when its inputs change
+    _create_identification_columns(cursor)
+    
+    # Change counters that invalidate cached API responses
+    _create_change_counters(cursor)
+    
     conn.commit()
     conn.close()
 
-def get_connection():
+# Tables with a legacy layout: table -> (legacy column or predicate, intern SQL, copy SQL).
+# Legacy tables are renamed to `<table>_legacy`, recreated, then copied back.
+LEGACY_MIGRATIONS = {
+    'dns_queries': ('domain', [
+        "INSERT OR IGNORE INTO domains (name) SELECT DISTINCT domain FROM dns_queries_legacy",
+    ], """
+        INSERT INTO dns_queries (id, device_id, domain_id, query_type, timestamp)
+        SELECT l.id, l.device_id, d.id, l.query_type, l.timestamp
+        FROM dns_queries_legacy l JOIN domains d ON d.name = l.domain
+    """),
+    'visited_sites': ('domain', [
+        "INSERT OR IGNORE INTO domains (name) SELECT DISTINCT domain FROM visited_sites_legacy",
+    ], """
+        INSERT INTO visited_sites (id, device_id, domain_id, first_seen, last_seen, visit_count)
+        SELECT l.id, l.device_id, d.id, l.first_seen, l.last_seen, l.visit_count
+        FROM visited_sites_legacy l JOIN domains d ON d.name = l.domain
+    """),
+    'http_metadata': ('host', [
+        "INSERT OR IGNORE INTO hosts (name) SELECT DISTINCT host FROM http_metadata_legacy WHERE host IS NOT NULL",
+        "INSERT OR IGNORE INTO urls (name) SELECT DISTINCT full_url FROM http_metadata_legacy WHERE full_url IS NOT NULL",
+        "INSERT OR IGNORE INTO user_agents (name) SELECT DISTINCT user_agent FROM http_metadata_legacy WHERE user_agent IS NOT NULL",
+    ], """
+        INSERT INTO http_metadata (id, device_id, method, host_id, path, url_id, user_agent_id, referer, status_code, timestamp)
+        SELECT l.id, l.device_id, l.method, h.id, l.path, u.id, ua.id, l.referer, l.status_code, l.timestamp
+        FROM http_metadata_legacy l
+        LEFT JOIN hosts h ON h.name = l.host
+        LEFT JOIN urls u ON u.name = l.full_url
+        LEFT JOIN user_agents ua ON ua.name = l.user_agent
+    """),
+    'tls_metadata': ('server_name', [
+        "INSERT OR IGNORE INTO domains (name) SELECT DISTINCT server_name FROM tls_metadata_legacy WHERE server_name IS NOT NULL",
+    ], """
+        INSERT INTO tls_metadata (id, device_id, server_name_id, tls_version, cipher_suite, cert_issuer, cert_subject, cert_expiry, timestamp)
+        SELECT l.id, l.device_id, d.id, l.tls_version, l.cipher_suite, l.cert_issuer, l.cert_subject, l.cert_expiry, l.timestamp
+        FROM tls_metadata_legacy l LEFT JOIN domains d ON d.name = l.server_name
+    """),
+}
+
+# Connections without a flow bucket had no unique key; duplicates are merged
+LEGACY_MIGRATIONS['connections'] = (lambda columns: 'bucket' not in columns, [], f"""
+    INSERT INTO connections (device_id, protocol, src_ip, src_port, dst_ip, dst_port, bucket, dst_country,
+                             bytes_sent, bytes_received, packets_sent, packets_received, session_duration,
+                             first_seen, last_seen)
+    SELECT device_id, COALESCE(protocol, ''), MIN(src_ip), MIN(src_port), COALESCE(dst_ip, ''),
+           COALESCE(dst_port, 0),
+           datetime((CAST(strftime('%s', last_seen) AS INTEGER) / {CONNECTION_BUCKET_SECONDS})
+                    * {CONNECTION_BUCKET_SECONDS}, 'unixepoch') AS flow_bucket,
+           MAX(dst_country), SUM(bytes_sent), SUM(bytes_received), SUM(packets_sent),
+           SUM(packets_received), SUM(session_duration), MIN(first_seen), MAX(last_seen)
+    FROM connections_legacy
+    WHERE device_id IS NOT NULL
+    GROUP BY device_id, COALESCE(protocol, ''), COALESCE(dst_ip, ''), COALESCE(dst_port, 0), flow_bucket
+""")
+
+for _resolution in ('hourly', 'daily'):
+    LEGACY_MIGRATIONS[f'dns_{_resolution}'] = ('domain', [
+        f"INSERT OR IGNORE INTO domains (name) SELECT DISTINCT domain FROM dns_{_resolution}_legacy",
+    ], f"""
+        INSERT INTO dns_{_resolution} (bucket, device_id, domain_id, query_count)
+        SELECT l.bucket, l.device_id, d.id, l.query_count
+        FROM dns_{_resolution}_legacy l JOIN domains d ON d.name = l.domain
+    """)
+    LEGACY_MIGRATIONS[f'http_{_resolution}'] = ('host', [
+        f"INSERT OR IGNORE INTO hosts (name) SELECT DISTINCT host FROM http_{_resolution}_legacy WHERE host != ''",
+    ], f"""
+        INSERT INTO http_{_resolution} (bucket, device_id, host_id, request_count)
+        SELECT l.bucket, l.device_id, COALESCE(h.id, 0), l.request_count
+        FROM http_{_resolution}_legacy l LEFT JOIN hosts h ON h.name = l.host
+    """)
+    LEGACY_MIGRATIONS[f'tls_{_resolution}'] = ('server_name', [
+        f"INSERT OR IGNORE INTO domains (name) SELECT DISTINCT server_name FROM tls_{_resolution}_legacy WHERE server_name != ''",
+    ], f"""
+        INSERT INTO tls_{_resolution} (bucket, device_id, server_name_id, tls_version, handshake_count)
+        SELECT l.bucket, l.device_id, COALESCE(d.id, 0), l.tls_version, l.handshake_count
+        FROM tls_{_resolution}_legacy l LEFT JOIN domains d ON d.name = l.server_name
+    """)
+
+def _table_columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+def _rename_legacy_tables(cursor):
+    """Rename tables that still use a legacy layout. Returns their names.
+
+    A migration is detected by a legacy column name, or by a predicate over
+    the table's current columns.
+    """
+    renamed = []
+    for table, (legacy, _, _) in LEGACY_MIGRATIONS.items():
+        columns = _table_columns(cursor, table)
+        if not columns:
+            continue
+        if not (legacy(columns) if callable(legacy) else legacy in columns):
+            continue
+        
+        # Indexes follow a renamed table; drop them so they get recreated
+        cursor.execute(f"PRAGMA index_list({table})")
+        for index in cursor.fetchall():
+            if index[3] == 'c':
+                cursor.execute(f"DROP INDEX {index[1]}")
+        
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+        renamed.append(table)
+    
+    # Counters are rebuilt from the migrated raw tables
+    if renamed:
+        for table in COUNTER_TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    
+    return renamed
+
+def _copy_legacy_tables(cursor, legacy_tables):
+    """Intern strings and copy rows from renamed legacy tables that now exist again."""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    existing = {row[0] for row in cursor.fetchall()}
+    
+    for table in list(legacy_tables):
+        if table not in existing:
+            continue
+        _, intern_sql, copy_sql = LEGACY_MIGRATIONS[table]
+        for sql in intern_sql:
+            cursor.execute(sql)
+        cursor.execute(copy_sql)
+        cursor.execute(f"DROP TABLE {table}_legacy")
+        legacy_tables.remove(table)
+
+# Counter table -> (DDL, backfill query from raw tables)
+COUNTER_TABLES = {
+    'domain_counts': ("""
+        CREATE TABLE domain_counts (
+            domain_id INTEGER PRIMARY KEY,
+            count INTEGER DEFAULT 0,
+            last_seen TIMESTAMP
+        )
+    """, """
+        INSERT INTO domain_counts (domain_id, count, last_seen)
+        SELECT domain_id, COUNT(*), MAX(timestamp) FROM dns_queries GROUP BY domain_id
+    """),
+    'destination_counts': ("""
+        CREATE TABLE destination_counts (
+            dst_ip TEXT NOT NULL,
+            dst_port INTEGER NOT NULL,
+            protocol TEXT NOT NULL,
+            count INTEGER DEFAULT 0,
+            bytes INTEGER DEFAULT 0,
+            last_seen TIMESTAMP,
+            PRIMARY KEY (dst_ip, dst_port, protocol)
+        )
+    """, """
+        INSERT INTO destination_counts (dst_ip, dst_port, protocol, count, bytes, last_seen)
+        SELECT dst_ip, dst_port, protocol, COUNT(*), SUM(bytes_sent), MAX(last_seen)
+        FROM connections
+        WHERE dst_ip IS NOT NULL AND dst_port IS NOT NULL AND protocol IS NOT NULL
+        GROUP BY dst_ip, dst_port, protocol
+    """),
+    'http_host_counts': ("""
+        CREATE TABLE http_host_counts (
+            host_id INTEGER PRIMARY KEY,
+            count INTEGER DEFAULT 0,
+            last_seen TIMESTAMP
+        )
+    """, """
+        INSERT INTO http_host_counts (host_id, count, last_seen)
+        SELECT host_id, COUNT(*), MAX(timestamp) FROM http_metadata
+        WHERE host_id IS NOT NULL
+        GROUP BY host_id
+    """),
+    'url_counts': ("""
+        CREATE TABLE url_counts (
+            url_id INTEGER PRIMARY KEY,
+            count INTEGER DEFAULT 0,
+            last_seen TIMESTAMP
+        )
+    """, """
+        INSERT INTO url_counts (url_id, count, last_seen)
+        SELECT url_id, COUNT(*), MAX(timestamp) FROM http_metadata
+        WHERE url_id IS NOT NULL
+        GROUP BY url_id
+    """),
+    'device_domains': ("""
+        CREATE TABLE device_domains (
+            device_id INTEGER NOT NULL,
+            domain_id INTEGER NOT NULL,
+            query_count INTEGER DEFAULT 0,
+            last_seen TIMESTAMP,
+            PRIMARY KEY (device_id, domain_id)
+        ) WITHOUT ROWID
+    """, """
+        INSERT INTO device_domains (device_id, domain_id, query_count, last_seen)
+        SELECT device_id, domain_id, COUNT(*), MAX(timestamp) FROM dns_queries
+        WHERE device_id IS NOT NULL AND domain_id IS NOT NULL
+        GROUP BY device_id, domain_id
+    """),
+    'site_counts': ("""
+        CREATE TABLE site_counts (
+            domain_id INTEGER PRIMARY KEY,
+            visits INTEGER DEFAULT 0,
+            last_seen TIMESTAMP
+        )
+    """, """
+        INSERT INTO site_counts (domain_id, visits, last_seen)
+        SELECT domain_id, SUM(visit_count), MAX(last_seen) FROM visited_sites GROUP BY domain_id
+    """),
+}
+
+def _create_counter_tables(cursor):
+    """Create counter tables, backfilling from raw events the first time."""
+    for table, (ddl, backfill) in COUNTER_TABLES.items():
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        if cursor.fetchone():
+            continue
+        cursor.execute(ddl)
+        cursor.execute(backfill)
+    
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_domain_counts_count ON domain_counts(count DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_destination_counts_count ON destination_counts(count DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_http_host_counts_count ON http_host_counts(count DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_site_counts_visits ON site_counts(visits DESC)")
+    
+    # Connections are written by batched upserts that cannot tell new flow rows
+    # from updated ones, so their counters are maintained by triggers
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS connections_count_insert AFTER INSERT ON connections BEGIN
+            INSERT INTO destination_counts (dst_ip, dst_port, protocol, count, bytes, last_seen)
+            VALUES (new.dst_ip, new.dst_port, new.protocol, 1, new.bytes_sent, new.last_seen)
+            ON CONFLICT(dst_ip, dst_port, protocol) DO UPDATE SET
+                count = count + 1,
+                bytes = bytes + excluded.bytes,
+                last_seen = MAX(last_seen, excluded.last_seen);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS connections_count_update AFTER UPDATE OF bytes_sent ON connections BEGIN
+            UPDATE destination_counts
+            SET bytes = bytes + new.bytes_sent - old.bytes_sent,
+                last_seen = MAX(last_seen, new.last_seen)
+            WHERE dst_ip = new.dst_ip AND dst_port = new.dst_port AND protocol = new.protocol;
+        END
+    """)
+
+# Signature identification stored on devices; ident_dirty counts input
+# changes since the last identification (0 = up to date)
+IDENTIFICATION_COLUMNS = {
+    'ident_signature': 'TEXT',
+    'ident_type': 'TEXT',
+    'ident_category': 'TEXT',
+    'ident_icon': 'TEXT',
+    'ident_confidence': 'REAL',
+    'ident_dirty': 'INTEGER DEFAULT 1',
+    'identified_at': 'TIMESTAMP',
+}
+
+def _create_identification_columns(cursor):
+    """Add identification columns and the triggers that mark devices dirty."""
+    columns = _table_columns(cursor, 'devices')
+    for column, definition in IDENTIFICATION_COLUMNS.items():
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE devices ADD COLUMN {column} {definition}")
+    
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_ident_dirty ON devices(id) WHERE ident_dirty > 0")
+    
+    # Inputs to identify_device: vendor, hostname, open ports and queried domains
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS devices_ident_inputs
+        AFTER UPDATE OF vendor, hostname, open_ports ON devices
+        WHEN old.vendor IS NOT new.vendor OR old.hostname IS NOT new.hostname
+          OR old.open_ports IS NOT new.open_ports
+        BEGIN
+            UPDATE devices SET ident_dirty = ident_dirty + 1 WHERE id = new.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS device_domains_ident AFTER INSERT ON device_domains BEGIN
+            UPDATE devices SET ident_dirty = ident_dirty + 1 WHERE id = new.device_id;
+        END
+    """)
+
+# Change counters for the API response cache: table -> (counter, columns).
+# A counter is bumped when a row is inserted or deleted, or when one of the
+# listed columns changes. Counts, totals and timestamps are not listed: they
+# move on every packet, and cached responses expire after a TTL instead.
+CHANGE_COUNTERS = {
+    'devices': ('devices', ('ip_address', 'hostname', 'vendor', 'device_type', 'device_name', 'os_name',
+                            'open_ports', 'is_active', 'ident_signature', 'ident_category')),
+    'threats': ('threats', ('resolved', 'severity')),
+    'device_domains': ('device_domains', ()),
+    'domain_counts': ('websites', ()),
+    'visited_sites': ('websites', ()),
+    'url_counts': ('websites', ()),
+}
+
+def _create_change_counters(cursor):
+    """Create the change_counters table and the triggers that bump it."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_counters (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for table, (counter, columns) in CHANGE_COUNTERS.items():
+        cursor.execute("INSERT OR IGNORE INTO change_counters (name) VALUES (?)", (counter,))
+        bump = f"UPDATE change_counters SET version = version + 1 WHERE name = '{counter}';"
+        for event in ('INSERT', 'DELETE'):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_change_{event.lower()} AFTER {event} ON {table} BEGIN
+                    {bump}
+                END
+            """)
+        if columns:
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_change_update
+                AFTER UPDATE OF {', '.join(columns)} ON {table}
+                WHEN {' OR '.join(f"old.{c} IS NOT new.{c}" for c in columns)}
+                BEGIN
+                    {bump}
+                END
+            """)
+
+# Dictionary tables with a `<table>_fts` trigram index for substring search
+SEARCH_TABLES = ('domains', 'hosts', 'urls', 'user_agents')
+
+def _create_search_indexes(cursor):
+    """Create FTS5 trigram indexes kept in sync by insert triggers.
+
+    Dictionary rows are never updated, so an insert trigger is enough. Skipped
+    if this SQLite build lacks FTS5 or the trigram tokenizer (3.34+); /search
+    then falls back to LIKE.
+    """
+    for table in SEARCH_TABLES:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (f"{table}_fts",))
+        if cursor.fetchone():
+            continue
+        try:
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE {table}_fts USING fts5(
+                    name, content='{table}', content_rowid='id', tokenize='trigram'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            import logging
+            logging.warning(f"Full-text search unavailable ({e}); /search will use LIKE")
+            return
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {table}_fts (rowid, name) VALUES (new.id, new.name);
+            END
+        """)
+        cursor.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+def get_connection(timeout=30.0):
     """Get database connection with lock."""
-    conn = sqlite3.connect(DB_PATH, timeout=30.0, check_same_thread=False)
+    conn = sqlite3.connect(DB_PATH, timeout=timeout, check_same_thread=False)
     conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA busy_timeout=30000")
+    conn.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
     return conn
+
+class PooledConnection:
+    """Read connection handle; close() returns it to the pool."""
+    
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+class ReadConnectionPool:
+    """Pool of read-only connections tuned for long API queries.
+    
+    Connections are opened with mode=ro and query_only so API reads can never
+    take the write lock, and carry a large page cache and mmap window. At most
+    `size` idle connections are kept; bursts beyond that open extra
+    connections which are closed on release.
+    """
+    
+    def __init__(self, size=READ_POOL_SIZE):
+        self.size = size
+        self.idle = LifoQueue(maxsize=size)
+    
+    def _open(self):
+        uri = f"{Path(DB_PATH).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=30.0, check_same_thread=False)
+        conn.execute("PRAGMA query_only=1")
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.execute(f"PRAGMA mmap_size={READ_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size=-{READ_CACHE_KIB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+    
+    def acquire(self):
+        try:
+            conn = self.idle.get_nowait()
+        except Empty:
+            conn = self._open()
+        return PooledConnection(self, conn)
+    
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self.idle.put_nowait(conn)
+        except Full:
+            conn.close()
+    
+    def clear(self):
+        """Close all idle connections (e.g. after the database file is replaced)."""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except Empty:
+                break
+
+read_pool = ReadConnectionPool()
+
+def get_read_connection():
+    """Get a pooled read-only connection for API queries. close() releases it."""
+    return read_pool.acquire()
+
+def is_busy_error(error):
+    """True if an OperationalError means the database is locked/busy."""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
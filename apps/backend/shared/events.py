@@ -0,0 +1,150 @@
+"""Live event bus between the monitor and the API.
+
+Monitor callbacks publish events (EVENT_KINDS) to an EventBus. publish()
+encodes an event once, as a JSON line, and queues it for every subscriber
+without blocking; a subscriber whose bounded queue is full is dropped
+rather than slowing capture. EventSocketServer subscribes one queue per
+connection on a local Unix socket and writes the lines to it, which is how
+the API process (api/events.py) receives them. Nothing is stored: an
+event published while nobody is subscribed is discarded.
+"""
+import grp
+import json
+import logging
+import os
+import socket
+import time
+from pathlib import Path
+from queue import Queue, Empty, Full
+from threading import Lock, Thread
+
+logger = logging.getLogger(__name__)
+
+EVENT_SOCKET = Path(os.getenv('EDGEGUARD_EVENT_SOCKET', '/var/lib/edgeguard/events.sock'))
+
+# Group allowed to connect (the API's service user); the socket is mode 0660
+EVENT_SOCKET_GROUP = os.getenv('EDGEGUARD_EVENT_SOCKET_GROUP', 'edgeguard')
+
+# Events buffered per subscriber before it is considered too slow and dropped
+SUBSCRIBER_BUFFER = int(os.getenv('EDGEGUARD_EVENT_BUFFER', '4096'))
+
+# Seconds a socket write may block before the reader is disconnected
+SEND_TIMEOUT = 5.0
+
+# Lines coalesced into one socket write
+SEND_BATCH = 256
+
+# kind -> fields besides kind and time; every event has ip
+EVENT_KINDS = {
+    'device': ('ip', 'mac', 'hostname'),
+    'dns': ('ip', 'domain', 'query_type'),
+    'sni': ('ip', 'domain'),
+    'port_scan': ('ip', 'target_ip', 'ports'),
+}
+
+class Subscription:
+    """Bounded queue of encoded events for one subscriber."""
+
+    def __init__(self, bus, maxsize):
+        self.bus = bus
+        self.queue = Queue(maxsize)
+        self.dropped = False
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+class EventBus:
+    """In-process publish/subscribe of monitor events."""
+
+    def __init__(self):
+        # Replaced, never mutated, so publish() can iterate without the lock
+        self.subscribers = frozenset()
+        self.lock = Lock()
+        self.dropped = 0
+
+    def subscribe(self, maxsize=SUBSCRIBER_BUFFER):
+        subscription = Subscription(self, maxsize)
+        with self.lock:
+            self.subscribers = self.subscribers | {subscription}
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers = self.subscribers - {subscription}
+
+    def publish(self, kind, **fields):
+        """Queue an event for every subscriber; never blocks."""
+        subscribers = self.subscribers
+        if not subscribers:
+            return
+
+        line = json.dumps({'kind': kind, 'time': time.time(), **fields}, separators=(',', ':'), default=str)
+        line = (line + '\n').encode()
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(line)
+            except Full:
+                subscription.dropped = True
+                self.dropped += 1
+                self.unsubscribe(subscription)
+
+class EventSocketServer:
+    """Serves the bus's events as JSON lines on a Unix socket."""
+
+    def __init__(self, bus, path=EVENT_SOCKET):
+        self.bus = bus
+        self.path = Path(path)
+        self.running = False
+
+    def start(self):
+        """Accept readers until stop() (blocking)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.unlink(missing_ok=True)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(self.path))
+        os.chmod(self.path, 0o660)
+        try:
+            os.chown(self.path, -1, grp.getgrnam(EVENT_SOCKET_GROUP).gr_gid)
+        except (KeyError, OSError) as e:
+            logger.warning(f"Event socket {self.path} not shared with group {EVENT_SOCKET_GROUP}: {e}")
+        server.listen()
+        server.settimeout(1.0)
+        logger.info(f"Serving live events on {self.path}")
+
+        self.running = True
+        try:
+            while self.running:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                Thread(target=self._serve, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            self.path.unlink(missing_ok=True)
+
+    def stop(self):
+        self.running = False
+
+    def _serve(self, conn):
+        subscription = self.bus.subscribe()
+        conn.settimeout(SEND_TIMEOUT)
+        try:
+            while self.running and not subscription.dropped:
+                try:
+                    lines = [subscription.queue.get(timeout=1.0)]
+                except Empty:
+                    continue
+                while len(lines) < SEND_BATCH:
+                    try:
+                        lines.append(subscription.queue.get_nowait())
+                    except Empty:
+                        break
+                conn.sendall(b''.join(lines))
+            if subscription.dropped:
+                logger.warning("Event reader too slow, disconnected")
+        except OSError:
+            pass  # Reader went away
+        finally:
+            subscription.close()
+            conn.close()
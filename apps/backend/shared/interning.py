@@ -0,0 +1,55 @@
+"""Dictionary encoding for long, repeated strings (domains, hosts, URLs, user agents)."""
+import os
+from collections import OrderedDict
+from threading import Lock
+
+CACHE_SIZE = int(os.getenv('EDGEGUARD_INTERN_CACHE_SIZE', '50000'))
+
+class StringDictionary:
+    """Bounded in-process string -> id cache in front of a lookup table."""
+
+    def __init__(self, table, max_size=CACHE_SIZE):
+        self.table = table
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.lock = Lock()
+
+    def get_id(self, cursor, value):
+        """Return the id for value, inserting it into the lookup table if new.
+
+        Runs inside the caller's transaction. Ids are only cached once they are
+        read back by a later lookup, so a rolled-back insert never leaves a
+        stale id in the cache.
+        """
+        if value is None:
+            return None
+
+        with self.lock:
+            value_id = self.cache.get(value)
+            if value_id is not None:
+                self.cache.move_to_end(value)
+                return value_id
+
+        cursor.execute(f"INSERT OR IGNORE INTO {self.table} (name) VALUES (?)", (value,))
+        if cursor.rowcount == 1:
+            return cursor.lastrowid
+
+        cursor.execute(f"SELECT id FROM {self.table} WHERE name = ?", (value,))
+        value_id = cursor.fetchone()[0]
+
+        with self.lock:
+            self.cache[value] = value_id
+            if len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+
+        return value_id
+
+    def clear(self):
+        """Drop all cached ids."""
+        with self.lock:
+            self.cache.clear()
+
+domains = StringDictionary('domains')
+hosts = StringDictionary('hosts')
+urls = StringDictionary('urls')
+user_agents = StringDictionary('user_agents')
@@ -0,0 +1,205 @@
+"""Durable spill-to-disk journal for events the database cannot accept right now."""
+import json
+import logging
+import os
+import struct
+import zlib
+from pathlib import Path
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = Path(os.getenv('EDGEGUARD_JOURNAL_DIR', '/var/lib/edgeguard/journal'))
+SEGMENT_BYTES = int(os.getenv('EDGEGUARD_JOURNAL_SEGMENT_BYTES', str(4 * 1024 * 1024)))
+MAX_JOURNAL_BYTES = int(os.getenv('EDGEGUARD_JOURNAL_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Record layout: <payload length: u32><crc32 of payload: u32><payload: JSON>
+RECORD_HEADER = struct.Struct('<II')
+SEGMENT_SUFFIX = '.journal'
+POSITION_FILE = 'replay.pos'
+
+class EventJournal:
+    """Append-only, length-prefixed event journal split into fixed-size segments.
+
+    Writers append to the active segment. The replayer only reads sealed
+    segments and records its position after every batch, so a restart resumes
+    where it left off. When the disk budget is exceeded the oldest sealed
+    segment is discarded.
+    """
+
+    def __init__(self, directory=JOURNAL_DIR, segment_bytes=SEGMENT_BYTES, max_bytes=MAX_JOURNAL_BYTES):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.dropped = 0
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segments = sorted(self.directory.glob(f'*{SEGMENT_SUFFIX}'))
+        self.total_bytes = sum(path.stat().st_size for path in self.segments)
+        self.active = None
+        self.active_path = None
+
+    def _segment_path(self):
+        last = int(self.segments[-1].stem) if self.segments else 0
+        return self.directory / f"{last + 1:012d}{SEGMENT_SUFFIX}"
+
+    def _seal(self):
+        """Close the active segment so the replayer can read it."""
+        if self.active:
+            self.active.flush()
+            os.fsync(self.active.fileno())
+            self.active.close()
+            self.active = None
+            self.active_path = None
+
+    def _enforce_budget(self, incoming):
+        while self.total_bytes + incoming > self.max_bytes:
+            sealed = [path for path in self.segments if path != self.active_path]
+            if not sealed:
+                return False
+            oldest = sealed[0]
+            self.total_bytes -= oldest.stat().st_size
+            oldest.unlink()
+            self.segments.remove(oldest)
+            self._write_position(None, 0)
+            logger.warning(f"Event journal over budget, discarded segment {oldest.name}")
+        return True
+
+    def append(self, kind, payload):
+        """Append one event. Returns False if it had to be dropped."""
+        data = json.dumps({'kind': kind, 'payload': payload}, default=str).encode('utf-8')
+        record = RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data
+
+        with self.lock:
+            if not self._enforce_budget(len(record)):
+                self.dropped += 1
+                return False
+
+            if self.active is None or self.active.tell() + len(record) > self.segment_bytes:
+                self._seal()
+                self.active_path = self._segment_path()
+                self.active = open(self.active_path, 'ab')
+                self.segments.append(self.active_path)
+
+            self.active.write(record)
+            self.active.flush()
+            self.total_bytes += len(record)
+
+        return True
+
+    def pending(self):
+        """True if there are events waiting to be replayed."""
+        return bool(self.segments)
+
+    def _read_position(self):
+        try:
+            name, offset = (self.directory / POSITION_FILE).read_text().split()
+            return name, int(offset)
+        except (OSError, ValueError):
+            return None, 0
+
+    def _write_position(self, name, offset):
+        path = self.directory / POSITION_FILE
+        if name is None:
+            path.unlink(missing_ok=True)
+            return
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(f"{name} {offset}")
+        os.replace(tmp, path)
+
+    def read_batch(self, max_records=500):
+        """Read up to max_records from the oldest sealed segment.
+
+        Returns (events, position); pass position to commit() once the
+        events have been written.
+        """
+        with self.lock:
+            if not self.segments:
+                return [], None
+            if self.segments[0] == self.active_path:
+                self._seal()
+            segment = self.segments[0]
+
+        name, offset = self._read_position()
+        if name != segment.name:
+            offset = 0
+
+        events = []
+        try:
+            f = open(segment, 'rb')
+        except FileNotFoundError:
+            # Discarded by the disk budget while we were reading
+            return [], (segment, 0, True)
+        with f:
+            f.seek(offset)
+            while len(events) < max_records:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                length, crc = RECORD_HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length or zlib.crc32(data) != crc:
+                    logger.warning(f"Truncated or corrupt record in {segment.name}, skipping rest of segment")
+                    f.seek(0, os.SEEK_END)
+                    break
+                events.append(json.loads(data))
+            position = (segment, f.tell(), f.tell() >= os.fstat(f.fileno()).st_size)
+
+        return events, position
+
+    def commit(self, position):
+        """Mark events up to position as replayed, removing finished segments."""
+        if position is None:
+            return
+        segment, offset, finished = position
+
+        with self.lock:
+            if finished:
+                if segment in self.segments:
+                    self.total_bytes -= segment.stat().st_size
+                    segment.unlink()
+                    self.segments.remove(segment)
+                self._write_position(None, 0)
+            else:
+                self._write_position(segment.name, offset)
+
+    def replay(self, handler, batch_size=500):
+        """Drain the journal through handler(kind, payload) in batches.
+
+        Stops at the first event the handler fails on so it is retried
+        later. Returns the number of events replayed.
+        """
+        replayed = 0
+        while True:
+            events, position = self.read_batch(batch_size)
+            if position is None:
+                return replayed
+
+            segment, _, finished = position
+            done = 0
+            for event in events:
+                try:
+                    handler(event['kind'], event['payload'])
+                except Exception:
+                    if done:
+                        self._commit_partial(segment, done)
+                    raise
+                done += 1
+
+            self.commit(position)
+            replayed += done
+            if not events and not finished:
+                return replayed
+
+    def _commit_partial(self, segment, count):
+        """Advance the position by count records within segment."""
+        name, offset = self._read_position()
+        if name != segment.name:
+            offset = 0
+        with open(segment, 'rb') as f:
+            f.seek(offset)
+            for _ in range(count):
+                length, _ = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+                f.seek(length, os.SEEK_CUR)
+            self._write_position(segment.name, f.tell())
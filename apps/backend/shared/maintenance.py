@@ -0,0 +1,216 @@
+"""Online maintenance for the SQLite store: backups, WAL checkpoints, incremental vacuum.
+
+Checkpoints and vacuum work in small steps with pauses so the monitor keeps
+ingesting while they run. A backup is one VACUUM INTO from a read snapshot,
+which WAL writers do not block or restart. Each run is recorded in `maintenance_runs` with its duration
+and the longest single step, which is the longest writers could be held up.
+
+    python3 -m shared.maintenance backup
+    python3 -m shared.maintenance enable-incremental-vacuum   # one-off, rewrites the file
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+from shared.database import DB_PATH, get_connection
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = Path(os.getenv('EDGEGUARD_BACKUP_DIR', '/var/lib/edgeguard/backups'))
+BACKUP_INTERVAL = int(os.getenv('EDGEGUARD_BACKUP_INTERVAL_HOURS', '24')) * 3600  # 0 disables
+BACKUP_KEEP = int(os.getenv('EDGEGUARD_BACKUP_KEEP', '3'))
+
+CHECKPOINT_INTERVAL = int(os.getenv('EDGEGUARD_CHECKPOINT_INTERVAL', '300'))
+WAL_TRUNCATE_BYTES = int(os.getenv('EDGEGUARD_WAL_TRUNCATE_BYTES', str(64 * 1024 * 1024)))
+
+VACUUM_INTERVAL = int(os.getenv('EDGEGUARD_VACUUM_INTERVAL', '3600'))
+VACUUM_FREE_PAGES = int(os.getenv('EDGEGUARD_VACUUM_FREE_PAGES', '1000'))
+VACUUM_PAGES_PER_STEP = int(os.getenv('EDGEGUARD_VACUUM_PAGES_PER_STEP', '500'))
+
+# Pause between steps so queued writers can take the lock
+STEP_PAUSE = 0.05
+
+# Busy timeout for maintenance connections; a busy step is retried next run
+MAINTENANCE_BUSY_TIMEOUT = 1.0
+
+def backup(dest_dir=None):
+    """Copy the live database to dest_dir. Returns run details.
+
+    A paged online backup restarts whenever another connection commits, so
+    it never finishes while the monitor is writing. VACUUM INTO copies one
+    read snapshot instead; writers carry on, and only checkpoints wait for it.
+    """
+    dest_dir = Path(dest_dir or BACKUP_DIR)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    dest = dest_dir / f"edgeguard-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.db"
+    tmp = dest.with_suffix('.tmp')
+    tmp.unlink(missing_ok=True)
+
+    source = get_connection(timeout=MAINTENANCE_BUSY_TIMEOUT)
+    try:
+        started = time.perf_counter()
+        source.execute("VACUUM INTO ?", (str(tmp),))
+        copy_ms = round((time.perf_counter() - started) * 1000, 2)
+    except sqlite3.Error:
+        tmp.unlink(missing_ok=True)
+        raise
+    finally:
+        source.close()
+    os.replace(tmp, dest)
+
+    # Keep the newest BACKUP_KEEP backups
+    for old in sorted(dest_dir.glob('edgeguard-*.db'))[:-max(BACKUP_KEEP, 1)]:
+        old.unlink()
+
+    return {
+        'path': str(dest),
+        'bytes': dest.stat().st_size,
+        # Writers are not held up by the copy; this is how long it took
+        'copy_ms': copy_ms
+    }
+
+def checkpoint():
+    """PASSIVE checkpoint; TRUNCATE the WAL if it is still over budget."""
+    wal = Path(f"{DB_PATH}-wal")
+    conn = get_connection(timeout=MAINTENANCE_BUSY_TIMEOUT)
+    try:
+        started = time.perf_counter()
+        busy, log_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        details = {
+            'mode': 'PASSIVE',
+            'busy': busy,
+            'log_pages': log_pages,
+            'checkpointed': checkpointed,
+            'max_step_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+
+        wal_bytes = wal.stat().st_size if wal.exists() else 0
+        if wal_bytes > WAL_TRUNCATE_BYTES:
+            started = time.perf_counter()
+            busy, log_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            step_ms = round((time.perf_counter() - started) * 1000, 2)
+            details.update({
+                'mode': 'TRUNCATE',
+                'busy': busy,
+                'wal_bytes_before': wal_bytes,
+                'max_step_ms': max(details['max_step_ms'], step_ms)
+            })
+    finally:
+        conn.close()
+
+    details['wal_bytes'] = wal.stat().st_size if wal.exists() else 0
+    return details
+
+def incremental_vacuum(threshold=None):
+    """Release free pages in steps once the freelist passes threshold."""
+    threshold = VACUUM_FREE_PAGES if threshold is None else threshold
+    conn = get_connection(timeout=MAINTENANCE_BUSY_TIMEOUT)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return {'skipped': 'auto_vacuum is not INCREMENTAL'}
+
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        details = {'free_pages_before': free, 'steps': 0, 'max_step_ms': 0}
+        if free < threshold:
+            return details
+
+        while free > 0:
+            started = time.perf_counter()
+            # executescript steps the pragma to completion; execute() frees one page
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP});")
+            step_ms = round((time.perf_counter() - started) * 1000, 2)
+            details['steps'] += 1
+            details['max_step_ms'] = max(details['max_step_ms'], step_ms)
+
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free:
+                break
+            free = remaining
+            time.sleep(STEP_PAUSE)
+
+        details['free_pages'] = free
+    finally:
+        conn.close()
+
+    return details
+
+def enable_incremental_vacuum():
+    """Switch an existing database to auto_vacuum=INCREMENTAL (runs a full VACUUM)."""
+    conn = get_connection()
+    try:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    finally:
+        conn.close()
+
+# Scheduled tasks: name -> (interval seconds, function)
+TASKS = {
+    'checkpoint': (CHECKPOINT_INTERVAL, checkpoint),
+    'incremental_vacuum': (VACUUM_INTERVAL, incremental_vacuum),
+    'backup': (BACKUP_INTERVAL, backup),
+}
+
+def _record(task, started_at, duration_ms, status, details):
+    conn = get_connection()
+    try:
+        conn.execute("""
+            INSERT INTO maintenance_runs (task, started_at, duration_ms, status, details)
+            VALUES (?, ?, ?, ?, ?)
+        """, (task, started_at, duration_ms, status, json.dumps(details)))
+        conn.commit()
+    finally:
+        conn.close()
+
+def _last_run(task):
+    conn = get_connection()
+    try:
+        row = conn.execute("""
+            SELECT strftime('%s', MAX(started_at)) FROM maintenance_runs WHERE task = ?
+        """, (task,)).fetchone()
+        return int(row[0]) if row[0] else 0
+    finally:
+        conn.close()
+
+def run_task(task):
+    """Run one maintenance task now and record it. Returns the run details."""
+    _, func = TASKS[task]
+    started_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    started = time.perf_counter()
+    try:
+        details = func()
+        status = 'ok'
+    except sqlite3.Error as e:
+        details = {'error': str(e)}
+        status = 'error'
+        logger.warning(f"Maintenance task {task} failed: {e}")
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    _record(task, started_at, duration_ms, status, details)
+    return details
+
+def run_due_tasks():
+    """Run every task whose interval has elapsed since its last run."""
+    ran = {}
+    for task, (interval, _) in TASKS.items():
+        if interval <= 0 or time.time() - _last_run(task) < interval:
+            continue
+        ran[task] = run_task(task)
+        logger.info(f"Maintenance {task}: {ran[task]}")
+    return ran
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="EdgeGuard database maintenance")
+    parser.add_argument('command', choices=list(TASKS) + ['enable-incremental-vacuum'])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'enable-incremental-vacuum':
+        print(enable_incremental_vacuum())
+    else:
+        print(run_task(args.command))
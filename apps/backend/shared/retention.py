@@ -0,0 +1,414 @@
+"""Retention policies and hourly/daily rollups for event tables."""
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from shared.database import TRAFFIC_RESOLUTIONS, get_connection
+
+logger = logging.getLogger(__name__)
+
+# Retention windows (days). 0 keeps rows forever.
+RAW_RETENTION_DAYS = int(os.getenv('EDGEGUARD_RAW_RETENTION_DAYS', '14'))
+HOURLY_RETENTION_DAYS = int(os.getenv('EDGEGUARD_HOURLY_RETENTION_DAYS', '90'))
+DAILY_RETENTION_DAYS = int(os.getenv('EDGEGUARD_DAILY_RETENTION_DAYS', '0'))
+
+# Deletes run in small chunks so the writer is never blocked for long
+DELETE_CHUNK_SIZE = int(os.getenv('EDGEGUARD_DELETE_CHUNK_SIZE', '1000'))
+DELETE_CHUNK_PAUSE = 0.05
+
+# Hours aggregated per rollup transaction
+ROLLUP_SLICE_HOURS = 24
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Rollup definitions: rollup columns -> source expressions.
+# Each entry produces `<name>_hourly` and `<name>_daily` tables (see init_db).
+ROLLUPS = {
+    'dns': {
+        'source': 'dns_queries',
+        'time_column': 'timestamp',
+        'keys': {
+            'device_id': 'device_id',
+            'domain_id': 'domain_id',
+        },
+        'values': {
+            'query_count': 'COUNT(*)',
+        },
+    },
+    'connection': {
+        'source': 'connections',
+        # Rows are updated until their bucket ends; last_seen would move a
+        # row into a later hour after it had been rolled up
+        'time_column': 'bucket',
+        'keys': {
+            'device_id': 'device_id',
+            'protocol': "COALESCE(protocol, '')",
+            'dst_ip': "COALESCE(dst_ip, '')",
+            'dst_port': 'COALESCE(dst_port, 0)',
+        },
+        'values': {
+            'flow_count': 'COUNT(*)',
+            'bytes_sent': 'SUM(bytes_sent)',
+            'bytes_received': 'SUM(bytes_received)',
+            'packets_sent': 'SUM(packets_sent)',
+            'packets_received': 'SUM(packets_received)',
+        },
+    },
+    'http': {
+        'source': 'http_metadata',
+        'time_column': 'timestamp',
+        'keys': {
+            'device_id': 'device_id',
+            'host_id': 'COALESCE(host_id, 0)',
+        },
+        'values': {
+            'request_count': 'COUNT(*)',
+        },
+    },
+    'tls': {
+        'source': 'tls_metadata',
+        'time_column': 'timestamp',
+        'keys': {
+            'device_id': 'device_id',
+            'server_name_id': 'COALESCE(server_name_id, 0)',
+            'tls_version': "COALESCE(tls_version, '')",
+        },
+        'values': {
+            'handshake_count': 'COUNT(*)',
+        },
+    },
+    'icmp': {
+        'source': 'icmp_events',
+        'time_column': 'timestamp',
+        'keys': {
+            'device_id': 'device_id',
+            'icmp_type': "COALESCE(icmp_type, '')",
+        },
+        'values': {
+            'event_count': 'COUNT(*)',
+        },
+    },
+    'port_scan': {
+        'source': 'port_scans',
+        'time_column': 'timestamp',
+        'keys': {
+            'device_id': 'device_id',
+            'target_ip': "COALESCE(target_ip, '')",
+        },
+        'values': {
+            'probe_count': 'COUNT(*)',
+        },
+    },
+}
+
+def _parse(ts):
+    return datetime.strptime(ts, TIMESTAMP_FORMAT)
+
+def _format(dt):
+    return dt.strftime(TIMESTAMP_FORMAT)
+
+def _get_state(cursor, name):
+    """Return (hourly_through, daily_through) watermarks for a rollup."""
+    cursor.execute("SELECT hourly_through, daily_through FROM rollup_state WHERE name = ?", (name,))
+    row = cursor.fetchone()
+    return row if row else (None, None)
+
+def _set_state(cursor, name, column, value):
+    cursor.execute(f"""
+        INSERT INTO rollup_state (name, {column}) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET {column} = excluded.{column}
+    """, (name, value))
+
+def _upsert_sql(table, keys, values, select_sql):
+    columns = ['bucket'] + list(keys) + list(values)
+    conflict = ', '.join(['bucket'] + list(keys))
+    updates = ', '.join(f"{col} = excluded.{col}" for col in values)
+    return f"""
+        INSERT INTO {table} ({', '.join(columns)})
+        {select_sql}
+        ON CONFLICT({conflict}) DO UPDATE SET {updates}
+    """
+
+def rollup_hourly(conn, name, spec):
+    """Aggregate completed hours of raw events into `<name>_hourly`."""
+    cursor = conn.cursor()
+    source = spec['source']
+    time_column = spec['time_column']
+    keys = spec['keys']
+    values = spec['values']
+
+    cursor.execute("SELECT strftime('%Y-%m-%d %H:00:00', 'now')")
+    end = cursor.fetchone()[0]
+
+    start, _ = _get_state(cursor, name)
+    if start is None:
+        cursor.execute(f"SELECT strftime('%Y-%m-%d %H:00:00', MIN({time_column})) FROM {source}")
+        start = cursor.fetchone()[0] or end
+
+    group_by = ', '.join(str(i) for i in range(1, len(keys) + 2))
+    select_sql = f"""
+        SELECT strftime('%Y-%m-%d %H:00:00', {time_column}),
+               {', '.join(keys.values())},
+               {', '.join(values.values())}
+        FROM {source}
+        WHERE {time_column} >= ? AND {time_column} < ?
+        GROUP BY {group_by}
+    """
+    sql = _upsert_sql(f"{name}_hourly", keys, values, select_sql)
+
+    hours = 0
+    while start < end:
+        stop = min(_format(_parse(start) + timedelta(hours=ROLLUP_SLICE_HOURS)), end)
+        cursor.execute(sql, (start, stop))
+        _set_state(cursor, name, 'hourly_through', stop)
+        conn.commit()
+        hours += int((_parse(stop) - _parse(start)).total_seconds() // 3600)
+        start = stop
+
+    if start == end:
+        _set_state(cursor, name, 'hourly_through', end)
+        conn.commit()
+
+    return hours
+
+def rollup_daily(conn, name, spec):
+    """Aggregate fully rolled-up days from `<name>_hourly` into `<name>_daily`."""
+    cursor = conn.cursor()
+    keys = spec['keys']
+    values = spec['values']
+
+    hourly_through, start = _get_state(cursor, name)
+    if hourly_through is None:
+        return 0
+
+    # Only days whose hours have all been rolled up
+    cursor.execute("SELECT MIN(strftime('%Y-%m-%d 00:00:00', 'now'), strftime('%Y-%m-%d 00:00:00', ?))",
+                   (hourly_through,))
+    end = cursor.fetchone()[0]
+
+    if start is None:
+        cursor.execute(f"SELECT strftime('%Y-%m-%d 00:00:00', MIN(bucket)) FROM {name}_hourly")
+        start = cursor.fetchone()[0] or end
+
+    group_by = ', '.join(str(i) for i in range(1, len(keys) + 2))
+    select_sql = f"""
+        SELECT strftime('%Y-%m-%d 00:00:00', bucket),
+               {', '.join(keys)},
+               {', '.join(f'SUM({col})' for col in values)}
+        FROM {name}_hourly
+        WHERE bucket >= ? AND bucket < ?
+        GROUP BY {group_by}
+    """
+    sql = _upsert_sql(f"{name}_daily", keys, values, select_sql)
+
+    days = 0
+    while start < end:
+        stop = _format(_parse(start) + timedelta(days=1))
+        cursor.execute(sql, (start, stop))
+        _set_state(cursor, name, 'daily_through', stop)
+        conn.commit()
+        days += 1
+        start = stop
+
+    if start == end:
+        _set_state(cursor, name, 'daily_through', end)
+        conn.commit()
+
+    return days
+
+def rewind_rollups(conn, since):
+    """Roll up again from the hour of `since`, for raw rows written late.
+
+    Replayed journal events keep their capture time, so they can land in
+    hours that are already rolled up. Moving the watermarks back makes the
+    next run recompute those hours and days, and makes rollup_window read
+    them from the raw rows meanwhile. Recomputing needs every finer row of
+    the period, so watermarks never go back past the earliest day that
+    retention or archiving may have deleted from.
+    """
+    from shared.archive import ARCHIVE_AFTER_DAYS, archiving_enabled
+
+    windows = [RAW_RETENTION_DAYS, HOURLY_RETENTION_DAYS]
+    if archiving_enabled():
+        windows.append(ARCHIVE_AFTER_DAYS)
+    windows = [days for days in windows if days > 0]
+    if windows:
+        floor = _format(datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+                        - timedelta(days=min(windows) - 1))
+        if since < floor:
+            logger.warning(f"Rows written late from {since} are older than retention allows re-rolling; "
+                           f"rolling up again from {floor}")
+            since = floor
+
+    # MIN() is NULL for rollups that have not run yet, which start from the oldest row anyway
+    conn.execute("""
+        UPDATE rollup_state
+        SET hourly_through = MIN(hourly_through, strftime('%Y-%m-%d %H:00:00', ?)),
+            daily_through = MIN(daily_through, strftime('%Y-%m-%d 00:00:00', ?))
+    """, (since, since))
+    conn.commit()
+
+def delete_in_chunks(conn, table, time_column, cutoff, chunk_size=None):
+    """Delete rows older than cutoff in small transactions. Returns rows deleted."""
+    chunk_size = chunk_size or DELETE_CHUNK_SIZE
+    total = 0
+
+    while True:
+        cursor = conn.execute(f"""
+            DELETE FROM {table}
+            WHERE rowid IN (
+                SELECT rowid FROM {table} WHERE {time_column} < ? LIMIT ?
+            )
+        """, (cutoff, chunk_size))
+        conn.commit()
+        total += cursor.rowcount
+
+        if cursor.rowcount < chunk_size:
+            break
+
+        # Let queued writers grab the lock between chunks
+        time.sleep(DELETE_CHUNK_PAUSE)
+
+    return total
+
+def _retention_cutoff(cursor, days, watermark):
+    """Cutoff timestamp for a retention window, never past un-rolled data."""
+    if days <= 0 or watermark is None:
+        return None
+    cursor.execute("SELECT datetime('now', ?)", (f'-{days} days',))
+    cutoff = cursor.fetchone()[0]
+    return min(cutoff, watermark)
+
+def _archived_through(cursor, table):
+    cursor.execute("SELECT archived_through FROM archive_state WHERE name = ?", (table,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def purge_expired(conn, name, spec, archiving=False):
+    """Apply retention windows to a rollup's raw, hourly and daily tables.
+
+    With archiving enabled, raw rows are only purged once they are archived.
+    """
+    cursor = conn.cursor()
+    hourly_through, daily_through = _get_state(cursor, name)
+    deleted = {}
+
+    watermark = hourly_through
+    if archiving and watermark is not None:
+        watermark = min(watermark, _archived_through(cursor, spec['source']) or '')
+    cutoff = _retention_cutoff(cursor, RAW_RETENTION_DAYS, watermark)
+    if cutoff:
+        deleted[spec['source']] = delete_in_chunks(conn, spec['source'], spec['time_column'], cutoff)
+
+    cutoff = _retention_cutoff(cursor, HOURLY_RETENTION_DAYS, daily_through)
+    if cutoff:
+        deleted[f"{name}_hourly"] = delete_in_chunks(conn, f"{name}_hourly", 'bucket', cutoff)
+
+    cursor.execute("SELECT datetime('now')")
+    cutoff = _retention_cutoff(cursor, DAILY_RETENTION_DAYS, cursor.fetchone()[0])
+    if cutoff:
+        deleted[f"{name}_daily"] = delete_in_chunks(conn, f"{name}_daily", 'bucket', cutoff)
+
+    return deleted
+
+# Traffic series are downsampled on write; each resolution has its own window
+TRAFFIC_RETENTION_DAYS = {
+    60: RAW_RETENTION_DAYS,
+    300: HOURLY_RETENTION_DAYS,
+    3600: HOURLY_RETENTION_DAYS,
+    86400: DAILY_RETENTION_DAYS,
+}
+
+def purge_traffic(conn):
+    """Apply retention windows to every traffic resolution."""
+    cursor = conn.cursor()
+    deleted = {}
+    for seconds, (table, column) in TRAFFIC_RESOLUTIONS.items():
+        cursor.execute("SELECT datetime('now')")
+        cutoff = _retention_cutoff(cursor, TRAFFIC_RETENTION_DAYS[seconds], cursor.fetchone()[0])
+        if cutoff:
+            deleted[table] = delete_in_chunks(conn, table, column, cutoff)
+    return deleted
+
+def run_retention():
+    """Roll up all event tables, archive aged days and purge expired rows and traffic samples."""
+    from shared.archive import archive_table, archiving_enabled
+
+    archiving = archiving_enabled()
+    conn = get_connection()
+    summary = {}
+
+    try:
+        for name, spec in ROLLUPS.items():
+            started = time.time()
+            hours = rollup_hourly(conn, name, spec)
+            days = rollup_daily(conn, name, spec)
+            archived = archive_table(conn, spec['source']) if archiving else {}
+            deleted = purge_expired(conn, name, spec, archiving)
+
+            summary[name] = {
+                'hours_rolled_up': hours,
+                'days_rolled_up': days,
+                'days_archived': len(archived),
+                'rows_deleted': deleted,
+                'duration_ms': int((time.time() - started) * 1000)
+            }
+
+            if hours or days or archived or any(deleted.values()):
+                logger.info(f"Retention {name}: {hours}h/{days}d rolled up, "
+                            f"{len(archived)}d archived, deleted {deleted}")
+
+        started = time.time()
+        deleted = purge_traffic(conn)
+        summary['traffic'] = {
+            'rows_deleted': deleted,
+            'duration_ms': int((time.time() - started) * 1000)
+        }
+    finally:
+        conn.close()
+
+    return summary
+
+def rollup_table(name, days):
+    """Pick the rollup table that covers the last `days` days."""
+    if days <= 7:
+        return f"{name}_hourly"
+    return f"{name}_daily"
+
+def rollup_window(name, days, hourly_through=None, daily_through=None):
+    """SQL and parameters for rollup totals covering the last `days` days.
+
+    Rollups stop at their watermarks (completed hours and days only, see
+    rollup_state), so the rows after them come from the next finer level:
+    hourly rows after daily_through and raw events after hourly_through.
+    The window therefore always reaches the present. Columns are the rollup
+    keys and values, and the SQL runs on SQLite and DuckDB alike.
+    """
+    spec = ROLLUPS[name]
+    keys = spec['keys']
+    values = spec['values']
+    columns = ', '.join([*keys, *values])
+    start = _format(datetime.utcnow() - timedelta(days=days))
+
+    parts = []
+    params = []
+    if rollup_table(name, days) == f"{name}_daily" and daily_through and daily_through > start:
+        parts.append(f"SELECT {columns} FROM {name}_daily WHERE bucket >= ? AND bucket < ?")
+        params += [start, daily_through]
+        start = daily_through
+    if hourly_through and hourly_through > start:
+        parts.append(f"SELECT {columns} FROM {name}_hourly WHERE bucket >= ? AND bucket < ?")
+        params += [start, hourly_through]
+        start = hourly_through
+
+    parts.append(f"""
+        SELECT {', '.join(f'{expr} AS {key}' for key, expr in keys.items())},
+               {', '.join(f'{expr} AS {value}' for value, expr in values.items())}
+        FROM {spec['source']}
+        WHERE {spec['time_column']} >= ?
+        GROUP BY {', '.join(str(i) for i in range(1, len(keys) + 1))}
+    """)
+    params.append(start)
+
+    return ' UNION ALL '.join(parts), params
@@ -0,0 +1,353 @@
+"""Storage backends: where events are written and where analytics run.
+
+SQLite is always the system of record; the capture side writes through
+StorageBackend.connect(), which is a SQLite connection whatever backend is
+selected. Heavy aggregations (top-N domains and destinations, traffic and
+activity time buckets, joins across DNS/SNI/HTTP) go through the analytics
+methods, which the API routes call and which the DuckDB backend runs in
+DuckDB's columnar engine over the same SQLite file.
+
+Select with EDGEGUARD_ANALYTICS_BACKEND=sqlite|duckdb (default sqlite).
+The DuckDB backend needs DuckDB's sqlite extension, which is not part of
+the Python package. Install it once while online with:
+    python3 -m shared.storage install-extension
+"""
+import logging
+import os
+from abc import ABC, abstractmethod
+from decimal import Decimal
+from pathlib import Path
+from threading import Lock
+
+from shared import database
+from shared.retention import rollup_window
+
+# Optional dependency for the analytical backend
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_BACKEND = os.getenv('EDGEGUARD_ANALYTICS_BACKEND', 'sqlite')
+
+# Where DuckDB extensions are installed; readable by the API's service user
+DUCKDB_EXTENSION_DIR = os.getenv('EDGEGUARD_DUCKDB_EXTENSION_DIR', '/var/lib/edgeguard/duckdb-extensions')
+
+# Lower bound used when no `since` is given
+EPOCH = '1970-01-01 00:00:00'
+
+# Event tables available to activity(): name -> (table, time column)
+ACTIVITY_TABLES = {
+    'dns': ('dns_queries', 'timestamp'),
+    'http': ('http_metadata', 'timestamp'),
+    'tls': ('tls_metadata', 'timestamp'),
+    'connections': ('connections', 'last_seen'),
+}
+
+class StorageBackend(ABC):
+    """Interface shared by all backends.
+
+    Results are lists of dicts with plain Python values (timestamps as
+    'YYYY-MM-DD HH:MM:SS' strings) so backends are interchangeable.
+    """
+
+    name = None
+
+    @abstractmethod
+    def connect(self, timeout=30.0):
+        """Write connection (DB-API, caller commits and closes)."""
+
+    @abstractmethod
+    def top_domains(self, limit=10, since=None):
+        """Most queried domains since a timestamp."""
+
+    @abstractmethod
+    def top_destinations(self, limit=10, since=None):
+        """Destinations with the most flows since a timestamp."""
+
+    @abstractmethod
+    def activity(self, kind, bucket_seconds=3600, since=None, device_id=None):
+        """Event and device counts per time bucket for one event kind."""
+
+    @abstractmethod
+    def device_domains(self, device_id, limit=50, since=None):
+        """Per-domain DNS, SNI and HTTP counts for one device."""
+
+    @abstractmethod
+    def domain_totals(self, limit=10, days=None):
+        """Most queried domains, all time or over the last `days` days (from rollups)."""
+
+    @abstractmethod
+    def destination_totals(self, limit=10, days=None):
+        """Most contacted destinations, all time or over the last `days` days (from rollups)."""
+
+    @abstractmethod
+    def traffic_series(self, device_id, resolution, step, start, end):
+        """Traffic of one device in [start, end) summed per `step` seconds from one resolution."""
+
+    def close(self):
+        pass
+
+class SqliteBackend(StorageBackend):
+    """Runs everything on SQLite; analytics use the read-only pool."""
+
+    name = 'sqlite'
+
+    # Start of the bucket containing {column}, as 'YYYY-MM-DD HH:MM:SS'
+    BUCKET_SQL = "datetime((CAST(strftime('%s', {column}) AS INTEGER) / ?) * ?, 'unixepoch')"
+
+    TOP_DOMAINS_SQL = """
+        SELECT dm.name, COUNT(*) AS queries, COUNT(DISTINCT q.device_id) AS devices
+        FROM dns_queries q
+        JOIN domains dm ON q.domain_id = dm.id
+        WHERE q.timestamp >= ?
+        GROUP BY dm.name
+        ORDER BY queries DESC, dm.name
+        LIMIT ?
+    """
+
+    TOP_DESTINATIONS_SQL = """
+        SELECT dst_ip, dst_port, protocol, COUNT(*) AS flows,
+               SUM(bytes_sent + bytes_received) AS bytes
+        FROM connections
+        WHERE last_seen >= ?
+        GROUP BY dst_ip, dst_port, protocol
+        ORDER BY flows DESC, dst_ip, dst_port, protocol
+        LIMIT ?
+    """
+
+    ACTIVITY_SQL = """
+        SELECT {bucket} AS bucket, COUNT(*) AS events, COUNT(DISTINCT device_id) AS devices
+        FROM {table}
+        WHERE {column} >= ? AND (? IS NULL OR device_id = ?)
+        GROUP BY 1
+        ORDER BY 1
+    """
+
+    DEVICE_DOMAINS_SQL = """
+        SELECT name, SUM(dns) AS dns_queries, SUM(tls) AS tls_handshakes, SUM(http) AS http_requests
+        FROM (
+            SELECT dm.name AS name, 1 AS dns, 0 AS tls, 0 AS http
+            FROM dns_queries q JOIN domains dm ON q.domain_id = dm.id
+            WHERE q.device_id = ? AND q.timestamp >= ?
+            UNION ALL
+            SELECT dm.name, 0, 1, 0
+            FROM tls_metadata t JOIN domains dm ON t.server_name_id = dm.id
+            WHERE t.device_id = ? AND t.timestamp >= ?
+            UNION ALL
+            SELECT hs.name, 0, 0, 1
+            FROM http_metadata h JOIN hosts hs ON h.host_id = hs.id
+            WHERE h.device_id = ? AND h.timestamp >= ?
+        ) events
+        GROUP BY name
+        ORDER BY SUM(dns) + SUM(tls) + SUM(http) DESC, name
+        LIMIT ?
+    """
+
+    DOMAIN_TOTALS_SQL = """
+        SELECT dm.name AS domain, c.count AS count
+        FROM domain_counts c
+        JOIN domains dm ON c.domain_id = dm.id
+        ORDER BY c.count DESC, dm.name
+        LIMIT ?
+    """
+
+    WINDOW_DOMAIN_TOTALS_SQL = """
+        SELECT dm.name AS domain, r.count AS count
+        FROM (
+            SELECT domain_id, SUM(query_count) AS count
+            FROM ({window}) w
+            GROUP BY domain_id
+        ) r
+        JOIN domains dm ON r.domain_id = dm.id
+        ORDER BY r.count DESC, dm.name
+        LIMIT ?
+    """
+
+    DESTINATION_TOTALS_SQL = """
+        SELECT dst_ip, dst_port, protocol, count AS connection_count, bytes AS total_bytes
+        FROM destination_counts
+        ORDER BY count DESC, dst_ip, dst_port, protocol
+        LIMIT ?
+    """
+
+    WINDOW_DESTINATION_TOTALS_SQL = """
+        SELECT dst_ip, dst_port, protocol, SUM(flow_count) AS connection_count, SUM(bytes_sent) AS total_bytes
+        FROM ({window}) w
+        GROUP BY dst_ip, dst_port, protocol
+        ORDER BY connection_count DESC, dst_ip, dst_port, protocol
+        LIMIT ?
+    """
+
+    TRAFFIC_SQL = """
+        SELECT {bucket} AS timestamp,
+               SUM(bytes_sent) AS bytes_sent, SUM(bytes_received) AS bytes_received,
+               SUM(packets_sent) AS packets_sent, SUM(packets_received) AS packets_received
+        FROM {table}
+        WHERE device_id = ? AND {column} >= ? AND {column} < ?
+        GROUP BY 1
+        ORDER BY 1
+    """
+
+    def connect(self, timeout=30.0):
+        return database.get_connection(timeout=timeout)
+
+    def _query(self, sql, params):
+        conn = database.get_read_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            columns = [d[0] for d in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def top_domains(self, limit=10, since=None):
+        return self._query(self.TOP_DOMAINS_SQL, (since or EPOCH, limit))
+
+    def top_destinations(self, limit=10, since=None):
+        return self._query(self.TOP_DESTINATIONS_SQL, (since or EPOCH, limit))
+
+    def activity(self, kind, bucket_seconds=3600, since=None, device_id=None):
+        table, column = ACTIVITY_TABLES[kind]
+        sql = self.ACTIVITY_SQL.format(
+            bucket=self.BUCKET_SQL.format(column=column), table=table, column=column
+        )
+        return self._query(sql, (bucket_seconds, bucket_seconds, since or EPOCH, device_id, device_id))
+
+    def device_domains(self, device_id, limit=50, since=None):
+        since = since or EPOCH
+        return self._query(self.DEVICE_DOMAINS_SQL,
+                           (device_id, since, device_id, since, device_id, since, limit))
+
+    def _rollup_window(self, name, days):
+        state = self._query("SELECT hourly_through, daily_through FROM rollup_state WHERE name = ?", (name,))
+        state = state[0] if state else {}
+        return rollup_window(name, days, state.get('hourly_through'), state.get('daily_through'))
+
+    def domain_totals(self, limit=10, days=None):
+        if not days:
+            return self._query(self.DOMAIN_TOTALS_SQL, (limit,))
+        window, params = self._rollup_window('dns', days)
+        return self._query(self.WINDOW_DOMAIN_TOTALS_SQL.format(window=window), params + [limit])
+
+    def destination_totals(self, limit=10, days=None):
+        if not days:
+            return self._query(self.DESTINATION_TOTALS_SQL, (limit,))
+        window, params = self._rollup_window('connection', days)
+        return self._query(self.WINDOW_DESTINATION_TOTALS_SQL.format(window=window), params + [limit])
+
+    def traffic_series(self, device_id, resolution, step, start, end):
+        table, column = database.TRAFFIC_RESOLUTIONS[resolution]
+        sql = self.TRAFFIC_SQL.format(bucket=self.BUCKET_SQL.format(column=column), table=table, column=column)
+        return self._query(sql, (step, step, device_id, start, end))
+
+class DuckDBBackend(SqliteBackend):
+    """Writes go to SQLite; analytics run in DuckDB over the attached SQLite file.
+
+    Uses DuckDB's sqlite extension to attach the database read-only, so there
+    is no second copy of the data to keep in sync. The extension is loaded
+    from DUCKDB_EXTENSION_DIR and never downloaded at runtime, since the
+    gateway may be offline; see install_extension().
+    """
+
+    name = 'duckdb'
+
+    BUCKET_SQL = ("strftime(make_timestamp(CAST(floor(epoch(CAST({column} AS TIMESTAMP)) / ?) * ? AS BIGINT)"
+                  " * 1000000), '%Y-%m-%d %H:%M:%S')")
+
+    def __init__(self, path=None):
+        self.path = Path(path or database.DB_PATH)
+        self.db = self._open()
+
+    def _open(self):
+        db = duckdb.connect(config={'extension_directory': DUCKDB_EXTENSION_DIR,
+                                    'autoinstall_known_extensions': False})
+        try:
+            db.execute("LOAD sqlite")
+        except duckdb.Error as e:
+            db.close()
+            raise RuntimeError(f"DuckDB sqlite extension not installed in {DUCKDB_EXTENSION_DIR} "
+                               f"(run: python3 -m shared.storage install-extension): {e}")
+        db.execute(f"ATTACH '{self.path}' AS edgeguard (TYPE sqlite, READ_ONLY)")
+        return db
+
+    def _query(self, sql, params):
+        # A cursor is a separate connection to the same database, safe per thread
+        cursor = self.db.cursor()
+        try:
+            cursor.execute("USE edgeguard")
+            cursor.execute(sql, list(params))
+            columns = [d[0] for d in cursor.description]
+            return [dict(zip(columns, (_plain(v) for v in row))) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def close(self):
+        self.db.close()
+
+def _plain(value):
+    """Convert DuckDB result values to what sqlite3 would return."""
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+BACKENDS = {
+    'sqlite': SqliteBackend,
+    'duckdb': DuckDBBackend,
+}
+
+_storage = None
+_storage_lock = Lock()
+
+def get_storage():
+    """Backend selected by EDGEGUARD_ANALYTICS_BACKEND, created on first use."""
+    global _storage
+    with _storage_lock:
+        if _storage is not None:
+            return _storage
+        name = ANALYTICS_BACKEND
+        if name == 'duckdb' and not DUCKDB_AVAILABLE:
+            logger.warning("EDGEGUARD_ANALYTICS_BACKEND=duckdb but duckdb is not installed, using sqlite")
+            name = 'sqlite'
+        try:
+            _storage = BACKENDS[name]()
+        except Exception as e:
+            if name == 'sqlite':
+                raise
+            logger.warning(f"Could not open {name} backend ({e}), using sqlite")
+            _storage = SqliteBackend()
+        return _storage
+
+def install_extension():
+    """Download DuckDB's sqlite extension into DUCKDB_EXTENSION_DIR (needs network access)."""
+    if not DUCKDB_AVAILABLE:
+        raise RuntimeError("duckdb is not installed")
+    Path(DUCKDB_EXTENSION_DIR).mkdir(parents=True, exist_ok=True)
+    db = duckdb.connect(config={'extension_directory': DUCKDB_EXTENSION_DIR})
+    try:
+        db.execute("INSTALL sqlite")
+        db.execute("LOAD sqlite")
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="EdgeGuard storage backends")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('install-extension', help="Install DuckDB's sqlite extension for the duckdb backend")
+    args = parser.parse_args()
+
+    try:
+        install_extension()
+    except Exception as e:
+        print(f"Could not install the DuckDB sqlite extension: {e}")
+        sys.exit(1)
+    print(f"DuckDB sqlite extension installed in {DUCKDB_EXTENSION_DIR}")